@@ -0,0 +1,35 @@
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Eve', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy',
+               'Mallory', 'Niaj', 'Olivia', 'Peggy', 'Rupert', 'Sybil', 'Trent', 'Victor', 'Walter', 'Zoe']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore']
+CITIES = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Lagos', 'Accra', 'Kampala', 'Kigali', 'Cairo']
+STREETS = ['Main St', 'Oak Ave', 'Park Rd', 'Moi Ave', 'Kenyatta Ave', 'Ngong Rd', 'Lake Dr', 'Hill Rd']
+# Few distinct companies shared by many rows, like real contact lists
+COMPANIES = [f"{word} {suffix}" for word in ('Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark',
+                                            'Wayne', 'Wonka', 'Tyrell', 'Cyberdyne')
+             for suffix in ('Ltd', 'Inc', 'Group', 'Labs', 'Holdings')]
+
+def generate_contacts(count: int, seed: int = 0, start_id: int = 1) -> Iterator[Dict[str, Any]]:
+    """Deterministic synthetic rows for the contacts table, with unique ids and emails"""
+    rng = random.Random(seed)
+    first_day = date(2020, 1, 1)
+    for contact_id in range(start_id, start_id + count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        yield {
+            'id': contact_id,
+            'name': f"{first} {last}",
+            'email': f"{first.lower()}.{last.lower()}{contact_id}@example.com",
+            'phone': f"+254-7{rng.randrange(10**8):08d}",
+            'address': f"{rng.randrange(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+            'company': rng.choice(COMPANIES),
+            'created_at': (first_day + timedelta(days=rng.randrange(2000))).isoformat()
+        }
+
+def bulk_load(table, rows: List[Dict[str, Any]]):
+    """Insert many rows with one validation pass, one index pass and a single snapshot write"""
+    table.insert_many(rows)
@@ -0,0 +1,345 @@
+"""Concurrent mixed-traffic load test against the Flask backend.
+
+    python -m benchmarks.loadtest --rows 10000 --stages 1,4,16 --stage-seconds 10
+    python -m benchmarks.loadtest --server-processes 4 --mix get=50,create=25,update=25
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --output load.json
+
+Without --url a server is started on a free local port over a freshly seeded
+data directory (one threaded process, or --server-processes forked ones sharing
+the directory). Each stage runs that many client threads for --stage-seconds
+and reports throughput, error rate and latency percentiles per operation.
+
+Afterwards the harness checks for lost or corrupted writes: every contact it
+created must be readable exactly once, every contact it deleted must be gone,
+and (for a server it started) every table, log and metadata file must parse.
+"""
+import argparse
+import json
+import lzma
+import os
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'web_app', 'backend')
+for path in (ROOT_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from core.blockfile import load_blocks
+from core.columnar import MappedRows
+from core.database import Database
+from core.query_log import percentile
+from schema import initialize_database
+from benchmarks.datagen import COMPANIES, bulk_load, generate_contacts
+
+DEFAULT_MIX = 'list=25,get=30,search=15,create=10,update=12,delete=5,sql=3'
+
+class LoadTest:
+    """Client threads replaying a weighted mix of API calls, plus what they wrote"""
+
+    def __init__(self, base_url: str, rows: int, mix: Dict[str, int], timeout: float, seed: int):
+        self.base_url = base_url.rstrip('/')
+        self.rows = rows
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.timeout = timeout
+        self.seed = seed
+        self.lock = threading.Lock()
+        # Seeded ids are deleted at most once, in a shuffled order
+        self.deletable = list(range(1, rows + 1))
+        random.Random(seed).shuffle(self.deletable)
+        self.created_emails = []
+        self.deleted_ids = []
+        self.next_email = 0
+
+    def call(self, method: str, path: str, body: Optional[Dict[str, Any]] = None):
+        """Send one request; returns (status, parsed JSON body or None)"""
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            try:
+                return e.code, json.loads(e.read() or b'null')
+            except ValueError:
+                return e.code, None
+
+    def run_operation(self, name: str, rng: random.Random) -> int:
+        """Perform one operation of the mix and return its HTTP status"""
+        if name == 'list':
+            return self.call('GET', '/api/contacts?limit=50')[0]
+        if name == 'get':
+            return self.call('GET', f"/api/contacts/{rng.randint(1, self.rows)}")[0]
+        if name == 'search':
+            return self.call('GET', f"/api/contacts/search?q={rng.randint(1, self.rows)}%40")[0]
+        if name == 'create':
+            with self.lock:
+                email = f"load{self.seed}-{self.next_email}@example.com"
+                self.next_email += 1
+            status, _ = self.call('POST', '/api/contacts', {
+                'name': 'Load Test', 'email': email, 'phone': '+254-700000000', 'company': rng.choice(COMPANIES)})
+            if status == 200:
+                with self.lock:
+                    self.created_emails.append(email)
+            return status
+        if name == 'update':
+            return self.call('PUT', f"/api/contacts/{rng.randint(1, self.rows)}",
+                             {'phone': f"+254-7{rng.randrange(10**8):08d}"})[0]
+        if name == 'delete':
+            with self.lock:
+                if not self.deletable:
+                    return self.call('GET', '/api/health')[0]
+                contact_id = self.deletable.pop()
+            status, _ = self.call('DELETE', f"/api/contacts/{contact_id}")
+            if status == 200:
+                with self.lock:
+                    self.deleted_ids.append(contact_id)
+            return status
+        if name == 'sql':
+            return self.call('POST', '/api/sql/execute', {'query': 'SELECT COUNT(*) FROM contacts'})[0]
+        raise ValueError(f"Unknown operation {name}")
+
+    def worker(self, deadline: float, rng: random.Random) -> List[tuple]:
+        samples = []
+        while time.perf_counter() < deadline:
+            name = rng.choices(self.operations, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                status = self.run_operation(name, rng)
+            except Exception as e:
+                # Connection resets and timeouts count as errors, not as crashes of the harness
+                status = type(e).__name__
+            samples.append((name, time.perf_counter() - start, status))
+        return samples
+
+    def run_stage(self, concurrency: int, seconds: float) -> Dict[str, Any]:
+        """Run `concurrency` client threads for `seconds` and summarize what they saw"""
+        deadline = time.perf_counter() + seconds
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(self.worker, deadline, random.Random(f"{self.seed}-{concurrency}-{i}"))
+                       for i in range(concurrency)]
+            samples = [sample for future in futures for sample in future.result()]
+        elapsed = time.perf_counter() - started
+
+        report = {'concurrency': concurrency, 'seconds': round(elapsed, 3)}
+        report.update(summarize(samples, elapsed))
+        report['operations'] = {name: summarize([s for s in samples if s[0] == name], elapsed)
+                                for name in self.operations}
+        return report
+
+def is_error(name: str, status: Any) -> bool:
+    """5xx, connection failures and unexpected 4xx are errors; 404 on a deleted id is not"""
+    if not isinstance(status, int):
+        return True
+    if status == 404 and name in ('get', 'update', 'delete'):
+        return False
+    return status >= 400
+
+def summarize(samples: List[tuple], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(duration for _, duration, _ in samples)
+    errors = sum(1 for name, _, status in samples if is_error(name, status))
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'statuses': statuses,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3)
+    }
+
+def check_writes(test: LoadTest) -> List[str]:
+    """Problems with the data the harness wrote, as seen through the API"""
+    problems = []
+    for email in test.created_emails:
+        status, body = test.call('POST', '/api/sql/execute',
+                                 {'query': f"SELECT id FROM contacts WHERE email = '{email}'"})
+        found = len(body.get('data', [])) if status == 200 and body else None
+        if found != 1:
+            problems.append(f"created contact {email} found {found} times")
+    for contact_id in test.deleted_ids:
+        status, _ = test.call('GET', f"/api/contacts/{contact_id}")
+        if status != 404:
+            problems.append(f"deleted contact {contact_id} still answers {status}")
+    return problems
+
+def check_files(data_dir: str) -> List[str]:
+    """Table snapshots, change logs and metadata that no longer parse"""
+    problems = []
+    for filename in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, filename)
+        if filename.endswith('.json'):
+            try:
+                with open(path) as f:
+                    json.load(f)
+            except ValueError as e:
+                problems.append(f"{filename} is not valid JSON: {e}")
+        elif filename.endswith('.tbl'):
+            try:
+                with open(path, 'rb') as f:
+                    load_blocks(f)
+            except (ValueError, OSError, zlib.error, lzma.LZMAError) as e:
+                problems.append(f"{filename} is not a readable block file: {e}")
+        elif filename.endswith('.col'):
+            try:
+                for _ in MappedRows(path):
+                    pass
+            except (ValueError, OSError, UnicodeDecodeError, struct.error) as e:
+                problems.append(f"{filename} is not a readable columnar file: {e}")
+        elif filename.endswith('.log'):
+            with open(path) as f:
+                lines = f.read().split('\n')
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    json.loads(line)
+                except ValueError:
+                    problems.append(f"{filename} line {number} is torn")
+    return problems
+
+def check_engine(workdir: str) -> List[str]:
+    """Reopen the data directory and check primary keys, unique emails and the key index"""
+    problems = []
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        contacts = Database('contact_manager', query_cache_bytes=0).get_table('contacts')
+        rows = [row for row in contacts.data if row is not None]
+        for column in ('id', 'email'):
+            values = [row[contacts.ordinals[column]] for row in rows]
+            if len(values) != len(set(values)):
+                problems.append(f"duplicate contacts.{column} values")
+        if len(contacts.pk_index) != len(rows):
+            problems.append(f"primary key index has {len(contacts.pk_index)} entries for {len(rows)} rows")
+    finally:
+        os.chdir(cwd)
+    return problems
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def seed_data(workdir: str, rows: int, seed: int):
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        db = Database('contact_manager', query_cache_bytes=0)
+        initialize_database(db)
+        bulk_load(db.get_table('contacts'), list(generate_contacts(rows, seed)))
+    finally:
+        os.chdir(cwd)
+
+def start_server(workdir: str, port: int, processes: int) -> subprocess.Popen:
+    """Run the app with Flask's server in the background and wait until it answers.
+    
+    The server's stderr is ours, so its tracebacks show up next to the report.
+    """
+    options = f"processes={processes}, threaded=False" if processes > 1 else "threaded=True"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([BACKEND_DIR, ROOT_DIR]),
+               RDBMS_LOG_LEVEL=os.environ.get('RDBMS_LOG_LEVEL', 'WARNING'))
+    server = subprocess.Popen(
+        [sys.executable, '-c', f"import app; app.app.run(host='127.0.0.1', port={port}, {options})"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/api/health"
+    for _ in range(100):
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited during startup with status {server.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Server did not start within 10 seconds")
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the contact manager API')
+    parser.add_argument('--url', help='test a running server instead of starting one')
+    parser.add_argument('--rows', type=int, default=10000, help='contacts to seed (or already present at --url)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation weights, e.g. get=50,create=50')
+    parser.add_argument('--stages', default='1,2,4,8,16', help='client threads per stage')
+    parser.add_argument('--stage-seconds', type=float, default=10.0)
+    parser.add_argument('--server-processes', type=int, default=1, help='forked server processes sharing the data')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the generated data directory')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    workdir = server = None
+    if args.url:
+        base_url = args.url
+    else:
+        workdir = tempfile.mkdtemp(prefix='rdbms-load-')
+        print(f"Seeding {args.rows} contacts...", file=sys.stderr)
+        seed_data(workdir, args.rows, args.seed)
+        port = free_port()
+        server = start_server(workdir, port, args.server_processes)
+        base_url = f"http://127.0.0.1:{port}"
+
+    test = LoadTest(base_url, args.rows, mix, args.timeout, args.seed)
+    report = {'url': base_url, 'rows': args.rows, 'mix': mix, 'server_processes': args.server_processes,
+              'stages': []}
+    try:
+        for concurrency in (int(stage) for stage in args.stages.split(',')):
+            stage = test.run_stage(concurrency, args.stage_seconds)
+            report['stages'].append(stage)
+            print(f"{concurrency:4} clients  {stage['throughput_rps']:>9} req/s  errors {stage['error_rate']:.2%}  "
+                  f"p50 {stage['p50_ms']:>8} ms  p95 {stage['p95_ms']:>8} ms  p99 {stage['p99_ms']:>8} ms",
+                  file=sys.stderr)
+        report['problems'] = check_writes(test)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if workdir:
+        report['problems'] += check_files(os.path.join(workdir, 'data')) + check_engine(workdir)
+        if args.keep:
+            print(f"Data left in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{len(test.created_emails)} created, {len(test.deleted_ids)} deleted, "
+          f"{len(report['problems'])} problems", file=sys.stderr)
+    for problem in report['problems'][:20]:
+        print(f"  {problem}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    sys.exit(1 if report['problems'] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""Engine and HTTP benchmarks on synthetic contacts.
+
+    python -m benchmarks.run --sizes 1000,100000,1000000 --output bench.json
+    python -m benchmarks.run --http --sizes 1000,100000 --output http.json
+    python -m benchmarks.run --compare before.json after.json
+
+Each size runs in a fresh data directory. Every benchmark repeats its operation
+until it has done `--repeat` runs or spent `--budget` seconds (with at least
+three runs), so large sizes stay affordable. The query cache is disabled in
+engine mode so repeated statements measure the engine, not the cache.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'web_app', 'backend')
+for path in (ROOT_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from core.database import Database
+from core.query_log import percentile
+from schema import initialize_database
+from benchmarks.datagen import COMPANIES, FIRST_NAMES, bulk_load, generate_contacts
+
+DEFAULT_SIZES = '1000,100000,1000000'
+
+def summarize(samples: List[float], ops_per_sample: int = 1) -> Dict[str, Any]:
+    """Throughput and latency percentiles for timed runs (seconds each)"""
+    ordered = sorted(samples)
+    total = sum(samples)
+    ops = len(samples) * ops_per_sample
+    return {
+        'runs': len(samples),
+        'ops': ops,
+        'seconds': round(total, 6),
+        'ops_per_sec': round(ops / total, 1) if total else None,
+        'p50_ms': round(percentile(ordered, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3)
+    }
+
+def measure(operation: Callable[[int], Any], repeat: int, budget: float, ops_per_run: int = 1) -> Dict[str, Any]:
+    """Time operation(i) for i = 0, 1, ... until `repeat` runs or `budget` seconds"""
+    samples = []
+    started = time.perf_counter()
+    for i in range(repeat):
+        start = time.perf_counter()
+        operation(i)
+        samples.append(time.perf_counter() - start)
+        if len(samples) >= 3 and time.perf_counter() - started > budget:
+            break
+    return summarize(samples, ops_per_run)
+
+def fresh_directory(parent: str, name: str) -> str:
+    """An empty directory to chdir into; the engine keeps its files under ./data"""
+    path = os.path.join(parent, name)
+    os.makedirs(path)
+    return path
+
+def create_companies(db: Database):
+    """A small table to join contacts against"""
+    db.execute_query("CREATE TABLE companies (id INTEGER PRIMARY KEY, name TEXT UNIQUE, country TEXT)")
+    db.execute_query("CREATE INDEX idx_companies_name ON companies (name)")
+    bulk_load(db.get_table('companies'),
+              [{'id': i + 1, 'name': name, 'country': 'KE'} for i, name in enumerate(COMPANIES)])
+
+def bench_engine(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Time every engine operation against a contacts table of `size` rows"""
+    rng = random.Random(args.seed)
+    db = Database('bench', query_cache_bytes=0, table_format=args.table_format)
+    initialize_database(db)
+    create_companies(db)
+    contacts = db.get_table('contacts')
+    results = {}
+
+    rows = list(generate_contacts(size, args.seed))
+    start = time.perf_counter()
+    bulk_load(contacts, rows)
+    results['bulk_insert'] = summarize([time.perf_counter() - start], size)
+    del rows
+    snapshot = db.storage.snapshot_path('contacts')
+    print(f"  contacts snapshot: {os.path.getsize(snapshot)} bytes ({os.path.basename(snapshot)})", file=sys.stderr)
+
+    results['startup_load'] = measure(
+        lambda i: Database('bench', query_cache_bytes=0, table_format=args.table_format), 3, args.budget)
+
+    results['point_select'] = measure(
+        lambda i: db.execute_query(f"SELECT * FROM contacts WHERE id = {rng.randint(1, size)}"),
+        args.repeat, args.budget)
+
+    results['range_select'] = measure(
+        lambda i: db.execute_query(
+            f"SELECT * FROM contacts WHERE (LOWER(name), id) > ('{rng.choice(FIRST_NAMES).lower()}', 0) "
+            f"ORDER BY LOWER(name), id LIMIT 50"),
+        args.repeat, args.budget)
+
+    results['like_search'] = measure(
+        lambda i: db.execute_query(f"SELECT * FROM contacts WHERE email LIKE '%{rng.randint(1, size)}@%'"),
+        args.repeat, args.budget)
+
+    results['join'] = measure(
+        lambda i: db.execute_query(
+            f"SELECT * FROM contacts WHERE id = {rng.randint(1, size)} "
+            f"JOIN companies ON contacts.company = companies.name"),
+        args.repeat, args.budget)
+
+    results['join_scan'] = measure(
+        lambda i: db.execute_query(
+            f"SELECT COUNT(*) FROM contacts WHERE company = '{rng.choice(COMPANIES)}' "
+            f"JOIN companies ON contacts.company = companies.name"),
+        args.repeat, args.budget)
+
+    results['insert'] = measure(
+        lambda i: db.execute_query(
+            f"INSERT INTO contacts (name, email, phone, company) "
+            f"VALUES ('Bench User', 'bench{i}@example.com', '+254-700000000', '{rng.choice(COMPANIES)}')"),
+        args.repeat, args.budget)
+
+    results['update'] = measure(
+        lambda i: db.execute_query(
+            f"UPDATE contacts SET phone = '+254-7{i:08d}' WHERE id = {rng.randint(1, size)}"),
+        args.repeat, args.budget)
+
+    doomed = rng.sample(range(1, size + 1), min(size, args.repeat))
+    results['delete'] = measure(
+        lambda i: db.execute_query(f"DELETE FROM contacts WHERE id = {doomed[i]}"),
+        len(doomed), args.budget)
+
+    statements = [
+        "SELECT * FROM contacts WHERE id = 42",
+        "SELECT name, email FROM contacts WHERE name LIKE '%ali%' OR email LIKE '%ali%' ORDER BY LOWER(name)",
+        "INSERT INTO contacts (name, email) VALUES ('Parse Me', 'parse@example.com')",
+        "UPDATE contacts SET phone = '123' WHERE id = 7",
+        "DELETE FROM contacts WHERE id = 9",
+    ] * 200
+    results['parse'] = measure(lambda i: [db.parse(statement) for statement in statements],
+                               args.repeat, args.budget, len(statements))
+    return results
+
+def bench_http(size: int, args: argparse.Namespace, app_module) -> Dict[str, Any]:
+    """p50/p99 per endpoint, driving the Flask app through its test client"""
+    rng = random.Random(args.seed)
+    db = app_module.db
+    if db.get_table('contacts'):
+        db.drop_table('contacts')
+    initialize_database(db)
+    bulk_load(db.get_table('contacts'), list(generate_contacts(size, args.seed)))
+    client = app_module.app.test_client()
+
+    def request(method: str, url: str, **kwargs):
+        response = client.open(url, method=method, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response
+
+    doomed = rng.sample(range(1, size + 1), min(size, args.repeat))
+    endpoints = {
+        'GET /api/contacts?limit=50': lambda i: request('GET', '/api/contacts?limit=50'),
+        'GET /api/contacts/:id': lambda i: request('GET', f"/api/contacts/{rng.randint(1, size)}"),
+        'GET /api/contacts/search': lambda i: request('GET', f"/api/contacts/search?q={rng.randint(1, size)}@"),
+        'POST /api/contacts': lambda i: request('POST', '/api/contacts', json={
+            'name': 'Bench User', 'email': f"http{i}@example.com", 'company': rng.choice(COMPANIES)}),
+        'PUT /api/contacts/:id': lambda i: request('PUT', f"/api/contacts/{rng.randint(1, size)}",
+                                                   json={'phone': f"+254-7{i:08d}"}),
+        'DELETE /api/contacts/:id': lambda i: request('DELETE', f"/api/contacts/{doomed[i]}"),
+        'POST /api/sql/execute': lambda i: request('POST', '/api/sql/execute',
+                                                   json={'query': 'SELECT COUNT(*) FROM contacts'}),
+    }
+    return {name: measure(operation, len(doomed) if name.startswith('DELETE') else args.repeat, args.budget)
+            for name, operation in endpoints.items()}
+
+def environment() -> Dict[str, Any]:
+    """What the numbers were measured on, so result files can be compared"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime())
+    }
+
+def compare(before_path: str, after_path: str):
+    """Print the ops/sec ratio of every benchmark present in both result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'benchmark':45} {'before':>12} {'after':>12} {'change':>8}")
+    for size, benchmarks in after['results'].items():
+        for name, result in benchmarks.items():
+            old = before['results'].get(size, {}).get(name)
+            if not old or not old['ops_per_sec'] or not result['ops_per_sec']:
+                continue
+            change = result['ops_per_sec'] / old['ops_per_sec']
+            print(f"{size + ' ' + name:45} {old['ops_per_sec']:>12} {result['ops_per_sec']:>12} {change:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the RDBMS engine and HTTP API')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma-separated table sizes')
+    parser.add_argument('--repeat', type=int, default=200, help='maximum runs per benchmark')
+    parser.add_argument('--budget', type=float, default=10.0, help='seconds per benchmark before stopping early')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--table-format', default='json', help='json, blocks(zlib), blocks(lzma) or columnar')
+    parser.add_argument('--http', action='store_true', help='benchmark the Flask endpoints instead of the engine')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the generated data directories')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='rdbms-bench-')
+    report = {'environment': environment(), 'mode': 'http' if args.http else 'engine',
+              'table_format': args.table_format, 'results': {}}
+
+    if args.http:
+        os.chdir(fresh_directory(workdir, 'http'))
+        # The app opens its database on import, in the current directory
+        import app as app_module
+
+    for size in sizes:
+        print(f"{size} rows...", file=sys.stderr)
+        if args.http:
+            results = bench_http(size, args, app_module)
+        else:
+            os.chdir(fresh_directory(workdir, str(size)))
+            results = bench_engine(size, args)
+        report['results'][str(size)] = results
+        for name, result in results.items():
+            print(f"  {name:32} {result['ops_per_sec']:>12} ops/s  p50 {result['p50_ms']:>9} ms  "
+                  f"p99 {result['p99_ms']:>9} ms", file=sys.stderr)
+
+    os.chdir(ROOT_DIR)
+    if args.keep:
+        print(f"Data left in {workdir}", file=sys.stderr)
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+class PendingWrite:
+    """One caller's write waiting in a batch"""
+
+    def __init__(self, op: str, values: Dict[str, Any], where: Optional[Dict[str, Any]] = None):
+        self.op = op
+        self.values = values
+        self.where = where
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+class WriteBatcher:
+    """Coalesces single-row inserts and updates that arrive together.
+
+    The first writer to queue for a table becomes the leader. It waits `window`
+    seconds for others to join, takes the table's write lock, and applies
+    everything queued by then inside one Table.batch(): one refresh, one
+    validation and index pass per run of inserts, and one flush to storage.
+    Writers arriving while a batch is being applied queue up for the next one,
+    so batches grow with load even with a zero window. Each writer gets back its
+    own result or exception.
+    """
+
+    def __init__(self, database, window: float = 0.0, max_batch: int = 1000):
+        self.database = database
+        self.window = window
+        self.max_batch = max_batch
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def insert(self, table_name: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a row and return it as stored, including a generated primary key"""
+        return self._submit(table_name, PendingWrite('insert', values))
+
+    def update(self, table_name: str, set_values: Dict[str, Any], where: Dict[str, Any]) -> int:
+        """Update the rows matching an equality WHERE clause and return how many changed"""
+        return self._submit(table_name, PendingWrite('update', set_values, where))
+
+    def _submit(self, table_name: str, pending: PendingWrite) -> Any:
+        with self.lock:
+            queue = self.queues.setdefault(table_name, [])
+            queue.append(pending)
+            leader = len(queue) == 1
+
+        if leader:
+            if self.window:
+                time.sleep(self.window)
+            self._lead(table_name)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _lead(self, table_name: str):
+        """Apply the table's queued writes; followers keep queueing until the lock is ours"""
+        table = self.database.get_table(table_name)
+        if table is None:
+            with self.lock:
+                batch = self.queues.pop(table_name, [])
+            for pending in batch:
+                pending.error = ValueError(f"Table {table_name} not found")
+                pending.done.set()
+            return
+
+        batch = []
+        try:
+            with table.batch():
+                with self.lock:
+                    batch = self.queues.pop(table_name, [])
+                for start in range(0, len(batch), self.max_batch):
+                    self._apply(table, batch[start:start + self.max_batch])
+        except Exception as e:
+            # Locking or the final flush failed, so none of the batch can be reported as written
+            if not batch:
+                with self.lock:
+                    batch = self.queues.pop(table_name, [])
+            for pending in batch:
+                pending.result = None
+                pending.error = pending.error or e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def _apply(self, table, batch: List[PendingWrite]):
+        """Apply writes in arrival order, inserting each run of consecutive inserts together"""
+        i = 0
+        while i < len(batch):
+            if batch[i].op != 'insert':
+                pending = batch[i]
+                try:
+                    pending.result = table.update(pending.values, pending.where)
+                except Exception as e:
+                    pending.error = e
+                i += 1
+                continue
+
+            run = []
+            while i < len(batch) and batch[i].op == 'insert':
+                run.append(batch[i])
+                i += 1
+            try:
+                table.insert_many([pending.values for pending in run])
+            except ValueError:
+                # One bad row fails only its own writer; insert the rest individually
+                for pending in run:
+                    try:
+                        table.insert(pending.values)
+                    except Exception as e:
+                        pending.error = e
+            except Exception as e:
+                for pending in run:
+                    pending.error = e
+            for pending in run:
+                if pending.error is None:
+                    pending.result = dict(zip(table.column_names, table.make_row(pending.values)))
@@ -0,0 +1,81 @@
+"""Compressed block table files.
+
+A table snapshot is split into blocks of rows. Each block is a compact JSON
+list compressed on its own, which keeps memory bounded while writing and
+reading. Tables load every block; the format saves disk space and IO, not
+decompression work. The file layout is:
+
+    MAGIC
+    block 0 ... block n-1    compressed compact-JSON lists of rows
+    header                   compact JSON: every snapshot key except 'rows',
+                             the codec and the block index
+    footer                   header offset and length, then MAGIC again
+
+The footer sits at a fixed distance from the end, so opening a file takes one
+seek to the footer and one read of the header.
+"""
+import json
+import lzma
+import struct
+import zlib
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b'RDBBLK1\n'
+FOOTER = struct.Struct('<QQ')
+# Rows per block: large enough to compress well, small enough to read a few
+BLOCK_ROWS = 4096
+
+CODECS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+def write_blocks(f: BinaryIO, data: Dict[str, Any], codec: str = 'zlib', block_rows: int = BLOCK_ROWS):
+    """Write a table snapshot (the dict save_table receives) as compressed blocks"""
+    compress = CODECS[codec][0]
+    rows = data.get('rows', [])
+    f.write(MAGIC)
+    blocks = []
+    for first_row in range(0, len(rows), block_rows):
+        chunk = rows[first_row:first_row + block_rows]
+        payload = compress(_dumps(chunk))
+        blocks.append({'offset': f.tell(), 'length': len(payload), 'first_row': first_row, 'rows': len(chunk)})
+        f.write(payload)
+
+    header = {key: value for key, value in data.items() if key != 'rows'}
+    header['codec'] = codec
+    header['blocks'] = blocks
+    payload = _dumps(header)
+    offset = f.tell()
+    f.write(payload)
+    f.write(FOOTER.pack(offset, len(payload)))
+    f.write(MAGIC)
+
+def read_header(f: BinaryIO) -> Dict[str, Any]:
+    """The header of a block file: snapshot keys other than 'rows', 'codec' and 'blocks'"""
+    f.seek(-(FOOTER.size + len(MAGIC)), 2)
+    offset, length = FOOTER.unpack(f.read(FOOTER.size))
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a block table file, or it was truncated")
+    f.seek(offset)
+    return json.loads(f.read(length))
+
+def read_blocks(f: BinaryIO, header: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], List[Any]]]:
+    """Yield (block index entry, rows) for every block in order"""
+    decompress = CODECS[header['codec']][1]
+    for block in header['blocks']:
+        f.seek(block['offset'])
+        yield block, json.loads(decompress(f.read(block['length'])))
+
+def load_blocks(f: BinaryIO) -> Dict[str, Any]:
+    """Read a whole block file back into the snapshot dict it was written from"""
+    header = read_header(f)
+    rows = []
+    for _, block_rows in read_blocks(f, header):
+        rows.extend(block_rows)
+    data = {key: value for key, value in header.items() if key not in ('codec', 'blocks')}
+    data['rows'] = rows
+    return data
@@ -0,0 +1,104 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from .metrics import CACHE_REQUESTS
+
+def normalize_query(query: str) -> str:
+    """Collapse runs of whitespace outside quoted literals, so reformatted queries share an entry"""
+    parts = []
+    in_quotes = False
+    pending_space = False
+    for char in query.strip():
+        if char == "'":
+            in_quotes = not in_quotes
+        elif not in_quotes and char.isspace():
+            pending_space = True
+            continue
+        if pending_space:
+            parts.append(' ')
+            pending_space = False
+        parts.append(char)
+    return ''.join(parts)
+
+def estimate_size(result: Any) -> int:
+    """Rough memory footprint of a query result in bytes"""
+    if isinstance(result, list):
+        return sys.getsizeof(result) + sum(estimate_size(item) for item in result)
+    if isinstance(result, dict):
+        # Column-name keys are shared between rows, so only values are counted
+        return sys.getsizeof(result) + sum(sys.getsizeof(value) for value in result.values())
+    return sys.getsizeof(result)
+
+class QueryCache:
+    """LRU cache of SELECT results within a memory budget.
+
+    Each entry remembers the generation number of every storage name it read
+    (tables, partitions and the metadata). A lookup only returns an entry whose
+    generations are all still current, so writes by other processes invalidate it
+    too; writes in this process drop affected entries eagerly via `invalidate`.
+    Cached results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        # storage name -> keys of the entries that read it
+        self.by_name = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str, current_version: Callable[[str], int]) -> Optional[Any]:
+        """Return the cached result for a query, or None if absent or stale"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                versions, result, _ = entry
+                if all(current_version(name) == version for name, version in versions.items()):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    CACHE_REQUESTS.inc(result='hit')
+                    return result
+                self._remove(key)
+            self.misses += 1
+            CACHE_REQUESTS.inc(result='miss')
+            return None
+
+    def put(self, key: str, versions: Dict[str, int], result: Any):
+        """Cache a result computed against the given generation numbers"""
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (versions, result, size)
+            self.size += size
+            for name in versions:
+                self.by_name.setdefault(name, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, name: str):
+        """Drop every entry that read a table (or partition) that has just changed"""
+        with self.lock:
+            for key in list(self.by_name.get(name, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_name.clear()
+            self.size = 0
+
+    def _remove(self, key: str):
+        versions, _, size = self.entries.pop(key)
+        self.size -= size
+        for name in versions:
+            keys = self.by_name.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_name[name]
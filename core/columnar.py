@@ -0,0 +1,244 @@
+"""Columnar table files that are read in place through a memory map.
+
+Each column is stored contiguously so it can be viewed without copying:
+
+    int64 / float64 / bool    fixed-width values plus a presence byte per row
+    text / json               row offsets into a heap of UTF-8 (or JSON) bytes,
+                              plus a presence byte per row
+    dict                      int32 codes (-1 for NULL) into a value list kept
+                              in the header, for TEXT ENCODING DICT columns
+
+A live byte per row marks tombstones. Sections are 8-byte aligned, and the
+compact JSON header (columns, next_id, row count and the layout above) is
+found through a fixed-size footer, like blockfile's.
+
+A column falls back to 'json' when its values don't all share one type (ints
+stored in a FLOAT column, for instance), so values read back exactly as written.
+"""
+from array import array
+import copy
+import itertools
+import json
+import mmap
+import struct
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b'RDBCOL1\n'
+FOOTER = struct.Struct('<QQ')
+FIXED_WIDTH = {'int64': 'q', 'float64': 'd', 'bool': 'b'}
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+def _kind_of(values: List[Any]) -> str:
+    """The narrowest layout every non-NULL value of a column fits"""
+    if all(type(value) is int and INT64_RANGE[0] <= value <= INT64_RANGE[1] for value in values):
+        return 'int64'
+    for kind, value_type in (('float64', float), ('bool', bool), ('text', str)):
+        if all(type(value) is value_type for value in values):
+            return kind
+    return 'json'
+
+def _align(f: BinaryIO):
+    f.write(b'\0' * (-f.tell() % 8))
+
+def _section(f: BinaryIO, payload: bytes) -> Dict[str, int]:
+    _align(f)
+    offset = f.tell()
+    f.write(payload)
+    return {'offset': offset, 'length': len(payload)}
+
+def _write_column(f: BinaryIO, name: str, values: List[Any], dictionary: Optional[List[Any]]) -> Dict[str, Any]:
+    if dictionary is not None:
+        # Rows already hold codes into the dictionary (see encode_rows)
+        codes = array('i', (-1 if code is None else code for code in values))
+        return {'name': name, 'kind': 'dict', 'values': dictionary, 'data': _section(f, codes.tobytes())}
+
+    kind = _kind_of([value for value in values if value is not None])
+    column = {'name': name, 'kind': kind,
+              'present': _section(f, bytes(value is not None for value in values))}
+    if kind in FIXED_WIDTH:
+        column['data'] = _section(f, array(FIXED_WIDTH[kind], (0 if value is None else value
+                                                               for value in values)).tobytes())
+        return column
+
+    if kind == 'text':
+        encoded = [b'' if value is None else value.encode('utf-8') for value in values]
+    else:
+        encoded = [b'' if value is None else json.dumps(value, separators=(',', ':')).encode('utf-8')
+                   for value in values]
+    column['offsets'] = _section(f, array('Q', itertools.accumulate(map(len, encoded), initial=0)).tobytes())
+    column['heap'] = _section(f, b''.join(encoded))
+    return column
+
+def write_columnar(f: BinaryIO, data: Dict[str, Any]):
+    """Write a table snapshot (the dict save_table receives) in the columnar layout"""
+    rows = data.get('rows', [])
+    dictionaries = data.get('dictionaries') or {}
+    f.write(MAGIC)
+    live = _section(f, bytes(row is not None for row in rows))
+    layout = []
+    for ordinal, name in enumerate(data.get('columns') or []):
+        values = [None if row is None else row[ordinal] for row in rows]
+        layout.append(_write_column(f, name, values, dictionaries.get(name)))
+
+    header = {key: value for key, value in data.items() if key not in ('rows', 'dictionaries')}
+    header.update(rows=len(rows), live=live, layout=layout)
+    payload = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    offset = f.tell()
+    f.write(payload)
+    f.write(FOOTER.pack(offset, len(payload)))
+    f.write(MAGIC)
+
+def _view(buffer: memoryview, section: Dict[str, int]) -> memoryview:
+    return buffer[section['offset']:section['offset'] + section['length']]
+
+def _reader(buffer: memoryview, column: Dict[str, Any]) -> Callable[[int], Any]:
+    """A function decoding one column's value for a row id straight from the mapping"""
+    kind = column['kind']
+    if kind == 'dict':
+        codes = _view(buffer, column['data']).cast('i')
+        values = column['values']
+        return lambda i: None if codes[i] < 0 else values[codes[i]]
+
+    present = _view(buffer, column['present'])
+    if kind in FIXED_WIDTH:
+        data = _view(buffer, column['data']).cast(FIXED_WIDTH[kind])
+        if kind == 'bool':
+            return lambda i: bool(data[i]) if present[i] else None
+        return lambda i: data[i] if present[i] else None
+
+    offsets = _view(buffer, column['offsets']).cast('Q')
+    heap = _view(buffer, column['heap'])
+    if kind == 'text':
+        return lambda i: str(heap[offsets[i]:offsets[i + 1]], 'utf-8') if present[i] else None
+    return lambda i: json.loads(bytes(heap[offsets[i]:offsets[i + 1]])) if present[i] else None
+
+class MappedRow:
+    """A stored row decoded field by field, for predicates that only touch a few columns"""
+    __slots__ = ('readers', 'row_id')
+
+    def __init__(self, readers: List[Callable[[int], Any]], row_id: int):
+        self.readers = readers
+        self.row_id = row_id
+
+    def __getitem__(self, ordinal: int) -> Any:
+        return self.readers[ordinal](self.row_id)
+
+    def __len__(self) -> int:
+        return len(self.readers)
+
+class MappedRows:
+    """The rows of a columnar table file, read through a read-only memory map.
+
+    Behaves like the list of tuple rows a Table keeps: indexing decodes one row,
+    slicing returns a list, and deleted rows are None. Nothing is decoded up
+    front, and processes mapping the same file share its pages through the OS
+    page cache. Rows written after loading live in a private overlay (and an
+    appended list) until the table is saved and mapped again.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self.mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC or bytes(buffer[-len(MAGIC):]) != MAGIC:
+            raise ValueError(f"{path} is not a columnar table file, or it was truncated")
+        offset, length = FOOTER.unpack(buffer[-(FOOTER.size + len(MAGIC)):-len(MAGIC)])
+        self.header = json.loads(bytes(buffer[offset:offset + length]))
+        self.header_bytes = length
+        self.count = self.header['rows']
+        self.live = _view(buffer, self.header['live'])
+        self.readers = [_reader(buffer, column) for column in self.header['layout']]
+        self.overlay = {}
+        self.appended = []
+
+    @property
+    def columns(self) -> List[str]:
+        return [column['name'] for column in self.header['layout']]
+
+    def _row(self, i: int) -> Optional[tuple]:
+        if i in self.overlay:
+            return self.overlay[i]
+        if not self.live[i]:
+            return None
+        return tuple(read(i) for read in self.readers)
+
+    def __len__(self) -> int:
+        return self.count + len(self.appended)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i >= self.count:
+            return self.appended[i - self.count]
+        if i < 0:
+            raise IndexError("row id out of range")
+        return self._row(i)
+
+    def __setitem__(self, i: int, row: Optional[tuple]):
+        if i < 0:
+            i += len(self)
+        if i >= self.count:
+            self.appended[i - self.count] = row
+        elif i >= 0:
+            self.overlay[i] = row
+        else:
+            raise IndexError("row id out of range")
+
+    def __iter__(self) -> Iterator[Optional[tuple]]:
+        for i in range(self.count):
+            yield self._row(i)
+        yield from self.appended
+
+    def append(self, row: Optional[tuple]):
+        self.appended.append(row)
+
+    def extend(self, rows):
+        self.appended.extend(rows)
+
+    def dead_rows(self) -> int:
+        """Deleted rows, counted from the live bytes without decoding any row"""
+        dead = bytes(self.live).count(0)
+        for i, row in self.overlay.items():
+            dead += (row is None) - (not self.live[i])
+        return dead + self.appended.count(None)
+
+    def views(self, row_ids=None) -> Iterator[Any]:
+        """Rows to filter: stored rows as MappedRow views, rows written since as tuples"""
+        for i in range(len(self)) if row_ids is None else row_ids:
+            if i >= self.count:
+                yield self.appended[i - self.count]
+            elif i in self.overlay:
+                yield self.overlay[i]
+            elif self.live[i]:
+                yield MappedRow(self.readers, i)
+            else:
+                yield None
+
+    def column_items(self, ordinal: int) -> Iterator[Tuple[int, Any]]:
+        """(row id, value) of one column for every live row, decoding only that column"""
+        read = self.readers[ordinal]
+        overlay = self.overlay
+        for i in range(self.count):
+            if i in overlay:
+                if overlay[i] is not None:
+                    yield i, overlay[i][ordinal]
+            elif self.live[i]:
+                yield i, read(i)
+        for i, row in enumerate(self.appended, self.count):
+            if row is not None:
+                yield i, row[ordinal]
+
+    def snapshot_items(self, ordinal: int) -> Iterator[Tuple[int, Any]]:
+        """column_items as of now: rows written afterwards don't show up, however late it is read"""
+        frozen = copy.copy(self)
+        frozen.overlay = dict(self.overlay)
+        frozen.appended = list(self.appended)
+        return frozen.column_items(ordinal)
+
+    def intern(self, name: str, intern: Callable[[Any], Any]):
+        """Pass a dict column's values through `intern`, so decoded rows share its objects"""
+        for column in self.header['layout']:
+            if column['name'] == name and column['kind'] == 'dict':
+                column['values'][:] = [intern(value) for value in column['values']]
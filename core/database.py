@@ -1,11 +1,31 @@
 import json
+import logging
 import os
 import re
+import itertools
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager, nullcontext
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Union
-from .storage import StorageEngine
-from .index import IndexManager
-import pickle
+from functools import lru_cache, partial
+from typing import Callable, Dict, Iterator, List, Any, Optional, Union
+from .storage import StorageEngine, METADATA_KEY
+from .cache import QueryCache, normalize_query
+from .changes import ChangeFeed
+from .query_log import QueryLog, QueryStats, add_rows_scanned, track
+from .profiling import QueryProfiler
+from .batching import WriteBatcher
+from .vacuum import Vacuumer
+from .metrics import (DEAD_ROWS, INDEX_LOOKUPS, QUERIES, QUERY_DURATION, ROWS_RETURNED, ROWS_SCANNED,
+                      VACUUM_PROGRESS, VACUUM_ROWS_COPIED, VACUUM_ROWS_RECLAIMED, VACUUM_RUNS, statement_type)
+from .index import IndexBuild, IndexManager, TrigramIndex, SortedIndex
+from .encoding import ColumnDictionary, encode_rows
+from .columnar import MappedRows
+from .lsm import LSMRows
+
+logger = logging.getLogger(__name__)
 
 class DataType:
     INTEGER = "INTEGER"
@@ -17,12 +37,17 @@ class DataType:
 class Column:
     def __init__(self, name: str, data_type: str, 
                  is_primary: bool = False, is_unique: bool = False,
-                 nullable: bool = True):
+                 nullable: bool = True, encoding: Optional[str] = None):
+        if encoding not in (None, 'DICT'):
+            raise ValueError(f"Unknown encoding {encoding}")
+        if encoding and data_type != DataType.TEXT:
+            raise ValueError(f"ENCODING {encoding} is only supported for TEXT columns")
         self.name = name
         self.data_type = data_type
         self.is_primary = is_primary
         self.is_unique = is_unique
         self.nullable = nullable
+        self.encoding = encoding
     
     def validate(self, value: Any) -> bool:
         if value is None:
@@ -46,13 +71,23 @@ class Column:
         except:
             return False
     
+    def coerce(self, value: Any) -> Any:
+        """Convert a number that arrived as text (UPDATE ... SET literals) to a numeric column's type"""
+        if isinstance(value, str) and self.data_type in (DataType.INTEGER, DataType.FLOAT):
+            try:
+                return int(value) if self.data_type == DataType.INTEGER else float(value)
+            except ValueError:
+                pass
+        return value
+    
     def to_dict(self):
         return {
             'name': self.name,
             'data_type': self.data_type,
             'is_primary': self.is_primary,
             'is_unique': self.is_unique,
-            'nullable': self.nullable
+            'nullable': self.nullable,
+            'encoding': self.encoding
         }
     
     @classmethod
@@ -62,237 +97,1460 @@ class Column:
             data_type=data['data_type'],
             is_primary=data.get('is_primary', False),
             is_unique=data.get('is_unique', False),
-            nullable=data.get('nullable', True)
+            nullable=data.get('nullable', True),
+            encoding=data.get('encoding')
         )
 
+INDEX_TYPES = {
+    IndexManager.index_type: IndexManager,
+    TrigramIndex.index_type: TrigramIndex,
+    'BTREE': SortedIndex,
+    'BTREE_CI': partial(SortedIndex, casefold=True),
+}
+
+@lru_cache(maxsize=256)
+def like_to_regex(pattern: str):
+    """Compile a SQL LIKE pattern into a case-insensitive regex matching the whole value"""
+    regex = ''.join('.*' if part == '%' else '.' if part == '_' else re.escape(part)
+                    for part in re.split(r'([%_])', pattern))
+    return re.compile(regex, re.IGNORECASE | re.DOTALL)
+
+def like_prefix(pattern: str) -> Optional[str]:
+    """The literal prefix of a 'prefix%' LIKE pattern, or None for any other shape"""
+    prefix = pattern.rstrip('%')
+    if prefix and prefix != pattern and '%' not in prefix and '_' not in prefix:
+        return prefix
+    return None
+
+def sort_key(value: Any, casefold: bool = False) -> tuple:
+    """Sort key putting NULLs after every value (so first when descending)"""
+    if casefold and isinstance(value, str):
+        value = value.casefold()
+    return (value is None, value)
+
+def sort_rows(rows: List[Any], order_by: List[Dict[str, Any]], get_value: Callable[[Any, str], Any]) -> List[Any]:
+    """Sort rows by ORDER BY terms using stable sorts, last term first"""
+    rows = list(rows)
+    for term in reversed(order_by):
+        rows.sort(key=lambda row: sort_key(get_value(row, term['column']), term.get('casefold', False)),
+                  reverse=term.get('direction') == 'DESC')
+    return rows
+
+def keyset_predicate(after: Dict[str, Any], order_by: Optional[List[Dict[str, Any]]],
+                     get_value: Callable[[Any, str], Any]) -> Callable[[Any], bool]:
+    """Predicate keeping rows that come strictly after a keyset cursor in ORDER BY order"""
+    terms = [(term['column'], term.get('casefold', False)) for term in order_by or []]
+    if terms != [(col['column'], col['casefold']) for col in after['columns']]:
+        raise ValueError("A row-value WHERE condition must list exactly the ORDER BY columns")
+    expected = '<' if order_by[0].get('direction') == 'DESC' else '>'
+    if after['operator'] != expected:
+        raise ValueError(f"ORDER BY ... {order_by[0].get('direction', 'ASC')} pages forward with {expected}")
+    
+    bounds = [sort_key(value, casefold) for value, (_, casefold) in zip(after['values'], terms)]
+    
+    def predicate(row) -> bool:
+        for term, bound in zip(order_by, bounds):
+            key = sort_key(get_value(row, term['column']), term.get('casefold', False))
+            if key != bound:
+                return key < bound if term.get('direction') == 'DESC' else key > bound
+        # Equal on every term is the cursor row itself
+        return False
+    
+    return predicate
+
+def compile_where(where: Optional[Dict[str, Any]], where_operator: str,
+                  ordinals: Dict[str, int], where_logic: str = 'AND',
+                  dictionaries: Optional[Dict[str, ColumnDictionary]] = None) -> Callable[[tuple], bool]:
+    """Turn a WHERE clause into a predicate over tuple rows.
+    
+    `dictionaries` maps dictionary-encoded columns to their distinct values, so
+    conditions on them are decided per distinct value rather than per row.
+    """
+    if not where:
+        return lambda row: True
+    combine = any if where_logic == 'OR' else all
+    if combine is all and any(key not in ordinals for key in where):
+        return lambda row: False
+    
+    encoded = [key for key in where if dictionaries and key in dictionaries and key in ordinals]
+    if encoded:
+        return _compile_encoded_where(where, where_operator, ordinals, combine, dictionaries)
+    
+    conditions = [(ordinals[key], value) for key, value in where.items() if key in ordinals]
+    
+    if where_operator == 'LIKE':
+        searches = [(ordinal, like_to_regex(value).fullmatch) for ordinal, value in conditions
+                    if isinstance(value, str)]
+        if combine is all and len(searches) < len(conditions):
+            return lambda row: False
+        return lambda row: combine(isinstance(row[ordinal], str) and match(row[ordinal]) is not None
+                                   for ordinal, match in searches)
+    
+    return lambda row: combine(row[ordinal] == value for ordinal, value in conditions)
+
+def _compile_encoded_where(where: Dict[str, Any], where_operator: str, ordinals: Dict[str, int],
+                           combine: Callable, dictionaries: Dict[str, ColumnDictionary]) -> Callable[[tuple], bool]:
+    """compile_where for clauses touching dictionary-encoded columns.
+    
+    A LIKE pattern is matched against each distinct value once, leaving a set
+    membership test per row. An equality value absent from the dictionary can
+    match no row; a present one is swapped for the canonical object the rows
+    share, so the comparison succeeds on identity.
+    """
+    tests = []
+    for key, value in where.items():
+        if key not in ordinals:
+            continue
+        dictionary = dictionaries.get(key)
+        if where_operator == 'LIKE':
+            if not isinstance(value, str):
+                continue
+            match = like_to_regex(value).fullmatch
+            if dictionary is not None:
+                matching = frozenset(v for v in dictionary.values if isinstance(v, str) and match(v))
+                tests.append((ordinals[key], matching.__contains__))
+            else:
+                tests.append((ordinals[key], lambda v, match=match: isinstance(v, str) and match(v) is not None))
+        elif dictionary is not None and value is not None:
+            if value not in dictionary:
+                continue
+            tests.append((ordinals[key], dictionary.get(value).__eq__))
+        else:
+            tests.append((ordinals[key], lambda v, value=value: v == value))
+    
+    if combine is all and len(tests) < len(where):
+        return lambda row: False
+    return lambda row: combine(test(row[ordinal]) is True for ordinal, test in tests)
+
+def project_row(row: Dict[str, Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Copy a row, keeping only the selected columns"""
+    if not columns or '*' in columns:
+        return row.copy()
+    return {col: row.get(col) for col in columns}
+
+def make_projector(column_names: List[str], columns: Optional[List[str]] = None) -> Callable[[tuple], Dict[str, Any]]:
+    """Build a function turning tuple rows into dicts of the selected columns"""
+    if not columns or '*' in columns:
+        return lambda row: dict(zip(column_names, row))
+    ordinals = {name: i for i, name in enumerate(column_names)}
+    picks = [(col, ordinals.get(col)) for col in columns]
+    return lambda row: {col: row[i] if i is not None else None for col, i in picks}
+
 class Table:
+    """A table whose rows are tuples ordered like `column_names`.
+    
+    Rows only become dicts on the way out of `select`; deleted rows are None.
+    """
+    
+    # Point mutations are logged; once this many pile up the log is folded into a snapshot
+    LOG_CHECKPOINT_RECORDS = 1000
+    # VACUUM copies live rows this many at a time, pacing itself between chunks
+    VACUUM_CHUNK_ROWS = 10000
+    # Copies VACUUM makes without the write lock before it copies while holding it
+    VACUUM_ATTEMPTS = 3
+    
     def __init__(self, name: str, columns: List[Column], database: 'Database'):
         self.name = name
         self.columns = {col.name: col for col in columns}
+        self.column_names = [col.name for col in columns]
+        self.ordinals = {col.name: i for i, col in enumerate(columns)}
+        self.primary_key = next((col.name for col in columns if col.is_primary), None)
+        # Distinct values of each ENCODING DICT column, rebuilt on every load
+        self.dictionaries = {col.name: ColumnDictionary() for col in columns if col.encoding == 'DICT'}
         self.database = database
+        self.storage = database.storage
         self.data = []
         self.next_id = 1
         self.indexes = {}
+        self.pk_index = {}
+        # How many live rows hold each value of every UNIQUE column, so inserts check without scanning
+        self.unique_values = {}
+        # Writes made while an index is built concurrently, queued per index for it to replay
+        self.build_queues = {}
+        # Bumped whenever the rows are replaced wholesale (reload, VACUUM), so work done
+        # against the old row ids can tell it must start over
+        self.epoch = 0
+        self.log_records = 0
+        # Inside batch(): log records waiting to be written together, else None
+        self.pending_log = None
+        self.pending_snapshot = False
+        self.version = 0
+        # Generation of the snapshot the rows were loaded from or last saved to
+        self.snapshot = None
+        self.lock = threading.RLock()
+        # Partitions report their changes under the parent table's name
+        self.feed_name = name
         self.load_data()
     
+    def make_row(self, values: Dict[str, Any]) -> tuple:
+        """Build a tuple row from column values"""
+        if self.dictionaries:
+            values = self._intern_values(values)
+        return tuple(values.get(name) for name in self.column_names)
+    
+    def _intern_values(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Swap dictionary-encoded values for the canonical objects rows share"""
+        return {name: self.dictionaries[name].intern(value) if name in self.dictionaries else value
+                for name, value in values.items()}
+    
+    def _decode_rows(self, stored_rows: List[Any], stored_columns: Optional[List[str]],
+                     stored_dictionaries: Optional[Dict[str, List[Any]]] = None) -> List[Optional[tuple]]:
+        """Convert rows read from storage (lists, or dicts in older files) to tuples"""
+        if isinstance(stored_rows, MappedRows):
+            if stored_rows.columns == self.column_names:
+                return self._adopt_mapped(stored_rows)
+            stored_rows = list(stored_rows)
+        if stored_dictionaries:
+            stored_rows = self._decode_codes(stored_rows, stored_columns, stored_dictionaries)
+        if stored_columns == self.column_names:
+            return [None if row is None else tuple(row) for row in stored_rows]
+        
+        rows = []
+        for row in stored_rows:
+            if row is None:
+                rows.append(None)
+            elif isinstance(row, dict):
+                rows.append(self.make_row(row))
+            else:
+                rows.append(self.make_row(dict(zip(stored_columns or [], row))))
+        return rows
+    
+    def _adopt_mapped(self, rows: MappedRows) -> MappedRows:
+        """Use a memory-mapped columnar file as the table's rows, sharing dictionary values"""
+        for name, dictionary in self.dictionaries.items():
+            rows.intern(name, dictionary.intern)
+        return rows
+    
+    def _column_items(self, ordinal: int) -> Iterator[tuple]:
+        """(row id, value) of one column for every live row"""
+        if not isinstance(self.data, list):
+            # Columnar files decode just this column instead of whole rows
+            return self.data.column_items(ordinal)
+        return ((i, row[ordinal]) for i, row in enumerate(self.data) if row is not None)
+    
+    def _decode_codes(self, stored_rows: List[Any], stored_columns: List[str],
+                      stored_dictionaries: Dict[str, List[Any]]) -> List[Optional[list]]:
+        """Replace dictionary codes in stored rows with the values they stand for"""
+        positions = []
+        for name, values in stored_dictionaries.items():
+            if name in self.dictionaries:
+                values = [self.dictionaries[name].intern(value) for value in values]
+            positions.append((stored_columns.index(name), values))
+        
+        rows = []
+        for row in stored_rows:
+            if row is not None:
+                row = list(row)
+                for position, values in positions:
+                    code = row[position]
+                    if code is not None:
+                        row[position] = values[code]
+            rows.append(row)
+        return rows
+    
     def load_data(self):
         """Load table data from storage"""
-        storage = StorageEngine()
-        table_data = storage.load_table(self.name)
+        with self.storage.lock(self.name, exclusive=False):
+            self.version = self.storage.get_version(self.name)
+            table_data = self.storage.load_table(self.name)
+            log = self.storage.load_log(self.name)
+        self.epoch += 1
+        self.dictionaries = {name: ColumnDictionary() for name in self.dictionaries}
         if table_data:
-            self.data = table_data.get('rows', [])
+            self.data = self._decode_rows(table_data.get('rows', []), table_data.get('columns'),
+                                          table_data.get('dictionaries'))
             self.next_id = table_data.get('next_id', 1)
+            self.snapshot = table_data.get('generation')
+        else:
+            self.data = []
+            self.next_id = 1
+            self.snapshot = None
+        
+        # Replay point changes made since the snapshot. Records of an older snapshot are
+        # left over from a crash before save_table removed the log, and already in this one
+        log = [record for record in log if record.get('snapshot', self.snapshot) == self.snapshot]
+        for record in log:
+            row_id = record['row_id']
+            if row_id >= len(self.data) or self.data[row_id] is None:
+                continue
+            if record['op'] == 'update':
+                self.data[row_id] = self._apply_values(self.data[row_id], record['values'])
+            elif record['op'] == 'delete':
+                self.data[row_id] = None
+        self.log_records = len(log)
+        self.rebuild_indexes()
     
     def save_data(self):
         """Save table data to storage"""
-        storage = StorageEngine()
-        storage.save_table(self.name, {
-            'rows': self.data,
+        if self.pending_log is not None:
+            self.pending_snapshot = True
+            return
+        table_data = {
+            'columns': self.column_names,
+            'rows': self.data if isinstance(self.data, list) else list(self.data),
             'next_id': self.next_id
-        })
+        }
+        if self.dictionaries:
+            # Dictionary-encoded columns are written as codes into one value list per column
+            table_data['rows'], table_data['dictionaries'] = encode_rows(
+                self.data, [(name, self.ordinals[name]) for name in self.dictionaries])
+        self.version = self.snapshot = self.storage.save_table(self.name, table_data)
+        self.log_records = 0
+        if self.storage.table_format == 'columnar':
+            # Read from the new file rather than keeping private copies of written rows
+            self.data = self._adopt_mapped(self.storage.load_table(self.name)['rows'])
+        self.database.invalidate_cache(self.name)
+    
+    def log_change(self, record: Dict[str, Any]):
+        """Persist a single-row change without rewriting the table"""
+        if self.pending_log is not None:
+            self.pending_log.append(record)
+            return
+        if self.log_records >= self.LOG_CHECKPOINT_RECORDS:
+            self.save_data()
+            return
+        self._append_log([record])
+    
+    def _append_log(self, records: List[Dict[str, Any]]):
+        """Write change records to the table's log in one append, tagged with the snapshot they follow"""
+        self.version = self.storage.append_log(self.name, *(dict(record, snapshot=self.snapshot)
+                                                            for record in records))
+        self.log_records += len(records)
+        self.database.invalidate_cache(self.name)
+    
+    @contextmanager
+    def batch(self):
+        """Hold the write lock across several writes and flush them to storage once.
+        
+        Logged changes made inside the block are appended in one write, and any
+        number of snapshot saves collapse into a single one at the end.
+        """
+        with self.write_lock():
+            if self.pending_log is not None:
+                yield
+                return
+            self.pending_log = []
+            self.pending_snapshot = False
+            try:
+                yield
+            finally:
+                records, self.pending_log = self.pending_log, None
+                if self.pending_snapshot or self.log_records + len(records) > self.LOG_CHECKPOINT_RECORDS:
+                    self.save_data()
+                elif records:
+                    self._append_log(records)
+    
+    def refresh(self):
+        """Reload the table if another process has written it since we last loaded"""
+        if self.storage.get_version(self.name) != self.version:
+            with self.lock:
+                self.load_data()
+            # We cannot tell which rows the other process touched
+            self.database.changes.record(self.feed_name, 'reset')
+    
+    def emit_change(self, op: str, row_id: int, row: tuple):
+        """Publish a row change to the database's change feed"""
+        values = dict(zip(self.column_names, row))
+        key = values[self.primary_key] if self.primary_key else row_id
+        self.database.changes.record(self.feed_name, op, key, None if op == 'delete' else values)
+    
+    @contextmanager
+    def write_lock(self):
+        """Serialize writers across threads and processes, syncing with disk first.
+        
+        Under group commit the writer waits for its fsync only after releasing
+        the locks, so the writers queued behind it can share the same fsync.
+        """
+        with self.lock, self.storage.lock(self.name):
+            self.refresh()
+            yield
+        self.storage.sync()
+    
+    def rebuild_indexes(self):
+        """Rebuild every index from the current rows"""
+        self.pk_index = {}
+        if self.primary_key:
+            for i, value in self._column_items(self.ordinals[self.primary_key]):
+                if value is not None:
+                    self.pk_index[value] = i
+                    # Files saved before explicit keys advanced the counter can lag behind them
+                    if isinstance(value, int) and value >= self.next_id:
+                        self.next_id = value + 1
+        
+        self.unique_values = {}
+        for col_name, col in self.columns.items():
+            if col.is_unique:
+                self.unique_values[col_name] = Counter(
+                    value for _, value in self._column_items(self.ordinals[col_name]) if value is not None)
+        
+        for index in self.indexes.values():
+            index.clear()
+            index.build(self._column_items(self.ordinals[index.column_name]))
+    
+    def _count_unique(self, row: tuple, delta: int):
+        """Add (1) or remove (-1) a row's values in the UNIQUE column counts"""
+        for col_name, counts in self.unique_values.items():
+            value = row[self.ordinals[col_name]]
+            if value is not None:
+                counts[value] += delta
+                if counts[value] <= 0:
+                    del counts[value]
+    
+    def _apply_values(self, row: tuple, values: Dict[str, Any]) -> tuple:
+        """Return a copy of a row with some columns replaced"""
+        if self.dictionaries:
+            values = self._intern_values(values)
+        new_row = list(row)
+        for col_name, value in values.items():
+            new_row[self.ordinals[col_name]] = value
+        return tuple(new_row)
+    
+    def candidate_row_ids(self, where: Optional[Dict[str, Any]], where_operator: str = '=',
+                          where_logic: str = 'AND') -> Optional[List[int]]:
+        """Row ids the WHERE clause can match according to the primary key or an index.
+        
+        Returns None when no index applies and the table has to be scanned.
+        Candidates still have to be checked against the WHERE clause.
+        """
+        if not where:
+            return None
+        
+        if (self.primary_key and where_operator == '=' and where_logic == 'AND'
+                and self.primary_key in where):
+            row_id = self.pk_index.get(where[self.primary_key])
+            return [] if row_id is None else [row_id]
+        
+        if where_operator == '=' and where_logic == 'AND':
+            for column_name, value in where.items():
+                dictionary = self.dictionaries.get(column_name)
+                if dictionary is not None and value is not None and value not in dictionary:
+                    # Not one of the column's distinct values, so no row can match
+                    return []
+        
+        per_column = []
+        for column_name, value in where.items():
+            candidates = self._index_lookup(column_name, value, where_operator)
+            if candidates is None and where_logic == 'OR':
+                # One unindexed branch of an OR means every row is a candidate
+                return None
+            if candidates is not None:
+                per_column.append(candidates)
+        
+        if not per_column:
+            return None
+        if where_logic == 'OR':
+            return sorted(set().union(*per_column))
+        return sorted(set.intersection(*per_column))
+    
+    def _index_lookup(self, column_name: str, value: Any, where_operator: str) -> Optional[set]:
+        """Candidate row ids for one condition from a suitable index, if there is one"""
+        for index in self.indexes.values():
+            if index.column_name != column_name:
+                continue
+            if where_operator == '=' and isinstance(index, IndexManager):
+                return set(index.search(column_name, value))
+            if where_operator == '=' and isinstance(index, SortedIndex):
+                # Ordered keys are compared, so numeric text is looked up as the column's type
+                return set(index.search(column_name, self.columns[column_name].coerce(value)))
+            if where_operator == 'LIKE' and isinstance(index, TrigramIndex) and isinstance(value, str):
+                candidates = index.search_like(value)
+                if candidates is not None:
+                    return candidates
+            # LIKE is case-insensitive, so only a case-folded ordered index can serve a prefix range
+            if (where_operator == 'LIKE' and isinstance(index, SortedIndex) and index.casefold
+                    and isinstance(value, str) and like_prefix(value)):
+                return set(index.search_prefix(like_prefix(value)))
+        return None
     
     def insert(self, values: Dict[str, Any]) -> int:
         """Insert a new row into the table"""
-        # Validate all columns
-        for col_name, col in self.columns.items():
-            if col.is_primary and col_name not in values:
-                if col.data_type == DataType.INTEGER:
-                    values[col_name] = self.next_id
-                    self.next_id += 1
-                else:
-                    raise ValueError(f"Primary key {col_name} must be provided")
-            
-            if col_name in values:
-                if not col.validate(values[col_name]):
-                    raise ValueError(f"Invalid value for column {col_name}")
-            elif not col.nullable:
-                raise ValueError(f"Column {col_name} cannot be null")
+        return self.insert_many([values])[0]
+    
+    def insert_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Insert several rows with one validation pass, one index pass and one save.
         
-        # Check unique constraints
-        for col_name, col in self.columns.items():
-            if col.is_unique and col_name in values:
-                for row in self.data:
-                    if row.get(col_name) == values[col_name]:
-                        raise ValueError(f"Duplicate value for unique column {col_name}")
-        
-        # Add the row
-        row_id = len(self.data)
-        self.data.append(values.copy())
-        self.save_data()
+        Either every row is inserted or, if any row is invalid, none is. Generated
+        primary keys are written back into the value dicts. Returns the row ids.
+        """
+        with self.batch():
+            # Generated keys are only kept if the whole batch is valid. next_id was
+            # just refreshed under the exclusive lock, so no other process holds it
+            next_id, generated = self._prepare_rows(rows)
+            try:
+                if self.primary_key:
+                    keys = set()
+                    for values in rows:
+                        key = values.get(self.primary_key)
+                        if key is None:
+                            continue
+                        if key in self.pk_index or key in keys:
+                            raise ValueError(f"Duplicate value for primary key {self.primary_key}")
+                        keys.add(key)
+                        # Explicit keys move the counter past them, so generated ones never collide
+                        if isinstance(key, int) and key >= next_id:
+                            next_id = key + 1
+                
+                # Check unique constraints against the table and within the batch
+                for col_name, stored in self.unique_values.items():
+                    seen = set()
+                    for values in rows:
+                        value = values.get(col_name)
+                        if value is None:
+                            continue
+                        if value in stored or value in seen:
+                            raise ValueError(f"Duplicate value for unique column {col_name}")
+                        seen.add(value)
+            except ValueError:
+                for values, col_name in generated:
+                    del values[col_name]
+                raise
+            self.next_id = next_id
+            
+            # Add the rows
+            first_id = len(self.data)
+            new_rows = [self.make_row(values) for values in rows]
+            self.data.extend(new_rows)
+            row_ids = list(range(first_id, first_id + len(new_rows)))
+            self.save_data()
+            
+            # Update indexes
+            if self.primary_key:
+                pk = self.ordinals[self.primary_key]
+                for row_id, row in zip(row_ids, new_rows):
+                    if row[pk] is not None:
+                        self.pk_index[row[pk]] = row_id
+            for row in new_rows:
+                self._count_unique(row, 1)
+            for index in self.indexes.values():
+                ordinal = self.ordinals[index.column_name]
+                for row_id, row in zip(row_ids, new_rows):
+                    index.add(row_id, {index.column_name: row[ordinal]})
+            if self.build_queues:
+                for row_id, row in zip(row_ids, new_rows):
+                    self._queue_for_builds(row_id, None, row)
+            for row_id, row in zip(row_ids, new_rows):
+                self.emit_change('insert', row_id, row)
+            
+            return row_ids
+    
+    def _prepare_rows(self, rows: List[Dict[str, Any]]) -> tuple:
+        """Validate rows to insert, filling in missing integer primary keys from next_id.
         
-        # Update indexes
-        for index_name, index in self.indexes.items():
-            index.add(row_id, values)
+        Returns the counter's next value and the (values, column) pairs given a
+        generated key, for the caller to undo if a later check fails. If a row is
+        invalid the keys are undone here and ValueError is raised.
+        """
+        for values in rows:
+            for col_name in values:
+                if col_name not in self.columns:
+                    raise ValueError(f"Column {col_name} does not exist")
         
-        return row_id
+        next_id = self.next_id
+        generated = []
+        try:
+            for values in rows:
+                for col_name, col in self.columns.items():
+                    if col.is_primary and col_name not in values:
+                        if col.data_type == DataType.INTEGER:
+                            values[col_name] = next_id
+                            generated.append((values, col_name))
+                            next_id += 1
+                        else:
+                            raise ValueError(f"Primary key {col_name} must be provided")
+                    
+                    if col_name in values:
+                        if not col.validate(values[col_name]):
+                            raise ValueError(f"Invalid value for column {col_name}")
+                    elif not col.nullable:
+                        raise ValueError(f"Column {col_name} cannot be null")
+        except ValueError:
+            for values, col_name in generated:
+                del values[col_name]
+            raise
+        return next_id, generated
     
-    def select(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=') -> List[Dict[str, Any]]:
+    def iter_rows(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+                  where_logic: str = 'AND') -> Iterator[tuple]:
+        """Yield matching rows as tuples lazily, so a LIMIT stops the scan early"""
+        self.refresh()
+        # VACUUM may swap in renumbered rows mid-scan; keep reading the ones we started with
+        data = self.data
+        predicate = compile_where(where, where_operator, self.ordinals, where_logic, self.dictionaries)
+        row_ids = self.candidate_row_ids(where, where_operator, where_logic)
+        if where:
+            INDEX_LOOKUPS.inc(result='miss' if row_ids is None else 'hit')
+        access = 'full_scan' if row_ids is None else 'index'
+        self.report_plan(access, where, row_ids)
+        mapped = not isinstance(data, list)
+        if mapped:
+            # Rows read from files; columnar views decode only the columns the WHERE clause reads
+            rows = data.views(row_ids)
+        else:
+            rows = data if row_ids is None else (data[i] for i in row_ids)
+        scanned = 0
+        try:
+            with self.database.operator(access, table=self.name):
+                for row in rows:
+                    scanned += 1
+                    if row is not None and predicate(row):
+                        yield tuple(row) if mapped else row
+        finally:
+            add_rows_scanned(scanned)
+    
+    def select_rows(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+                    where_logic: str = 'AND') -> List[tuple]:
+        """Select matching rows as tuples, without copying them"""
+        return list(self.iter_rows(where, where_operator, where_logic))
+    
+    def select(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+               columns: Optional[List[str]] = None, where_logic: str = 'AND') -> List[Dict[str, Any]]:
         """Select rows from the table with WHERE clause"""
-        results = []
+        to_dict = make_projector(self.column_names, columns)
+        return [to_dict(row) for row in self.select_rows(where, where_operator, where_logic)]
+    
+    def count(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+              where_logic: str = 'AND') -> int:
+        """Count rows matching a WHERE clause"""
+        return sum(1 for _ in self.iter_rows(where, where_operator, where_logic))
+    
+    def scan_ordered(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+                     where_logic: str = 'AND', order_by: Optional[List[Dict[str, Any]]] = None,
+                     after: Optional[Dict[str, Any]] = None) -> Iterator[tuple]:
+        """Yield matching rows in ORDER BY order, walking a sorted index when one fits.
         
-        for row in self.data:
-            match = True
-            if where:
-                for key, value in where.items():
-                    if key not in row:
-                        match = False
-                        break
-                    
-                    row_value = row[key]
-                    
-                    if where_operator == '=':
-                        if row_value != value:
-                            match = False
-                            break
-                    elif where_operator == 'LIKE':
-                        if isinstance(value, str) and isinstance(row_value, str):
-                            # Convert SQL LIKE pattern to regex
-                            pattern = value.replace('%', '.*').replace('_', '.')
-                            import re
-                            if not re.search(pattern, row_value, re.IGNORECASE):
-                                match = False
-                                break
-                        else:
-                            match = False
-                            break
-            
-            if match:
-                results.append(row.copy())
+        `after` is a keyset cursor; only rows ordered after it are yielded. Rows
+        are produced lazily, so callers can stop after one page.
+        """
+        for term in order_by or []:
+            if term['column'] not in self.ordinals:
+                raise ValueError(f"Column {term['column']} does not exist")
         
-        return results
-
+        def get_value(row, column):
+            return row[self.ordinals[column]]
+        
+        keep = keyset_predicate(after, order_by, get_value) if after else None
+        
+        if not order_by:
+            yield from self.iter_rows(where, where_operator, where_logic)
+            return
+        
+        self.refresh()
+        # Taken before the index, so a VACUUM swapping both can't pair new row ids with old rows
+        data = self.data
+        first = order_by[0]
+        index = next((index for index in self.indexes.values()
+                      if isinstance(index, SortedIndex) and index.column_name == first['column']
+                      and index.casefold == first.get('casefold', False)), None)
+        
+        # An index lookup already narrowed things down; sorting the few candidates is cheaper
+        if index is None or self.candidate_row_ids(where, where_operator, where_logic) is not None:
+            rows = self.iter_rows(where, where_operator, where_logic)
+            if keep:
+                rows = filter(keep, rows)
+            with self.database.operator('sort', table=self.name):
+                rows = sort_rows(rows, order_by, get_value)
+            yield from rows
+            return
+        
+        INDEX_LOOKUPS.inc(result='hit')
+        self.report_plan('ordered_index', where, index=index.index_type, column=index.column_name)
+        predicate = compile_where(where, where_operator, self.ordinals, where_logic, self.dictionaries)
+        # The cursor's first value lets the walk start at its key instead of the top
+        start = (after['values'][0],) if after else None
+        with self.database.operator('ordered_index', table=self.name, index=index.index_type,
+                                    column=index.column_name):
+            for row_ids in index.ordered_groups(descending=first.get('direction') == 'DESC', start=start):
+                add_rows_scanned(len(row_ids))
+                rows = [data[i] for i in row_ids if data[i] is not None and predicate(data[i])]
+                if keep:
+                    rows = [row for row in rows if keep(row)]
+                # Rows sharing the first key still need ordering by the remaining terms
+                if len(rows) > 1 and len(order_by) > 1:
+                    rows = sort_rows(rows, order_by[1:], get_value)
+                yield from rows
+    
+    def report_plan(self, access: str, where: Optional[Dict[str, Any]], row_ids: Optional[List[int]] = None,
+                    **info: Any):
+        """Tell plan hooks how a WHERE clause is being answered"""
+        if self.database.hooks['plan']:
+            self.database.emit('plan', dict(info, table=self.name, access=access, where=where,
+                                            candidates=None if row_ids is None else len(row_ids)))
+    
     def update(self, set_values: Dict[str, Any], where: Optional[Dict[str, Any]] = None, where_operator: str = '=') -> int:
         """Update rows in the table"""
-        updated_count = 0
-        
-        for i, row in enumerate(self.data):
-            match = True
-            if where:
-                for key, value in where.items():
-                    if key not in row:
-                        match = False
-                        break
-                    
-                    row_value = row[key]
-                    
-                    if where_operator == '=':
-                        if row_value != value:
-                            match = False
-                            break
-                    elif where_operator == 'LIKE':
-                        if isinstance(value, str) and isinstance(row_value, str):
-                            pattern = value.replace('%', '.*').replace('_', '.')
-                            import re
-                            if not re.search(pattern, row_value, re.IGNORECASE):
-                                match = False
-                                break
-                        else:
-                            match = False
-                            break
+        with self.write_lock():
+            set_values = self._check_set_values(set_values)
             
-            if match:
-                # Validate new values
-                for col_name, new_value in set_values.items():
-                    if col_name in self.columns:
-                        col = self.columns[col_name]
-                        if not col.validate(new_value):
-                            raise ValueError(f"Invalid value for column {col_name}")
+            updated_ids = []
+            predicate = compile_where(where, where_operator, self.ordinals, dictionaries=self.dictionaries)
+            row_ids = self.candidate_row_ids(where, where_operator)
+            if row_ids is None:
+                row_ids = range(len(self.data))
+            row_ids = [i for i in row_ids if self.data[i] is not None and predicate(self.data[i])]
+            
+            key = set_values.get(self.primary_key) if self.primary_key else None
+            if key is not None and row_ids:
+                # A key can only go to one row, and not to one another row already has
+                if len(row_ids) > 1 or self.pk_index.get(key, row_ids[0]) != row_ids[0]:
+                    raise ValueError(f"Duplicate value for primary key {self.primary_key}")
+                if isinstance(key, int) and key >= self.next_id:
+                    self.next_id = key + 1
+            for col_name, stored in self.unique_values.items():
+                value = set_values.get(col_name)
+                if value is None or not row_ids:
+                    continue
+                # After the update the value is held by the rows updated plus any others holding it now
+                ordinal = self.ordinals[col_name]
+                own = sum(1 for i in row_ids if self.data[i][ordinal] == value)
+                if stored[value] - own + len(row_ids) > 1:
+                    raise ValueError(f"Duplicate value for unique column {col_name}")
+        
+            for i in row_ids:
+                old_row = self.data[i]
                 
-                # Update the row
-                old_row = row.copy()
-                row.update(set_values)
-                updated_count += 1
+                # Rows are immutable tuples, so swap in an updated copy
+                row = self._apply_values(old_row, set_values)
+                self.data[i] = row
+                updated_ids.append(i)
                 
                 # Update indexes
+                if self.primary_key in set_values:
+                    pk = self.ordinals[self.primary_key]
+                    self.pk_index.pop(old_row[pk], None)
+                    self.pk_index[row[pk]] = i
+                if self.unique_values:
+                    self._count_unique(old_row, -1)
+                    self._count_unique(row, 1)
                 for index_name, index in self.indexes.items():
-                    index.update(i, old_row, row)
+                    col = index.column_name
+                    ordinal = self.ordinals[col]
+                    index.update(i, {col: old_row[ordinal]}, {col: row[ordinal]})
+                if self.build_queues:
+                    self._queue_for_builds(i, old_row, row)
         
-        if updated_count > 0:
-            self.save_data()
+            # A single changed row is logged; anything bigger rewrites the snapshot
+            if len(updated_ids) == 1:
+                self.log_change({'op': 'update', 'row_id': updated_ids[0], 'values': set_values})
+            elif updated_ids:
+                self.save_data()
+            for i in updated_ids:
+                self.emit_change('update', i, self.data[i])
         
-        return updated_count
+            return len(updated_ids)
 
+    def _check_set_values(self, set_values: Dict[str, Any]) -> Dict[str, Any]:
+        """The SET values of an UPDATE converted to their columns' types, raising if any is invalid"""
+        for col_name in set_values:
+            if col_name not in self.columns:
+                raise ValueError(f"Column {col_name} does not exist")
+        set_values = {col_name: self.columns[col_name].coerce(value) for col_name, value in set_values.items()}
+        for col_name, new_value in set_values.items():
+            if not self.columns[col_name].validate(new_value):
+                raise ValueError(f"Invalid value for column {col_name}")
+        return set_values
+    
     def delete(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=') -> int:
-        """Delete rows from the table"""
-        deleted_indices = []
-        
-        for i, row in enumerate(self.data):
-            match = True
-            if where:
-                for key, value in where.items():
-                    if key not in row:
-                        match = False
-                        break
-                    
-                    row_value = row[key]
-                    
-                    if where_operator == '=':
-                        if row_value != value:
-                            match = False
-                            break
-                    elif where_operator == 'LIKE':
-                        if isinstance(value, str) and isinstance(row_value, str):
-                            pattern = value.replace('%', '.*').replace('_', '.')
-                            import re
-                            if not re.search(pattern, row_value, re.IGNORECASE):
-                                match = False
-                                break
-                        else:
-                            match = False
-                            break
-            
-            if match:
-                deleted_indices.append(i)
+        """Delete rows from the table.
         
-        # Remove in reverse order
-        for i in sorted(deleted_indices, reverse=True):
-            old_row = self.data.pop(i)
+        Deleted rows are left as None tombstones so row ids (and the indexes
+        that point at them) stay stable.
+        """
+        with self.write_lock():
+            predicate = compile_where(where, where_operator, self.ordinals, dictionaries=self.dictionaries)
+            row_ids = self.candidate_row_ids(where, where_operator)
+            if row_ids is None:
+                row_ids = range(len(self.data))
+            deleted_indices = [i for i in row_ids
+                               if self.data[i] is not None and predicate(self.data[i])]
+            deleted_rows = []
+        
+            for i in deleted_indices:
+                old_row = self.data[i]
+                self.data[i] = None
+                deleted_rows.append(old_row)
             
-            # Update indexes
-            for index_name, index in self.indexes.items():
-                index.remove(i, old_row)
+                # Update indexes
+                if self.primary_key:
+                    self.pk_index.pop(old_row[self.ordinals[self.primary_key]], None)
+                self._count_unique(old_row, -1)
+                for index_name, index in self.indexes.items():
+                    col = index.column_name
+                    index.remove(i, {col: old_row[self.ordinals[col]]})
+                if self.build_queues:
+                    self._queue_for_builds(i, old_row, None)
         
-        if deleted_indices:
-            self.save_data()
+            if len(deleted_indices) == 1:
+                self.log_change({'op': 'delete', 'row_id': deleted_indices[0]})
+            elif deleted_indices:
+                self.save_data()
+            for i, old_row in zip(deleted_indices, deleted_rows):
+                self.emit_change('delete', i, old_row)
         
-        return len(deleted_indices)
+            return len(deleted_indices)
     
     
-    def create_index(self, column_name: str, index_name: Optional[str] = None):
+    def create_index(self, column_name: str, index_name: Optional[str] = None, index_type: str = 'HASH'):
         """Create an index on a column"""
         if column_name not in self.columns:
             raise ValueError(f"Column {column_name} does not exist")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type}")
         
         if not index_name:
             index_name = f"idx_{self.name}_{column_name}"
         
-        index = IndexManager()
-        # Build index from existing data
-        for i, row in enumerate(self.data):
-            if column_name in row:
-                index.add(i, {column_name: row[column_name]})
+        index = INDEX_TYPES[index_type](column_name)
+        with self.lock:
+            self.refresh()
+            # Build index from existing data
+            index.build(self._column_items(self.ordinals[column_name]))
+            
+            self.indexes[index_name] = index
+    
+    def build_index_concurrently(self, column_name: str, index_name: str, index_type: str, build: IndexBuild,
+                                 guard: Callable = nullcontext, published: Callable[[], None] = lambda: None):
+        """Build an index without blocking writers, then publish it; runs in a background thread.
         
-        self.indexes[index_name] = index
+        The index is built from a snapshot of the rows taken under the write
+        lock. Writes made from then on are queued and replayed, first without
+        the lock and then, to catch the last few, under it, where the index is
+        published. `guard` is a context manager factory held around that
+        final step and `published` is called inside it (the database holds its
+        metadata lock there and saves the metadata). If the rows were reloaded
+        or vacuumed meanwhile, the build starts over from a new snapshot.
+        """
+        ordinal = self.ordinals[column_name]
+        while True:
+            queue = deque()
+            with self.write_lock():
+                data, epoch = self.data, self.epoch
+                if isinstance(data, list):
+                    # Rows are immutable tuples, so copying the list is a snapshot
+                    rows = list(data)
+                    items = ((i, row[ordinal]) for i, row in enumerate(rows) if row is not None)
+                else:
+                    items = data.snapshot_items(ordinal)
+                total = len(data)
+                self.build_queues[index_name] = queue
+            base = build.rows_done
+            build.rows_total += total
+            try:
+                index = INDEX_TYPES[index_type](column_name)
+                index.build(build.track(items, base))
+                build.rows_done = base + total
+                self._replay_writes(index, queue)
+                with guard(), self.write_lock():
+                    if self.epoch == epoch:
+                        self._replay_writes(index, queue)
+                        self.indexes[index_name] = index
+                        published()
+                        return
+            finally:
+                with self.lock:
+                    if self.build_queues.get(index_name) is queue:
+                        del self.build_queues[index_name]
+            build.rows_done = base
+            build.rows_total -= total
+            build.restarts += 1
+    
+    def _queue_for_builds(self, row_id: int, old_row: Optional[tuple], new_row: Optional[tuple]):
+        """Record a row change for every index being built concurrently"""
+        for queue in self.build_queues.values():
+            queue.append((row_id, old_row, new_row))
+    
+    def _replay_writes(self, index: Any, queue: deque):
+        """Apply queued row changes to an index built from an older snapshot, oldest first"""
+        column_name = index.column_name
+        ordinal = self.ordinals[column_name]
+        while queue:
+            row_id, old_row, new_row = queue.popleft()
+            if old_row is not None:
+                index.remove(row_id, {column_name: old_row[ordinal]})
+            if new_row is not None:
+                index.add(row_id, {column_name: new_row[ordinal]})
     
     def drop_index(self, index_name: str):
         """Drop an index"""
         if index_name in self.indexes:
             del self.indexes[index_name]
+    
+    def storage_names(self) -> List[str]:
+        """Names of every storage file backing this table"""
+        return [self.name]
+    
+    def dead_rows(self) -> int:
+        """Deleted rows still taking space, which VACUUM would reclaim"""
+        if not isinstance(self.data, list):
+            return self.data.dead_rows()
+        return self.data.count(None)
+    
+    def vacuum_units(self) -> List['Table']:
+        """The tables background VACUUM checks and vacuums one at a time"""
+        return [self]
+    
+    def vacuum(self, rows_per_second: float = 0, trigger: str = 'manual') -> Dict[str, Any]:
+        """Drop deleted rows for good, renumber the live ones and fold the change log into a snapshot.
+        
+        Live rows are copied and the indexes rebuilt without holding the write
+        lock, at most `rows_per_second` rows a second if that is set, and the
+        result is swapped in under the lock if nothing was written meanwhile.
+        Readers never wait, and writers only wait for the swap and the save.
+        When writes keep winning, the last attempt copies under the lock.
+        """
+        started = time.perf_counter()
+        result = None
+        for attempt in range(self.VACUUM_ATTEMPTS):
+            self.refresh()
+            data, version, index_names = self.data, self.version, set(self.indexes)
+            if not self.dead_rows():
+                result = self._checkpoint()
+                break
+            copied = self._copy_live(data, rows_per_second)
+            with self.write_lock():
+                if self.data is data and self.version == version and set(self.indexes) == index_names:
+                    result = self._install_vacuumed(len(data), *copied)
+                    break
+        else:
+            with self.write_lock():
+                if self.dead_rows():
+                    result = self._install_vacuumed(len(self.data), *self._copy_live(self.data))
+                else:
+                    result = self._checkpoint()
+        
+        VACUUM_RUNS.inc(trigger=trigger)
+        DEAD_ROWS.set(0, table=self.name)
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        return result
+    
+    def _checkpoint(self) -> Dict[str, Any]:
+        """Fold logged changes into the snapshot; the VACUUM of a table with nothing to reclaim"""
+        with self.write_lock():
+            if self.log_records:
+                self.save_data()
+            return {'table': self.name, 'rows': len(self.data), 'reclaimed': 0}
+    
+    def _copy_live(self, data, rows_per_second: float = 0) -> tuple:
+        """The live rows of `data` renumbered from 0, with a primary-key map, indexes and
+        dictionaries built over them"""
+        total = len(data)
+        started = time.perf_counter()
+        rows = []
+        for first in range(0, total, self.VACUUM_CHUNK_ROWS):
+            chunk = [row for row in data[first:first + self.VACUUM_CHUNK_ROWS] if row is not None]
+            rows.extend(chunk)
+            VACUUM_ROWS_COPIED.inc(len(chunk))
+            done = min(first + self.VACUUM_CHUNK_ROWS, total)
+            VACUUM_PROGRESS.set(round(done / total, 4), table=self.name)
+            if rows_per_second:
+                delay = done / rows_per_second - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+        
+        pk_index = {}
+        if self.primary_key:
+            pk = self.ordinals[self.primary_key]
+            pk_index = {row[pk]: i for i, row in enumerate(rows) if row[pk] is not None}
+        indexes = {}
+        for index_name, index in list(self.indexes.items()):
+            ordinal = self.ordinals[index.column_name]
+            indexes[index_name] = INDEX_TYPES[index.index_type](index.column_name)
+            indexes[index_name].build((i, row[ordinal]) for i, row in enumerate(rows))
+        # Values no live row uses any more drop out of the dictionaries
+        dictionaries = {}
+        for name in self.dictionaries:
+            ordinal = self.ordinals[name]
+            dictionaries[name] = ColumnDictionary()
+            for row in rows:
+                dictionaries[name].intern(row[ordinal])
+        return rows, pk_index, indexes, dictionaries
+    
+    def _install_vacuumed(self, total: int, rows: List[tuple], pk_index: Dict[Any, int],
+                          indexes: Dict[str, Any], dictionaries: Dict[str, ColumnDictionary]) -> Dict[str, Any]:
+        """Swap in rows and indexes built by _copy_live and save them; call with the write lock held"""
+        self.data = rows
+        self.epoch += 1
+        self.pk_index = pk_index
+        self.indexes = indexes
+        self.dictionaries = dictionaries
+        self.save_data()
+        if not self.primary_key:
+            # Changes were keyed by row id, and row ids just changed
+            self.database.changes.record(self.feed_name, 'reset')
+        VACUUM_ROWS_RECLAIMED.inc(total - len(rows))
+        return {'table': self.name, 'rows': len(rows), 'reclaimed': total - len(rows)}
+
+class LSMTable(Table):
+    """A table kept in a log-structured merge tree (CREATE TABLE ... USING LSM).
+    
+    Rows are not held in memory: `data` is an LSMRows view, so writes go to the
+    store's memtable and are committed with one log append, and reads go to the
+    memtable and the sorted runs on disk. Indexes and the primary-key map stay in
+    memory. Meant for append-heavy tables with occasional point reads; full
+    scans read every run.
+    """
+    
+    def load_data(self):
+        """Open the table's LSM store, replacing any store opened before"""
+        previous = self.__dict__.get('store')
+        if previous is not None:
+            previous.close()
+        with self.storage.lock(self.name, exclusive=False):
+            self.version = self.storage.get_version(self.name)
+            self.store = self.storage.open_lsm(self.name, guard=self.write_lock, changed=self._compacted)
+        self.epoch += 1
+        self.data = LSMRows(self.store)
+        self.next_id = self.store.meta.get('next_id', 1)
+        self.log_records = 0
+        
+        self.dictionaries = {name: ColumnDictionary() for name in self.dictionaries}
+        if self.dictionaries:
+            ordinals = [(self.ordinals[name], dictionary) for name, dictionary in self.dictionaries.items()]
+            for row in self.data:
+                if row is not None:
+                    for ordinal, dictionary in ordinals:
+                        dictionary.intern(row[ordinal])
+        self.rebuild_indexes()
+    
+    def save_data(self):
+        """Commit buffered writes; there is no snapshot to rewrite"""
+        if self.pending_log is not None:
+            self.pending_snapshot = True
+            return
+        self._append_log([])
+    
+    def _append_log(self, records: List[Dict[str, Any]]):
+        # The rows were already written to the memtable; the store logs them itself
+        self.store.commit({'next_id': self.next_id})
+        self.version = self.storage.bump_version(self.name)
+        self.log_records = 0
+        self.database.invalidate_cache(self.name)
+    
+    def _compacted(self):
+        """Compaction replaced runs; other processes must reopen the store"""
+        self.version = self.storage.bump_version(self.name)
+    
+    def dead_rows(self) -> int:
+        # Unknown without reading every run; compaction reclaims LSM space on its own
+        return 0
+    
+    def vacuum_units(self) -> List[Table]:
+        return []
+    
+    def vacuum(self, rows_per_second: float = 0, trigger: str = 'manual') -> Dict[str, Any]:
+        """Flush the memtable and merge every run into one, dropping tombstones and old versions.
+        
+        Row ids are the store's keys, so they are kept rather than renumbered
+        and the indexes stay valid.
+        """
+        started = time.perf_counter()
+        with self.write_lock():
+            if self.store.memtable:
+                self.store.flush()
+                self._compacted()
+        
+        def progress(done):
+            VACUUM_PROGRESS.set(round(min(done / total, 1), 4), table=self.name)
+            if rows_per_second:
+                delay = done / rows_per_second - (time.perf_counter() - merge_started)
+                if delay > 0:
+                    time.sleep(delay)
+        
+        for attempt in range(self.VACUUM_ATTEMPTS):
+            levels = self.store.levels
+            total = max(1, sum(run.count for level in levels for run in level))
+            merge_started = time.perf_counter()
+            merged = self.store.compact_all(progress)
+            if merged is not None:
+                break
+        else:
+            raise RuntimeError(f"VACUUM of {self.name} kept losing to background compaction")
+        
+        read, written = merged
+        VACUUM_ROWS_COPIED.inc(written)
+        VACUUM_ROWS_RECLAIMED.inc(read - written)
+        VACUUM_RUNS.inc(trigger=trigger)
+        return {'table': self.name, 'rows': written, 'reclaimed': read - written,
+                'seconds': round(time.perf_counter() - started, 3)}
+    
+    def close(self):
+        self.store.close()
+
+class PartitionedTable(Table):
+    """A table split by HASH or RANGE on one column.
+    
+    Each partition is a child Table with its own storage file and indexes, so a
+    write only rewrites the partition it lands in. The parent file just keeps the
+    shared auto-increment counter.
+    """
+    
+    def __init__(self, name: str, columns: List[Column], database: 'Database',
+                 partition_spec: Dict[str, Any]):
+        self.partition_spec = partition_spec
+        self.partitions = {}
+        super().__init__(name, columns, database)
+    
+    def partition_names(self) -> List[str]:
+        if self.partition_spec['type'] == 'HASH':
+            return [f"p{i}" for i in range(self.partition_spec['partitions'])]
+        return [r['name'] for r in self.partition_spec['ranges']]
+    
+    def load_data(self):
+        """Load the shared counter and attach any partitions not loaded yet"""
+        with self.storage.lock(self.name, exclusive=False):
+            self.version = self.storage.get_version(self.name)
+            table_data = self.storage.load_table(self.name)
+        self.next_id = table_data.get('next_id', 1) if table_data else 1
+        
+        names = self.partition_names()
+        for partition_name in list(self.partitions):
+            if partition_name not in names:
+                del self.partitions[partition_name]
+        for partition_name in names:
+            if partition_name not in self.partitions:
+                self.partitions[partition_name] = Table(
+                    f"{self.name}__{partition_name}", list(self.columns.values()), self.database)
+                self.partitions[partition_name].feed_name = self.name
+        # Partitions move their counters past keys they store; the shared one must not lag behind
+        self.next_id = max([self.next_id] + [partition.next_id for partition in self.partitions.values()])
+    
+    def rebuild_indexes(self):
+        for partition in self.partitions.values():
+            partition.rebuild_indexes()
+    
+    def storage_names(self) -> List[str]:
+        return [self.name] + [partition.name for partition in self.partitions.values()]
+    
+    def dead_rows(self) -> int:
+        return sum(partition.dead_rows() for partition in self.partitions.values())
+    
+    def vacuum_units(self) -> List[Table]:
+        return list(self.partitions.values())
+    
+    def vacuum(self, rows_per_second: float = 0, trigger: str = 'manual') -> Dict[str, Any]:
+        """Vacuum one partition at a time, so writes to the others never wait"""
+        results = [partition.vacuum(rows_per_second, trigger) for partition in self.vacuum_units()]
+        return {'table': self.name, 'rows': sum(result['rows'] for result in results),
+                'reclaimed': sum(result['reclaimed'] for result in results),
+                'seconds': round(sum(result['seconds'] for result in results), 3)}
+    
+    def route(self, value: Any) -> Table:
+        """Find the partition a partition-column value belongs to"""
+        if self.partition_spec['type'] == 'HASH':
+            bucket = zlib.crc32(str(value).encode('utf-8')) % self.partition_spec['partitions']
+            return self.partitions[f"p{bucket}"]
+        
+        for r in self.partition_spec['ranges']:
+            try:
+                if value is None or r['less_than'] is None or value < r['less_than']:
+                    return self.partitions[r['name']]
+            except TypeError:
+                # Not comparable with the bounds (text for a numeric column, say)
+                break
+        raise ValueError(f"No partition of {self.name} accepts value {value!r}")
+    
+    def prune(self, where: Optional[Dict[str, Any]], where_operator: str = '=',
+              where_logic: str = 'AND') -> List[Table]:
+        """Partitions that can hold rows matching the WHERE clause"""
+        column = self.partition_spec['column']
+        if where and where_operator == '=' and where_logic == 'AND' and column in where:
+            try:
+                return [self.route(where[column])]
+            except ValueError:
+                return []
+        return list(self.partitions.values())
+    
+    def insert(self, values: Dict[str, Any]) -> int:
+        """Insert a row into the partition its partition-column value routes to"""
+        return self.insert_many([values])[0]
+    
+    def _check_unique(self, rows: List[Dict[str, Any]], replaced: List[Dict[str, Any]] = ()):
+        """Unique columns and the primary key span every partition, so check new rows against all of them.
+        
+        `replaced` are rows the same write removes, whose values are free to reuse.
+        """
+        partitions = list(self.partitions.values())
+        for partition in partitions:
+            partition.refresh()
+        # Partitions keep a key map and UNIQUE value counts, so nothing is scanned
+        for col_name, col in self.columns.items():
+            if col.is_primary:
+                stored = lambda value: sum(value in partition.pk_index for partition in partitions)
+            elif col.is_unique:
+                stored = lambda value: sum(partition.unique_values[col_name][value] for partition in partitions)
+            else:
+                continue
+            freed = Counter(row.get(col_name) for row in replaced)
+            seen = set()
+            for values in rows:
+                value = values.get(col_name)
+                if value is None:
+                    continue
+                if value in seen or stored(value) > freed[value]:
+                    kind = 'primary key' if col.is_primary else 'unique column'
+                    raise ValueError(f"Duplicate value for {kind} {col_name}")
+                seen.add(value)
+    
+    def insert_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Insert rows into the partitions they route to; either all of them or, if any is invalid, none.
+        
+        Every row is validated, routed and checked against unique constraints
+        across all partitions before anything is written, and a generated key
+        is only taken from the shared counter once the whole batch passes.
+        Returns the row ids within each row's partition.
+        """
+        with self.write_lock():
+            next_id, generated = self._prepare_rows(rows)
+            try:
+                targets = [self.route(values.get(self.partition_spec['column'])) for values in rows]
+                self._check_unique(rows)
+            except ValueError:
+                for values, col_name in generated:
+                    del values[col_name]
+                raise
+            
+            by_partition = {}
+            for position, target in enumerate(targets):
+                by_partition.setdefault(target.name, (target, []))[1].append(position)
+            row_ids = [None] * len(rows)
+            # Each partition written to flushes once, after every partition has its rows
+            with ExitStack() as stack:
+                for name in sorted(by_partition):
+                    stack.enter_context(by_partition[name][0].batch())
+                for target, positions in by_partition.values():
+                    for position, row_id in zip(positions, target.insert_many([rows[i] for i in positions])):
+                        row_ids[position] = row_id
+            
+            keys = [values.get(self.primary_key) for values in rows] if self.primary_key else []
+            next_id = max([next_id] + [key + 1 for key in keys if isinstance(key, int)])
+            if next_id != self.next_id:
+                self.next_id = next_id
+                self.save_data()
+            return row_ids
+    
+    def select(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+               columns: Optional[List[str]] = None, where_logic: str = 'AND') -> List[Dict[str, Any]]:
+        self.refresh()
+        results = []
+        for partition in self.prune(where, where_operator, where_logic):
+            results.extend(partition.select(where, where_operator, columns, where_logic))
+        return results
+    
+    def iter_rows(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+                  where_logic: str = 'AND') -> Iterator[tuple]:
+        self.refresh()
+        for partition in self.prune(where, where_operator, where_logic):
+            yield from partition.iter_rows(where, where_operator, where_logic)
+    
+    def scan_ordered(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+                     where_logic: str = 'AND', order_by: Optional[List[Dict[str, Any]]] = None,
+                     after: Optional[Dict[str, Any]] = None) -> Iterator[tuple]:
+        def get_value(row, column):
+            return row[self.ordinals[column]]
+        
+        for term in order_by or []:
+            if term['column'] not in self.ordinals:
+                raise ValueError(f"Column {term['column']} does not exist")
+        rows = self.iter_rows(where, where_operator, where_logic)
+        if after:
+            rows = filter(keyset_predicate(after, order_by, get_value), rows)
+        if order_by:
+            with self.database.operator('sort', table=self.name):
+                rows = sort_rows(rows, order_by, get_value)
+        yield from rows
+    
+    def count(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=',
+              where_logic: str = 'AND') -> int:
+        self.refresh()
+        return sum(partition.count(where, where_operator, where_logic)
+                   for partition in self.prune(where, where_operator, where_logic))
+    
+    def update(self, set_values: Dict[str, Any], where: Optional[Dict[str, Any]] = None, where_operator: str = '=') -> int:
+        """Update rows, moving them between partitions if the partition column changes.
+        
+        Moved rows are validated, routed and checked against every unique
+        constraint before any is deleted, so a failing UPDATE leaves them all in place.
+        """
+        with self.write_lock():
+            set_values = self._check_set_values(set_values)
+            column = self.partition_spec['column']
+            partitions = self.prune(where, where_operator)
+            moving = column in set_values
+            if not moving and not any(self.columns[name].is_primary or self.columns[name].is_unique
+                                      for name in set_values):
+                return sum(partition.update(set_values, where, where_operator)
+                           for partition in partitions)
+            
+            sources, old_rows, new_rows, targets = [], [], [], []
+            for partition in partitions:
+                rows = partition.select(where, where_operator)
+                if rows:
+                    sources.append(partition)
+                for row in rows:
+                    old_rows.append(row)
+                    new_rows.append(dict(row, **set_values))
+                    targets.append(self.route(new_rows[-1].get(column)) if moving else partition)
+            self._check_unique(new_rows, replaced=old_rows)
+            if not moving:
+                return sum(partition.update(set_values, where, where_operator) for partition in sources)
+            
+            # Every partition involved writes its deletes and inserts in one flush
+            with ExitStack() as stack:
+                for partition in sorted({p.name: p for p in sources + targets}.values(), key=lambda p: p.name):
+                    stack.enter_context(partition.batch())
+                for partition in sources:
+                    partition.delete(where, where_operator)
+                for row, target in zip(new_rows, targets):
+                    target.insert(row)
+            return len(new_rows)
+    
+    def delete(self, where: Optional[Dict[str, Any]] = None, where_operator: str = '=') -> int:
+        with self.write_lock():
+            return sum(partition.delete(where, where_operator)
+                       for partition in self.prune(where, where_operator))
+    
+    def create_index(self, column_name: str, index_name: Optional[str] = None, index_type: str = 'HASH'):
+        """Create the index on every partition"""
+        if column_name not in self.columns:
+            raise ValueError(f"Column {column_name} does not exist")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type}")
+        
+        if not index_name:
+            index_name = f"idx_{self.name}_{column_name}"
+        
+        for partition in self.partitions.values():
+            partition.create_index(column_name, index_name, index_type)
+        # The parent keeps an empty definition so the schema lists the index
+        self.indexes[index_name] = INDEX_TYPES[index_type](column_name)
+    
+    def build_index_concurrently(self, column_name: str, index_name: str, index_type: str, build: IndexBuild,
+                                 guard: Callable = nullcontext, published: Callable[[], None] = lambda: None):
+        """Build the index on one partition after another; it is listed once every partition has it"""
+        for partition in list(self.partitions.values()):
+            partition.build_index_concurrently(column_name, index_name, index_type, build, guard)
+        with guard():
+            self.indexes[index_name] = INDEX_TYPES[index_type](column_name)
+            published()
+    
+    def drop_index(self, index_name: str):
+        for partition in self.partitions.values():
+            partition.drop_index(index_name)
+        super().drop_index(index_name)
+    
+    def add_partitions(self, ranges: List[Dict[str, Any]]):
+        """Append RANGE partitions above the current highest bound"""
+        if self.partition_spec['type'] != 'RANGE':
+            raise ValueError("Partitions can only be added to RANGE partitioned tables")
+        
+        existing = self.partition_spec['ranges']
+        for r in ranges:
+            if r['name'] in self.partitions:
+                raise ValueError(f"Partition {r['name']} already exists")
+            last = existing[-1]['less_than'] if existing else None
+            if existing and (last is None or (r['less_than'] is not None and r['less_than'] <= last)):
+                raise ValueError("New RANGE partitions must be above the highest existing bound")
+            existing.append(r)
+        
+        with self.lock:
+            self.load_data()
+            for index_name, index in self.indexes.items():
+                for partition in self.partitions.values():
+                    if index_name not in partition.indexes:
+                        partition.create_index(index.column_name, index_name, index.index_type)
+    
+    def drop_partition(self, partition_name: str):
+        """Drop a RANGE partition and all of its rows at once"""
+        if self.partition_spec['type'] != 'RANGE':
+            raise ValueError("Only RANGE partitions can be dropped")
+        if partition_name not in self.partitions:
+            raise ValueError(f"Partition {partition_name} does not exist")
+        
+        with self.lock:
+            partition = self.partitions.pop(partition_name)
+            self.partition_spec['ranges'] = [r for r in self.partition_spec['ranges']
+                                             if r['name'] != partition_name]
+            with self.storage.lock(partition.name):
+                self.storage.delete_table(partition.name)
+            self.database.changes.record(self.name, 'reset')
 
 class Database:
-    def __init__(self, name: str = "default"):
+    # Events that hooks can be attached to with add_hook or the on_* helpers
+    HOOK_EVENTS = ('parse', 'plan', 'operator_start', 'operator_end', 'storage_io')
+    
+    def __init__(self, name: str = "default", query_cache_bytes: int = 64 * 1024 * 1024,
+                 slow_query_ms: float = 100.0, durability: str = 'off', write_batch_ms: float = 0.0,
+                 table_format: str = 'json', autovacuum_seconds: float = 0.0,
+                 vacuum_rows_per_second: float = 50000):
         self.name = name
         self.tables = {}
-        self.storage = StorageEngine()
+        # durability is 'always', 'group(<ms>)' or 'off'; table_format is 'json' or
+        # 'blocks(<codec>)'; see StorageEngine
+        self.storage = StorageEngine(durability=durability, table_format=table_format)
+        # SELECT results are cached up to this many bytes; 0 turns the cache off
+        self.query_cache = QueryCache(query_cache_bytes) if query_cache_bytes else None
+        self.changes = ChangeFeed()
+        # Fingerprinted history, slow-query log and per-fingerprint latencies
+        self.query_log = QueryLog(slow_query_ms=slow_query_ms)
+        self.hooks = {event: [] for event in self.HOOK_EVENTS}
+        # Storage reports its own IO, so those hooks live on the engine
+        self.hooks['storage_io'] = self.storage.io_listeners
+        self.profiler = QueryProfiler()
+        # Concurrent single-row writes through batched_insert/batched_update share one flush
+        self.write_batcher = WriteBatcher(self, write_batch_ms / 1000)
+        # CREATE INDEX CONCURRENTLY builds by (table, index name), while running or after failing
+        self.index_builds = {}
+        self.metadata_version = 0
+        self.lock = threading.RLock()
         self.load_metadata()
+        # Every this many seconds a background thread vacuums tables with many deleted rows
+        self.vacuumer = Vacuumer(self, autovacuum_seconds, vacuum_rows_per_second) if autovacuum_seconds else None
+    
+    def close(self):
+        """Stop background vacuuming and close LSM stores"""
+        if self.vacuumer is not None:
+            self.vacuumer.stop()
+        for table in self.tables.values():
+            if isinstance(table, LSMTable):
+                table.close()
     
     def load_metadata(self):
         """Load database metadata from storage"""
-        metadata = self.storage.load_metadata()
+        with self.storage.lock(METADATA_KEY, exclusive=False):
+            self.metadata_version = self.storage.get_version(METADATA_KEY)
+            metadata = self.storage.load_metadata()
         if metadata:
-            for table_name, table_info in metadata.get('tables', {}).items():
-                columns = [Column.from_dict(col_data) for col_data in table_info['columns']]
-                self.tables[table_name] = Table(table_name, columns, self)
+            table_defs = metadata.get('tables', {})
+            for table_name in list(self.tables):
+                if table_name not in table_defs:
+                    table = self.tables.pop(table_name)
+                    if isinstance(table, LSMTable):
+                        table.close()
+            for table_name, table_info in table_defs.items():
+                table = self.tables.get(table_name)
+                if table is not None:
+                    if isinstance(table, PartitionedTable) and table_info.get('partition'):
+                        table.partition_spec = table_info['partition']
+                        table.load_data()
+                else:
+                    columns = [Column.from_dict(col_data) for col_data in table_info['columns']]
+                    if table_info.get('partition'):
+                        table = PartitionedTable(table_name, columns, self, table_info['partition'])
+                    elif table_info.get('engine') == 'LSM':
+                        table = LSMTable(table_name, columns, self)
+                    else:
+                        table = Table(table_name, columns, self)
+                    self.tables[table_name] = table
+                self._sync_indexes(table, table_info.get('indexes', []))
+    
+    def _sync_indexes(self, table: Table, index_defs: List[Dict[str, Any]]):
+        """Make a table's indexes match the definitions stored in the metadata"""
+        wanted = {index_def['name']: index_def for index_def in index_defs}
+        for index_name in list(table.indexes):
+            if index_name not in wanted:
+                table.drop_index(index_name)
+        for index_name, index_def in wanted.items():
+            if index_name not in table.indexes:
+                table.create_index(index_def['column'], index_name, index_def.get('type', 'HASH'))
     
     def save_metadata(self):
         """Save database metadata to storage"""
@@ -304,52 +1562,410 @@ class Database:
             metadata['tables'][table_name] = {
                 'columns': [col.to_dict() for col in table.columns.values()]
             }
+            if isinstance(table, PartitionedTable):
+                metadata['tables'][table_name]['partition'] = table.partition_spec
+            if isinstance(table, LSMTable):
+                metadata['tables'][table_name]['engine'] = 'LSM'
+            if table.indexes:
+                metadata['tables'][table_name]['indexes'] = [
+                    {'name': index_name, 'column': index.column_name, 'type': index.index_type}
+                    for index_name, index in table.indexes.items()
+                ]
         
-        self.storage.save_metadata(metadata)
+        self.metadata_version = self.storage.save_metadata(metadata)
+        # DDL can change what any cached query would return
+        if self.query_cache is not None:
+            self.query_cache.clear()
+    
+    def invalidate_cache(self, name: str):
+        """Drop cached results that read a table or partition which was just written"""
+        if self.query_cache is not None:
+            self.query_cache.invalidate(name)
     
-    def create_table(self, name: str, columns: List[Column]):
-        """Create a new table"""
-        if name in self.tables:
-            raise ValueError(f"Table {name} already exists")
+    def refresh(self):
+        """Pick up tables created or dropped by other processes"""
+        if self.storage.get_version(METADATA_KEY) != self.metadata_version:
+            with self.lock:
+                self.load_metadata()
+    
+    def create_table(self, name: str, columns: List[Column], partition: Optional[Dict[str, Any]] = None,
+                     engine: Optional[str] = None):
+        """Create a new table; `engine` 'LSM' stores it in a log-structured merge tree"""
+        if engine not in (None, 'LSM'):
+            raise ValueError(f"Unknown table engine {engine}")
+        if engine and partition:
+            raise ValueError("LSM tables cannot be partitioned")
+        with self.lock, self.storage.lock(METADATA_KEY):
+            self.refresh()
+            if name in self.tables:
+                raise ValueError(f"Table {name} already exists")
+            
+            # Validate only one primary key
+            primary_keys = [col for col in columns if col.is_primary]
+            if len(primary_keys) > 1:
+                raise ValueError("Only one primary key allowed per table")
+            
+            if partition:
+                table = PartitionedTable(name, columns, self, partition)
+            elif engine == 'LSM':
+                table = LSMTable(name, columns, self)
+            else:
+                table = Table(name, columns, self)
+            self.tables[name] = table
+            self.save_metadata()
+            return table
+    
+    def create_index_concurrently(self, table_name: str, column_name: str, index_name: Optional[str] = None,
+                                  index_type: str = 'HASH') -> IndexBuild:
+        """Start building an index in a background thread and return its progress object at once.
         
-        # Validate only one primary key
-        primary_keys = [col for col in columns if col.is_primary]
-        if len(primary_keys) > 1:
-            raise ValueError("Only one primary key allowed per table")
+        Writers are not blocked while it builds; queries use the index once it
+        has caught up and is published, which is also when it is saved in the
+        metadata. Builds are tracked in `index_builds` until they finish, and
+        failed ones stay there so their error can be seen.
+        """
+        table = self.get_table(table_name)
+        if not table:
+            raise ValueError(f"Table {table_name} not found")
+        if column_name not in table.columns:
+            raise ValueError(f"Column {column_name} does not exist")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type}")
+        if not index_name:
+            index_name = f"idx_{table.name}_{column_name}"
+        
+        with self.lock:
+            key = (table.name, index_name)
+            if index_name in table.indexes or (key in self.index_builds and self.index_builds[key].state == 'building'):
+                raise ValueError(f"Index {index_name} already exists")
+            build = IndexBuild(table.name, index_name, column_name, index_type)
+            self.index_builds[key] = build
+        threading.Thread(target=self._run_index_build, args=(table, build), name=f"rdbms-index-{index_name}",
+                         daemon=True).start()
+        return build
+    
+    def _run_index_build(self, table: Table, build: IndexBuild):
+        @contextmanager
+        def guard():
+            with self.lock, self.storage.lock(METADATA_KEY):
+                self.refresh()
+                if self.tables.get(table.name) is not table:
+                    raise ValueError(f"Table {table.name} was dropped")
+                yield
         
-        table = Table(name, columns, self)
-        self.tables[name] = table
-        self.save_metadata()
-        return table
+        try:
+            table.build_index_concurrently(build.column_name, build.index_name, build.index_type, build,
+                                           guard, self.save_metadata)
+        except Exception as e:
+            logger.exception("Building index %s on %s failed", build.index_name, table.name)
+            build.finish(e)
+            return
+        build.finish()
+        with self.lock:
+            # Published indexes are listed with the table's other indexes from now on
+            if self.index_builds.get((table.name, build.index_name)) is build:
+                del self.index_builds[(table.name, build.index_name)]
     
     def drop_table(self, name: str):
         """Drop a table"""
-        if name in self.tables:
-            del self.tables[name]
-            self.storage.delete_table(name)
+        with self.lock, self.storage.lock(METADATA_KEY):
+            self.refresh()
+            if name in self.tables:
+                table = self.tables.pop(name)
+                if isinstance(table, LSMTable):
+                    table.close()
+                for storage_name in table.storage_names():
+                    with self.storage.lock(storage_name):
+                        self.storage.delete_table(storage_name)
+                self.save_metadata()
+                self.changes.record(name, 'reset')
+    
+    def alter_partitions(self, name: str, add: Optional[List[Dict[str, Any]]] = None,
+                         drop: Optional[str] = None):
+        """Add or drop RANGE partitions of a partitioned table"""
+        with self.lock, self.storage.lock(METADATA_KEY):
+            self.refresh()
+            table = self.tables.get(name)
+            if not isinstance(table, PartitionedTable):
+                raise ValueError(f"Table {name} is not partitioned")
+            if add:
+                table.add_partitions(add)
+            if drop:
+                table.drop_partition(drop)
             self.save_metadata()
     
+    def vacuum(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """VACUUM one table, or every table; returns what each one reclaimed"""
+        if name:
+            table = self.get_table(name)
+            if not table:
+                raise ValueError(f"Table {name} not found")
+            tables = [table]
+        else:
+            self.refresh()
+            tables = list(self.tables.values())
+        return [table.vacuum() for table in tables]
+    
     def get_table(self, name: str) -> Optional[Table]:
         """Get a table by name"""
+        self.refresh()
         return self.tables.get(name)
     
-    def execute_query(self, query: str) -> Any:
-        """Execute a SQL-like query"""
+    def add_hook(self, event: str, callback: Callable[[Dict[str, Any]], None]) -> Callable[[Dict[str, Any]], None]:
+        """Call `callback(info)` whenever an execution event happens.
+        
+        Hooks run synchronously on the thread executing the statement, so they
+        should be cheap; an exception raised by a hook fails the statement.
+        Returns the callback, so the on_* helpers also work as decorators.
+        """
+        if event not in self.hooks:
+            raise ValueError(f"Unknown hook event {event}")
+        self.hooks[event].append(callback)
+        return callback
+    
+    def remove_hook(self, event: str, callback: Callable[[Dict[str, Any]], None]):
+        if callback in self.hooks.get(event, []):
+            self.hooks[event].remove(callback)
+    
+    def on_parse(self, callback):
+        """Hook receiving {'query', 'parsed', 'duration'} after a statement is parsed"""
+        return self.add_hook('parse', callback)
+    
+    def on_plan(self, callback):
+        """Hook receiving {'table', 'access', 'where', 'candidates', ...} when a scan strategy is chosen"""
+        return self.add_hook('plan', callback)
+    
+    def on_operator_start(self, callback):
+        """Hook receiving {'operator', ...} when a statement or one of its steps starts"""
+        return self.add_hook('operator_start', callback)
+    
+    def on_operator_end(self, callback):
+        """Hook receiving {'operator', 'duration', ...} when a statement or one of its steps ends"""
+        return self.add_hook('operator_end', callback)
+    
+    def on_storage_io(self, callback):
+        """Hook receiving {'name', 'operation', 'direction', 'bytes'} for every table file read or write"""
+        return self.add_hook('storage_io', callback)
+    
+    def emit(self, event: str, info: Dict[str, Any]):
+        for callback in self.hooks[event]:
+            callback(info)
+    
+    @contextmanager
+    def operator(self, name: str, **info: Any) -> Iterator[None]:
+        """Report the block as one operator to the operator_start/operator_end hooks.
+        
+        Operators wrapping lazy scans start with the first row pulled and end
+        when the scan is exhausted or closed.
+        """
+        if not self.hooks['operator_start'] and not self.hooks['operator_end']:
+            yield
+            return
+        info['operator'] = name
+        self.emit('operator_start', info)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.emit('operator_end', dict(info, duration=time.perf_counter() - start))
+    
+    @staticmethod
+    def sql_parser():
+        """The SQL parser module, imported lazily"""
         try:
-            from parser.sql_parser import parse_query
+            from parser import sql_parser
         except ImportError:
             import sys
             import os
             parser_path = os.path.join(os.path.dirname(__file__), '..', 'parser')
             if parser_path not in sys.path:
                 sys.path.append(parser_path)
-            from sql_parser import parse_query
+            import sql_parser
+        return sql_parser
+    
+    @staticmethod
+    def parse(query: str) -> Dict[str, Any]:
+        """Parse a SQL-like query"""
+        return Database.sql_parser().parse_query(query)
+    
+    def parse_statement(self, query: str) -> Dict[str, Any]:
+        """Parse a query and report it to the parse hooks"""
+        start = time.perf_counter()
+        parsed_query = self.parse(query)
+        if self.hooks['parse']:
+            self.emit('parse', {'query': query, 'parsed': parsed_query, 'duration': time.perf_counter() - start})
+        return parsed_query
+    
+    def execute_query(self, query: str, profile: bool = False) -> Any:
+        """Execute a SQL-like query and record it in the query log.
+        
+        With `profile` the statement is always profiled; otherwise the profiler
+        samples statements at its configured rate when it is enabled.
+        """
+        start = time.perf_counter()
+        error = None
+        with track() as stats, self.profiler.profile(force=profile):
+            try:
+                result = self._execute_query(query)
+                if isinstance(result, list):
+                    stats.rows_returned += len(result)
+                return result
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                self.record_statement(query, time.perf_counter() - start, stats, error)
+    
+    def batched_insert(self, table_name: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert one row, coalesced with concurrent inserts into the same table.
         
-        parsed_query = parse_query(query)
-        return self.execute_parsed_query(parsed_query)
+        Returns the row as stored, so callers get their own generated key.
+        """
+        return self._batched_write(f"INSERT INTO {table_name} ({', '.join(values)}) VALUES (...)",
+                                   lambda: self.write_batcher.insert(table_name, values))
+    
+    def batched_update(self, table_name: str, set_values: Dict[str, Any], where: Dict[str, Any]) -> int:
+        """UPDATE ... WHERE col = value, coalesced with concurrent writes to the same table"""
+        set_clause = ', '.join(f"{column} = ?" for column in set_values)
+        where_clause = ' AND '.join(f"{column} = ?" for column in where)
+        return self._batched_write(f"UPDATE {table_name} SET {set_clause} WHERE {where_clause}",
+                                   lambda: self.write_batcher.update(table_name, set_values, where))
+    
+    def _batched_write(self, statement: str, write: Callable[[], Any]) -> Any:
+        """Run a batched write and log it like the equivalent statement"""
+        start = time.perf_counter()
+        error = None
+        with track() as stats:
+            try:
+                return write()
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                self.record_statement(statement, time.perf_counter() - start, stats, error)
+    
+    def record_statement(self, query: str, duration: float, stats: QueryStats, error: Optional[str] = None):
+        """Add a finished statement to the query log and the engine metrics"""
+        fingerprint = self.sql_parser().fingerprint_query(query)
+        self.query_log.record(fingerprint, duration, stats, error)
+        kind = statement_type(fingerprint)
+        QUERIES.inc(type=kind, status='error' if error else 'ok')
+        QUERY_DURATION.observe(duration, type=kind)
+        ROWS_SCANNED.inc(stats.rows_scanned)
+        ROWS_RETURNED.inc(stats.rows_returned)
+    
+    def _execute_query(self, query: str) -> Any:
+        """Execute a query, answering repeated SELECTs from the result cache"""
+        key = normalize_query(query)
+        if self.query_cache is None or not key[:6].upper() == 'SELECT':
+            return self.execute_parsed_query(self.parse_statement(query))
+        
+        result = self.query_cache.get(key, self.storage.get_version)
+        if result is not None:
+            return result
+        
+        parsed_query = self.parse_statement(query)
+        # Generations are read before executing, so a concurrent write can only make the entry stale
+        versions = self._read_versions(parsed_query)
+        result = self.execute_parsed_query(parsed_query)
+        if versions is not None:
+            self.query_cache.put(key, versions, result)
+        return result
+    
+    def _read_versions(self, parsed_query: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """Current generation of every storage name a SELECT reads, or None if a table is missing"""
+        names = [parsed_query['table_name']]
+        if 'join' in parsed_query:
+            names.append(parsed_query['join']['table'])
+        if any(self.get_table(table_name) is None for table_name in names):
+            return None
+        return self.table_versions(names)
+    
+    def table_versions(self, table_names: List[str]) -> Dict[str, int]:
+        """Generation numbers of the metadata and of every storage file behind some tables.
+        
+        Only the small version files are read, so this is cheap enough to answer
+        conditional requests without loading anything. A table created or dropped
+        elsewhere shows up as a new metadata generation.
+        """
+        versions = {METADATA_KEY: self.storage.get_version(METADATA_KEY)}
+        for table_name in table_names:
+            table = self.tables.get(table_name)
+            for storage_name in table.storage_names() if table else [table_name]:
+                versions[storage_name] = self.storage.get_version(storage_name)
+        return versions
+    
+    def execute_cursor(self, query: str) -> Iterator[Dict[str, Any]]:
+        """Run a SELECT and return its rows as a lazy iterator instead of a list.
+        
+        Parsing, table lookup and the first row are done up front, so errors are
+        raised here rather than partway through consuming the cursor. Like
+        execute_query, the statement goes into the query log and metrics: at
+        once if it fails here, otherwise when the cursor is exhausted, fails
+        or is closed.
+        """
+        start = time.perf_counter()
+        with track() as stats:
+            try:
+                rows = self._open_cursor(query)
+                first = next(rows, None)
+            except Exception as e:
+                self.record_statement(query, time.perf_counter() - start, stats, str(e))
+                raise
+        rows = rows if first is None else itertools.chain([first], rows)
+        return self._tracked_cursor(query, rows, stats, start)
+    
+    def _open_cursor(self, query: str) -> Iterator[Dict[str, Any]]:
+        parsed_query = self.parse_statement(query)
+        if parsed_query.get('type') != 'SELECT':
+            raise ValueError("Only SELECT queries can be read through a cursor")
+        if 'join' in parsed_query or parsed_query.get('aggregate'):
+            return iter(self.execute_parsed_query(parsed_query))
+        
+        table = self.get_table(parsed_query['table_name'])
+        if not table:
+            raise ValueError(f"Table {parsed_query['table_name']} not found")
+        return self._select_cursor(table, parsed_query)
+    
+    def _tracked_cursor(self, query: str, rows: Iterator[Dict[str, Any]], stats: QueryStats,
+                        start: float) -> Iterator[Dict[str, Any]]:
+        """Yield a cursor's rows, counting the work into `stats`, and log the statement at the end"""
+        error = None
+        try:
+            while True:
+                # Counted only while reading, since the thread may run other statements between rows
+                with track(stats):
+                    row = next(rows, None)
+                if row is None:
+                    return
+                stats.rows_returned += 1
+                yield row
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.record_statement(query, time.perf_counter() - start, stats, error)
+    
+    def _select_cursor(self, table: Table, parsed_query: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Lazily filter, order, page and project the rows of a single-table SELECT"""
+        rows = table.scan_ordered(parsed_query.get('where'), parsed_query.get('where_operator', '='),
+                                  parsed_query.get('where_logic', 'AND'), parsed_query.get('order_by'),
+                                  parsed_query.get('after'))
+        limit = parsed_query.get('limit')
+        if limit is not None:
+            offset = parsed_query.get('offset', 0)
+            rows = itertools.islice(rows, offset, offset + limit)
+        return map(make_projector(table.column_names, parsed_query.get('columns')), rows)
     
     def execute_parsed_query(self, parsed_query: Dict[str, Any]) -> Any:
         """Execute a parsed query"""
+        with self.operator(parsed_query.get('type'), table=parsed_query.get('table_name')):
+            result = self._execute_parsed_query(parsed_query)
+        # DDL writes the metadata under database-level locks; wait for it here
+        self.storage.sync()
+        return result
+    
+    def _execute_parsed_query(self, parsed_query: Dict[str, Any]) -> Any:
         query_type = parsed_query.get('type')
         
         if query_type == 'CREATE_TABLE':
@@ -360,14 +1976,22 @@ class Database:
                     data_type=col_def['data_type'].upper(),
                     is_primary=col_def.get('primary', False),
                     is_unique=col_def.get('unique', False),
-                    nullable=col_def.get('nullable', True)
+                    nullable=col_def.get('nullable', True),
+                    encoding=col_def.get('encoding')
                 )
                 columns.append(col)
-            return self.create_table(parsed_query['table_name'], columns)
+            return self.create_table(parsed_query['table_name'], columns, parsed_query.get('partition'),
+                                     parsed_query.get('engine'))
         
         elif query_type == 'DROP_TABLE':
             return self.drop_table(parsed_query['table_name'])
         
+        elif query_type == 'ADD_PARTITION':
+            return self.alter_partitions(parsed_query['table_name'], add=parsed_query['ranges'])
+        
+        elif query_type == 'DROP_PARTITION':
+            return self.alter_partitions(parsed_query['table_name'], drop=parsed_query['partition_name'])
+        
         elif query_type == 'INSERT':
             table = self.get_table(parsed_query['table_name'])
             if not table:
@@ -381,43 +2005,70 @@ class Database:
             
             # Get WHERE operator (default to '=')
             where_operator = parsed_query.get('where_operator', '=')
-            rows = table.select(parsed_query.get('where'), where_operator)
+            where_logic = parsed_query.get('where_logic', 'AND')
+            columns = parsed_query.get('columns') or ['*']
+            aggregate = parsed_query.get('aggregate')
+            
+            order_by = parsed_query.get('order_by')
+            after = parsed_query.get('after')
+            limit = parsed_query.get('limit')
+            offset = parsed_query.get('offset', 0)
+            
+            # Without a JOIN, filters, ordering, paging, projections and counts are pushed into the scan
+            if 'join' not in parsed_query:
+                if aggregate == 'COUNT' and not after:
+                    return [{'count': table.count(parsed_query.get('where'), where_operator, where_logic)}]
+                if aggregate == 'COUNT':
+                    return [{'count': sum(1 for _ in table.scan_ordered(
+                        parsed_query.get('where'), where_operator, where_logic, order_by, after))}]
+                if not order_by and not after and limit is None:
+                    return table.select(parsed_query.get('where'), where_operator, columns, where_logic)
+                # Rows come out lazily, so only the requested page is scanned and projected
+                return list(self._select_cursor(table, parsed_query))
+            
+            rows = table.select_rows(parsed_query.get('where'), where_operator, where_logic)
             
             # Handle JOIN if specified
-            if 'join' in parsed_query:
-                join_table = self.get_table(parsed_query['join']['table'])
-                if not join_table:
-                    raise ValueError(f"Join table {parsed_query['join']['table']} not found")
-                
-                join_type = parsed_query['join']['type']
-                left_col = parsed_query['join']['on'][0]
-                right_col = parsed_query['join']['on'][1]
-                
-                joined_rows = []
+            join_table = self.get_table(parsed_query['join']['table'])
+            if not join_table:
+                raise ValueError(f"Join table {parsed_query['join']['table']} not found")
+            
+            join_type = parsed_query['join']['type']
+            left_col = parsed_query['join']['on'][0]
+            right_col = parsed_query['join']['on'][1]
+            
+            # Joined rows are built straight from the tuple rows of both tables
+            left_ordinal = table.ordinals.get(left_col)
+            right_names = [f"{join_table.name}.{col}" for col in join_table.column_names]
+            null_right = [None] * len(right_names)
+            
+            joined_rows = []
+            with self.operator('join', table=table.name, join_table=join_table.name, join_type=join_type):
                 for left_row in rows:
-                    right_rows = join_table.select({right_col: left_row.get(left_col)})
-                    
-                    if join_type == 'INNER':
-                        if right_rows:
-                            for right_row in right_rows:
-                                joined_row = left_row.copy()
-                                joined_row.update({f"{join_table.name}.{k}": v for k, v in right_row.items()})
-                                joined_rows.append(joined_row)
-                    elif join_type == 'LEFT':
-                        if right_rows:
-                            for right_row in right_rows:
-                                joined_row = left_row.copy()
-                                joined_row.update({f"{join_table.name}.{k}": v for k, v in right_row.items()})
-                                joined_rows.append(joined_row)
-                        else:
-                            joined_row = left_row.copy()
-                            for col in join_table.columns:
-                                joined_row[f"{join_table.name}.{col}"] = None
-                            joined_rows.append(joined_row)
+                    left_value = left_row[left_ordinal] if left_ordinal is not None else None
+                    right_rows = join_table.select_rows({right_col: left_value})
                 
-                rows = joined_rows
+                    if right_rows:
+                        for right_row in right_rows:
+                            joined_row = dict(zip(table.column_names, left_row))
+                            joined_row.update(zip(right_names, right_row))
+                            joined_rows.append(joined_row)
+                    elif join_type == 'LEFT':
+                        joined_row = dict(zip(table.column_names, left_row))
+                        joined_row.update(zip(right_names, null_right))
+                        joined_rows.append(joined_row)
             
-            return rows
+            if after:
+                joined_rows = list(filter(keyset_predicate(after, order_by, lambda row, column: row.get(column)),
+                                          joined_rows))
+            if aggregate == 'COUNT':
+                return [{'count': len(joined_rows)}]
+            if order_by:
+                with self.operator('sort', table=table.name):
+                    joined_rows = sort_rows(joined_rows, order_by, lambda row, column: row.get(column))
+            if limit is not None:
+                joined_rows = joined_rows[offset:offset + limit]
+            return [project_row(row, columns) for row in joined_rows]
         
         elif query_type == 'UPDATE':
             table = self.get_table(parsed_query['table_name'])
@@ -440,16 +2091,30 @@ class Database:
             return table.delete(parsed_query.get('where'), where_operator)
         
         elif query_type == 'CREATE_INDEX':
+            if parsed_query.get('concurrently'):
+                return self.create_index_concurrently(parsed_query['table_name'], parsed_query['column_name'],
+                                                      parsed_query.get('index_name'),
+                                                      parsed_query.get('index_type', 'HASH')).to_dict()
             table = self.get_table(parsed_query['table_name'])
             if not table:
                 raise ValueError(f"Table {parsed_query['table_name']} not found")
-            return table.create_index(parsed_query['column_name'], parsed_query.get('index_name'))
+            with self.lock, self.storage.lock(METADATA_KEY):
+                table.create_index(parsed_query['column_name'], parsed_query.get('index_name'),
+                                   parsed_query.get('index_type', 'HASH'))
+                self.save_metadata()
+            return None
+        
+        elif query_type == 'VACUUM':
+            return self.vacuum(parsed_query.get('table_name'))
         
         elif query_type == 'DROP_INDEX':
             table = self.get_table(parsed_query['table_name'])
             if not table:
                 raise ValueError(f"Table {parsed_query['table_name']} not found")
-            return table.drop_index(parsed_query['index_name'])
+            with self.lock, self.storage.lock(METADATA_KEY):
+                table.drop_index(parsed_query['index_name'])
+                self.save_metadata()
+            return None
         
         else:
             raise ValueError(f"Unknown query type: {query_type}")
\ No newline at end of file
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+class ColumnDictionary:
+    """Distinct values of a dictionary-encoded (TEXT ENCODING DICT) column.
+
+    In memory every row refers to the one canonical object for its value, so a
+    repeated string costs a pointer per row and equality checks hit Python's
+    identity shortcut. On disk rows hold small integer codes into a per-column
+    value list written once per snapshot. Values dropped by updates and deletes
+    stay until the table is next loaded.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def intern(self, value: Any) -> Any:
+        """The canonical object for a value, adding it if it is new"""
+        if value is None:
+            return None
+        return self.values.setdefault(value, value)
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self.values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def get(self, value: Any, default: Any = None) -> Any:
+        return self.values.get(value, default)
+
+def encode_rows(rows: List[Optional[tuple]], ordinals: List[Tuple[str, int]]
+                ) -> Tuple[List[Optional[list]], Dict[str, List[Any]]]:
+    """Replace the values at the given ordinals with codes into per-column value lists.
+
+    Codes are assigned in order of first appearance among the live rows, so
+    values no longer used by any row are left out of the file.
+    """
+    codes = {name: {} for name, _ in ordinals}
+    encoded = []
+    for row in rows:
+        if row is None:
+            encoded.append(None)
+            continue
+        row = list(row)
+        for name, ordinal in ordinals:
+            value = row[ordinal]
+            if value is not None:
+                column_codes = codes[name]
+                row[ordinal] = column_codes.setdefault(value, len(column_codes))
+        encoded.append(row)
+    return encoded, {name: list(column_codes) for name, column_codes in codes.items()}
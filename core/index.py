@@ -1,7 +1,14 @@
-from typing import Dict, List, Any
+import bisect
+import itertools
+import re
+import time
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple
 
 class IndexManager:
-    def __init__(self):
+    index_type = "HASH"
+    
+    def __init__(self, column_name: Optional[str] = None):
+        self.column_name = column_name
         self.index = {}
     
     def add(self, row_id: int, values: Dict[str, Any]):
@@ -32,6 +39,11 @@ class IndexManager:
         self.remove(row_id, old_values)
         self.add(row_id, new_values)
     
+    def build(self, items: Iterable[Tuple[int, Any]]):
+        """Index (row_id, value) pairs for this index's column in one pass"""
+        for row_id, value in items:
+            self.add(row_id, {self.column_name: value})
+    
     def search(self, column_name: str, value: Any) -> List[int]:
         """Search for row IDs by column value"""
         if column_name in self.index and value in self.index[column_name]:
@@ -41,3 +53,271 @@ class IndexManager:
     def clear(self):
         """Clear the entire index"""
         self.index = {}
+
+class TrigramIndex:
+    """Inverted index from lower-cased 3-character substrings to row ids.
+    
+    Answers LIKE '%term%' style patterns with a candidate set that the caller
+    still verifies, since trigrams can match out of order.
+    """
+    index_type = "TRIGRAM"
+    
+    def __init__(self, column_name: Optional[str] = None):
+        self.column_name = column_name
+        self.index = {}
+    
+    @staticmethod
+    def trigrams(text: str) -> Set[str]:
+        text = text.lower()
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    def add(self, row_id: int, values: Dict[str, Any]):
+        """Add a row to the index"""
+        value = values.get(self.column_name)
+        if not isinstance(value, str):
+            return
+        for gram in self.trigrams(value):
+            self.index.setdefault(gram, set()).add(row_id)
+    
+    def remove(self, row_id: int, values: Dict[str, Any]):
+        """Remove a row from the index"""
+        value = values.get(self.column_name)
+        if not isinstance(value, str):
+            return
+        for gram in self.trigrams(value):
+            row_ids = self.index.get(gram)
+            if row_ids is not None:
+                row_ids.discard(row_id)
+                if not row_ids:
+                    del self.index[gram]
+    
+    def update(self, row_id: int, old_values: Dict[str, Any], new_values: Dict[str, Any]):
+        """Update index when a row changes"""
+        self.remove(row_id, old_values)
+        self.add(row_id, new_values)
+    
+    def build(self, items: Iterable[Tuple[int, Any]]):
+        """Index (row_id, value) pairs for this index's column in one pass"""
+        for row_id, value in items:
+            self.add(row_id, {self.column_name: value})
+    
+    def search_like(self, pattern: str) -> Optional[Set[int]]:
+        """Candidate row ids for a LIKE pattern, or None if the pattern has no 3-character literal"""
+        grams = set()
+        for fragment in re.split(r'[%_]', pattern):
+            grams |= self.trigrams(fragment)
+        if not grams:
+            return None
+        
+        # Intersect the rarest posting lists first
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self.index.get(g, ()))):
+            row_ids = self.index.get(gram)
+            if not row_ids:
+                return set()
+            candidates = set(row_ids) if candidates is None else candidates & row_ids
+            if not candidates:
+                break
+        return candidates
+    
+    def clear(self):
+        """Clear the entire index"""
+        self.index = {}
+
+class SortedIndex:
+    """Ordered index kept as a sorted list of (key, row_id) pairs.
+    
+    Serves '=' lookups, prefix LIKE range scans and ORDER BY walks. With
+    casefold=True keys are compared case-insensitively, which is what LIKE
+    needs and what an A-Z listing usually wants.
+    """
+    
+    def __init__(self, column_name: Optional[str] = None, casefold: bool = False):
+        self.column_name = column_name
+        self.casefold = casefold
+        self.entries = []
+        # NULLs have no place in the ordering, so they are kept aside
+        self.nulls = set()
+    
+    @property
+    def index_type(self) -> str:
+        return "BTREE_CI" if self.casefold else "BTREE"
+    
+    def key(self, value: Any) -> Any:
+        if self.casefold and isinstance(value, str):
+            return value.casefold()
+        return value
+    
+    def add(self, row_id: int, values: Dict[str, Any]):
+        """Add a row to the index"""
+        value = values.get(self.column_name)
+        if value is None:
+            self.nulls.add(row_id)
+        else:
+            bisect.insort(self.entries, (self.key(value), row_id))
+    
+    def remove(self, row_id: int, values: Dict[str, Any]):
+        """Remove a row from the index"""
+        value = values.get(self.column_name)
+        if value is None:
+            self.nulls.discard(row_id)
+            return
+        entry = (self.key(value), row_id)
+        pos = bisect.bisect_left(self.entries, entry)
+        if pos < len(self.entries) and self.entries[pos] == entry:
+            del self.entries[pos]
+    
+    def update(self, row_id: int, old_values: Dict[str, Any], new_values: Dict[str, Any]):
+        """Update index when a row changes"""
+        self.remove(row_id, old_values)
+        self.add(row_id, new_values)
+    
+    def build(self, items: Iterable[Tuple[int, Any]]):
+        """Index (row_id, value) pairs with a single sort instead of one insertion each"""
+        for row_id, value in items:
+            if value is None:
+                self.nulls.add(row_id)
+            else:
+                self.entries.append((self.key(value), row_id))
+        self.entries.sort()
+    
+    def _bisect(self, key: Any) -> Optional[int]:
+        """Position of the first entry at or after key, or None if key can't be compared with the keys"""
+        try:
+            return bisect.bisect_left(self.entries, (key,))
+        except TypeError:
+            # A value of another type (a number looked up in a TEXT column) equals no key
+            return None
+    
+    def _range(self, low: Any, high: Any = None, high_inclusive: bool = True) -> List[int]:
+        start = self._bisect(low)
+        if start is None:
+            return []
+        row_ids = []
+        for key, row_id in itertools.islice(self.entries, start, None):
+            if high is not None and (key > high or (key == high and not high_inclusive)):
+                break
+            row_ids.append(row_id)
+        return row_ids
+    
+    def search(self, column_name: str, value: Any) -> List[int]:
+        """Search for row IDs by column value"""
+        if value is None:
+            return sorted(self.nulls)
+        key = self.key(value)
+        return self._range(key, key)
+    
+    def search_prefix(self, prefix: str) -> List[int]:
+        """Row ids whose value starts with a prefix"""
+        key = self.key(prefix)
+        start = self._bisect(key)
+        if start is None:
+            # Keys aren't text, and LIKE only matches text
+            return []
+        row_ids = []
+        for entry_key, row_id in itertools.islice(self.entries, start, None):
+            if not (isinstance(entry_key, str) and entry_key.startswith(key)):
+                break
+            row_ids.append(row_id)
+        return row_ids
+    
+    def ordered_groups(self, descending: bool = False, start: Optional[Tuple[Any]] = None) -> Iterator[List[int]]:
+        """Yield row ids grouped by equal key, in key order (NULLs last ascending, first descending).
+        
+        `start` is a 1-tuple holding a value (None for NULL); groups ordered before
+        it are skipped with a bisect instead of being walked.
+        """
+        low, high = 0, len(self.entries)
+        include_nulls = bool(self.nulls)
+        if start is not None:
+            if start[0] is None:
+                # NULLs sort last ascending, so a NULL start leaves nothing but NULLs
+                if not descending:
+                    low = high
+            else:
+                key = self.key(start[0])
+                try:
+                    if descending:
+                        high = bisect.bisect_right(self.entries, (key, float('inf')))
+                        include_nulls = False
+                    else:
+                        low = bisect.bisect_left(self.entries, (key,))
+                except TypeError:
+                    # Not comparable with the keys: walk everything and let the caller filter
+                    pass
+        
+        # List iterators tolerate the list changing under a long-running (streamed) walk
+        if descending:
+            total = len(self.entries)
+            entries = itertools.islice(reversed(self.entries), total - high, total - low)
+        else:
+            entries = itertools.islice(self.entries, low, high)
+        if descending and include_nulls:
+            yield sorted(self.nulls)
+        
+        group_key = None
+        group = []
+        for key, row_id in entries:
+            if group and key != group_key:
+                yield sorted(group)
+                group = []
+            group_key = key
+            group.append(row_id)
+        if group:
+            yield sorted(group)
+        
+        if not descending and include_nulls:
+            yield sorted(self.nulls)
+    
+    def clear(self):
+        """Clear the entire index"""
+        self.entries = []
+        self.nulls = set()
+
+class IndexBuild:
+    """Progress of a CREATE INDEX CONCURRENTLY running in the background.
+    
+    `state` goes from 'building' to 'ready' once the index is published, or to
+    'failed' with `error` set. Progress counts row ids scanned, so deleted rows
+    count too; a build restarted because the rows were reloaded or vacuumed
+    starts its count again.
+    """
+    
+    def __init__(self, table_name: str, index_name: str, column_name: str, index_type: str):
+        self.table_name = table_name
+        self.index_name = index_name
+        self.column_name = column_name
+        self.index_type = index_type
+        self.state = 'building'
+        self.error = None
+        self.rows_done = 0
+        self.rows_total = 0
+        self.restarts = 0
+        self.started = time.time()
+        self.finished = None
+    
+    def track(self, items: Iterable[Tuple[int, Any]], base: int) -> Iterator[Tuple[int, Any]]:
+        """Pass (row id, value) pairs through, counting the row ids behind them as done"""
+        for row_id, value in items:
+            self.rows_done = base + row_id + 1
+            yield row_id, value
+    
+    def finish(self, error: Optional[Exception] = None):
+        self.state = 'failed' if error else 'ready'
+        self.error = str(error) if error else None
+        self.finished = time.time()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'table_name': self.table_name,
+            'index_name': self.index_name,
+            'column_name': self.column_name,
+            'index_type': self.index_type,
+            'state': self.state,
+            'rows_done': self.rows_done,
+            'rows_total': self.rows_total,
+            'progress': round(self.rows_done / self.rows_total, 4) if self.rows_total else 0.0,
+            'restarts': self.restarts,
+            'error': self.error,
+            'seconds': round((self.finished or time.time()) - self.started, 3)
+        }
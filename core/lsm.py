@@ -0,0 +1,501 @@
+"""Log-structured merge storage for append-heavy tables.
+
+An LSMStore keeps a table's rows keyed by row id:
+
+- writes land in an in-memory memtable and are appended to a write-ahead log
+  (one sequential write per commit)
+- a full memtable is flushed to an immutable sorted run: compressed blocks of
+  keys and rows, a sparse block index, key bounds and a bloom filter
+- runs are organised in levels. Level 0 holds flushed runs, which may overlap;
+  every deeper level holds one run about `level_ratio` times larger than the
+  level above. A background thread merges level 0 into level 1 once it has
+  `level0_runs` runs, and pushes any level that outgrows its budget down
+- a manifest lists the live runs and the current log, and is replaced
+  atomically whenever that set changes
+
+Reads check the memtable, then runs from newest to oldest; a run is skipped
+without touching disk when the key is outside its bounds or its bloom filter
+says no. Deleted rows are None tombstones until they are merged into the
+bottom level, where they are dropped.
+"""
+import base64
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import zlib
+from bisect import bisect_left, bisect_right
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'RDBLSM1\n'
+FOOTER = struct.Struct('<QQ')
+RUN_BLOCK_ENTRIES = 1024
+MEMTABLE_ROWS = 10000
+LEVEL0_RUNS = 4
+LEVEL_RATIO = 10
+
+# Marks a key a source doesn't have, as opposed to a None tombstone
+_MISSING = object()
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+class BloomFilter:
+    """Set membership with no false negatives and a tunable false-positive rate"""
+
+    def __init__(self, size: int, hashes: int, bits: Optional[bytearray] = None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float = 0.01) -> 'BloomFilter':
+        capacity = max(1, capacity)
+        size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        return cls(size, max(1, round(size / capacity * math.log(2))))
+
+    def _positions(self, key: Any) -> Iterator[int]:
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: Any):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: Any) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'size': self.size, 'hashes': self.hashes, 'bits': base64.b64encode(self.bits).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'BloomFilter':
+        return cls(data['size'], data['hashes'], bytearray(base64.b64decode(data['bits'])))
+
+def write_run(f, entries: Iterable[Tuple[int, Any]], block_entries: int = RUN_BLOCK_ENTRIES):
+    """Stream sorted (key, row) pairs into a run file; rows may be None tombstones"""
+    f.write(MAGIC)
+    keys = []
+    blocks = []
+
+    def write_block(block_keys, block_rows):
+        payload = zlib.compress(_dumps([block_keys, block_rows]), 1)
+        blocks.append([block_keys[0], f.tell(), len(payload)])
+        f.write(payload)
+
+    block_keys, block_rows = [], []
+    for key, row in entries:
+        keys.append(key)
+        block_keys.append(key)
+        block_rows.append(row)
+        if len(block_keys) == block_entries:
+            write_block(block_keys, block_rows)
+            block_keys, block_rows = [], []
+    if block_keys:
+        write_block(block_keys, block_rows)
+
+    bloom = BloomFilter.for_capacity(len(keys))
+    for key in keys:
+        bloom.add(key)
+    header = {'count': len(keys), 'min_key': keys[0] if keys else None, 'max_key': keys[-1] if keys else None,
+              'blocks': blocks, 'bloom': bloom.to_dict()}
+    payload = _dumps(header)
+    offset = f.tell()
+    f.write(payload)
+    f.write(FOOTER.pack(offset, len(payload)))
+    f.write(MAGIC)
+
+class Run:
+    """An immutable sorted run file, read a block at a time"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.file = open(path, 'rb')
+        self.lock = threading.Lock()
+        self.file.seek(-(FOOTER.size + len(MAGIC)), 2)
+        offset, length = FOOTER.unpack(self.file.read(FOOTER.size))
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an LSM run, or it was truncated")
+        self.file.seek(offset)
+        header = json.loads(self.file.read(length))
+        self.count = header['count']
+        self.min_key = header['min_key']
+        self.max_key = header['max_key']
+        self.blocks = header['blocks']
+        self.first_keys = [block[0] for block in self.blocks]
+        self.bloom = BloomFilter.from_dict(header['bloom'])
+        # Point reads of nearby keys usually hit the same block
+        self.cached = (None, None)
+
+    def _read_block(self, block_id: int) -> List[list]:
+        _, offset, length = self.blocks[block_id]
+        with self.lock:
+            self.file.seek(offset)
+            payload = self.file.read(length)
+        return json.loads(zlib.decompress(payload))
+
+    def get(self, key: int) -> Any:
+        """The row stored for a key (None for a tombstone), or _MISSING"""
+        if not self.count or key < self.min_key or key > self.max_key or key not in self.bloom:
+            return _MISSING
+        block_id = bisect_right(self.first_keys, key) - 1
+        cached_id, block = self.cached
+        if cached_id != block_id:
+            block = self._read_block(block_id)
+            self.cached = (block_id, block)
+        keys, rows = block
+        i = bisect_left(keys, key)
+        return rows[i] if i < len(keys) and keys[i] == key else _MISSING
+
+    def __iter__(self) -> Iterator[Tuple[int, Any]]:
+        for block_id in range(len(self.blocks)):
+            keys, rows = self._read_block(block_id)
+            yield from zip(keys, rows)
+
+    def close(self):
+        self.file.close()
+
+def _tagged(entries: Iterable[Tuple[int, Any]], priority: int) -> Iterator[Tuple[int, int, Any]]:
+    for key, row in entries:
+        yield key, priority, row
+
+def _reporting(entries: Iterable[Tuple[int, Any]], progress: Callable[[int], None]
+               ) -> Iterator[Tuple[int, Any]]:
+    done = 0
+    for entry in entries:
+        yield entry
+        done += 1
+        if done % RUN_BLOCK_ENTRIES == 0:
+            progress(done)
+
+def merge_entries(sources: List[Iterable[Tuple[int, Any]]], drop_tombstones: bool = False
+                  ) -> Iterator[Tuple[int, Any]]:
+    """Merge sorted (key, row) sources, newest first; the newest version of each key wins"""
+    last = _MISSING
+    for key, _, row in heapq.merge(*(_tagged(source, priority) for priority, source in enumerate(sources))):
+        if key == last:
+            continue
+        last = key
+        if row is None and drop_tombstones:
+            continue
+        yield key, row
+
+class LSMStore:
+    """A table's rows in a log-structured merge tree under `directory`.
+
+    File writes go through `storage` so they are atomic, counted and made
+    durable like every other table file. `guard` is a context manager factory
+    held while compaction swaps runs (the owning table's write lock), and
+    `changed` is called under it once the swap is on disk.
+    """
+
+    def __init__(self, directory: str, storage, name: str, memtable_rows: int = MEMTABLE_ROWS,
+                 level0_runs: int = LEVEL0_RUNS, level_ratio: int = LEVEL_RATIO,
+                 guard: Optional[Callable] = None, changed: Optional[Callable[[], None]] = None):
+        self.directory = directory
+        self.storage = storage
+        self.name = name
+        self.memtable_rows = memtable_rows
+        self.level0_runs = level0_runs
+        self.level_ratio = level_ratio
+        self.guard = guard or nullcontext
+        self.changed = changed or (lambda: None)
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        manifest = self._read_manifest()
+        self.seq = manifest.get('seq', 0)
+        self.meta = manifest.get('meta', {})
+        # Readers take self.levels as a whole; it is replaced, never mutated
+        self.levels = [[Run(os.path.join(directory, run)) for run in level]
+                       for level in manifest.get('levels', [[]])]
+        self.wal_path = os.path.join(directory, manifest.get('wal') or self._next_name('wal', 'log'))
+        self.memtable = {}
+        self.pending = []
+        # Row ids are never reused, even once the tombstones of the last rows are dropped
+        self.size = max([manifest.get('size', 0)] + [run.max_key + 1 for level in self.levels
+                                                      for run in level if run.count])
+        self._replay_wal()
+
+        self.closed = False
+        self.compaction_wanted = threading.Event()
+        self.thread = None
+        if self._pick_level(self.levels) is not None:
+            self._schedule_compaction()
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(), 'rb') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, levels: List[List[Run]]):
+        manifest = {'seq': self.seq, 'meta': self.meta, 'size': self.size, 'wal': os.path.basename(self.wal_path),
+                    'levels': [[run.name for run in level] for level in levels]}
+        self.storage.write_file(self._manifest_path(), lambda f: f.write(_dumps(manifest)), self.name,
+                                'lsm_manifest')
+
+    def _next_name(self, prefix: str, extension: str) -> str:
+        with self.lock:
+            self.seq += 1
+            return f"{prefix}-{self.seq:08d}.{extension}"
+
+    def _replay_wal(self):
+        """Rebuild the memtable from writes logged since the last flush"""
+        try:
+            with open(self.wal_path, 'rb') as f:
+                lines = f.read().split(b'\n')
+        except FileNotFoundError:
+            return
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final line from a crash mid-append; everything before it is intact
+                break
+            if isinstance(record, dict):
+                self.meta = record['meta']
+            else:
+                key, row = record
+                self.memtable[key] = None if row is None else tuple(row)
+                self.size = max(self.size, key + 1)
+
+    def get(self, key: int) -> Any:
+        """The current row for a key, None if it was deleted or never written"""
+        row = self.memtable.get(key, _MISSING)
+        if row is not _MISSING:
+            return row
+        levels = self.levels
+        for run in reversed(levels[0]):
+            row = run.get(key)
+            if row is not _MISSING:
+                return row
+        for level in levels[1:]:
+            for run in level:
+                row = run.get(key)
+                if row is not _MISSING:
+                    return row
+        return None
+
+    def put(self, key: int, row: Any):
+        """Buffer a write; it reaches the log on the next commit()"""
+        self.memtable[key] = row
+        self.pending.append((key, row))
+        if key >= self.size:
+            self.size = key + 1
+
+    def items(self) -> Iterator[Tuple[int, Any]]:
+        """Every stored (key, row) in key order, tombstones included"""
+        levels = self.levels
+        sources = [sorted(self.memtable.items())]
+        sources.extend(reversed(levels[0]))
+        sources.extend(run for level in levels[1:] for run in level)
+        return merge_entries(sources)
+
+    def commit(self, meta: Optional[Dict[str, Any]] = None):
+        """Append buffered writes to the log in one write, flushing the memtable if it is full"""
+        records = [_dumps([key, row]) for key, row in self.pending]
+        self.pending = []
+        if meta is not None and meta != self.meta:
+            self.meta = dict(meta)
+            records.append(_dumps({'meta': self.meta}))
+        if records:
+            self.storage.append_file(self.wal_path, b'\n'.join(records) + b'\n', self.name, 'lsm_wal')
+        if len(self.memtable) >= self.memtable_rows:
+            self.flush()
+
+    def flush(self):
+        """Write the memtable out as a level-0 run and start a new log"""
+        if not self.memtable:
+            return
+        run_path = os.path.join(self.directory, self._next_name('run', 'sst'))
+        entries = sorted(self.memtable.items())
+        self.storage.write_file(run_path, lambda f: write_run(f, entries), self.name, 'lsm_flush')
+        old_wal = self.wal_path
+        self.wal_path = os.path.join(self.directory, self._next_name('wal', 'log'))
+        levels = [self.levels[0] + [Run(run_path)]] + self.levels[1:]
+        self._write_manifest(levels)
+        self.levels = levels
+        self.memtable = {}
+        if os.path.exists(old_wal):
+            os.remove(old_wal)
+        if self._pick_level(levels) is not None:
+            self._schedule_compaction()
+
+    def _level_budget(self, level: int) -> int:
+        return self.memtable_rows * self.level0_runs * self.level_ratio ** (level - 1)
+
+    def _pick_level(self, levels: List[List[Run]]) -> Optional[int]:
+        """The level that should be merged into the one below it, if any"""
+        if len(levels[0]) >= self.level0_runs:
+            return 0
+        for level in range(1, len(levels)):
+            if levels[level] and levels[level][0].count > self._level_budget(level):
+                return level
+        return None
+
+    def _schedule_compaction(self):
+        self.compaction_wanted.set()
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._compact_loop, name=f"rdbms-lsm-{self.name}",
+                                           daemon=True)
+            self.thread.start()
+
+    def _compact_loop(self):
+        while not self.closed:
+            self.compaction_wanted.wait()
+            self.compaction_wanted.clear()
+            try:
+                while not self.closed and self.compact_once():
+                    pass
+            except Exception:
+                logger.exception("Compaction of %s failed; retrying after the next flush", self.name)
+
+    def compact_once(self) -> bool:
+        """Merge one level into the next; returns False when no level needs it"""
+        levels = self.levels
+        level = self._pick_level(levels)
+        if level is None:
+            return False
+        newer = list(reversed(levels[0])) if level == 0 else levels[level]
+        older = levels[level + 1] if level + 1 < len(levels) else []
+        # Nothing older lies beneath the output, so tombstones can go
+        bottom = not any(levels[level + 2:])
+        return self._merge(newer + older, level + 1, bottom) is not None
+
+    def compact_all(self, progress: Optional[Callable[[int], None]] = None) -> Optional[Tuple[int, int]]:
+        """Merge every run into one at the bottom level, dropping tombstones and old versions.
+
+        `progress` is called with the number of entries merged so far every
+        block; it may sleep to slow the merge down. Returns (entries read,
+        entries written), or None if a concurrent compaction replaced the runs.
+        """
+        levels = self.levels
+        inputs = list(reversed(levels[0])) + [run for level in levels[1:] for run in level]
+        if len(inputs) == 1 and not levels[0]:
+            # A lone run below level 0 was written as the bottom level, without tombstones
+            return inputs[0].count, inputs[0].count
+        if not inputs:
+            return 0, 0
+        written = self._merge(inputs, max(1, len(levels) - 1), True, progress)
+        return None if written is None else (sum(run.count for run in inputs), written)
+
+    def _merge(self, inputs: List[Run], target: int, bottom: bool,
+               progress: Optional[Callable[[int], None]] = None) -> Optional[int]:
+        """Replace runs (newest first) with their merge at level `target`.
+
+        Every run of the target level must be among the inputs. Returns the
+        number of entries written, or None if the runs changed while merging.
+        """
+        entries = merge_entries(inputs, bottom)
+        if progress is not None:
+            entries = _reporting(entries, progress)
+        output_path = os.path.join(self.directory, self._next_name('run', 'sst'))
+        self.storage.write_file(output_path, lambda f: write_run(f, entries), self.name, 'lsm_compaction')
+        output = Run(output_path)
+
+        with self.guard():
+            current = self.levels
+            live = {run.name for current_level in current for run in current_level}
+            if self.closed or any(run.name not in live for run in inputs):
+                # The table was reloaded or dropped while we merged; this output is stale
+                output.close()
+                os.remove(output_path)
+                return None
+            merged = {run.name for run in inputs}
+            new_levels = [[run for run in current_level if run.name not in merged] for current_level in current]
+            while len(new_levels) <= target:
+                new_levels.append([])
+            new_levels[target] = [output] if output.count else []
+            self._write_manifest(new_levels)
+            self.levels = new_levels
+            self.changed()
+        written = output.count
+        if not written:
+            output.close()
+            os.remove(output_path)
+        # Readers may still hold the old runs; their open files outlive the unlink
+        for run in inputs:
+            os.remove(run.path)
+        return written
+
+    def close(self):
+        """Stop background compaction; the files stay for the next open"""
+        self.closed = True
+        self.compaction_wanted.set()
+
+class LSMRows:
+    """The list-of-rows interface a Table keeps, backed by an LSMStore.
+
+    Row ids are the keys. Indexing is a point read, iteration is a merged scan
+    of the memtable and every run, and assignment or append buffers a write.
+    """
+
+    def __init__(self, store: LSMStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return self.store.size
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += self.store.size
+        if not 0 <= i < self.store.size:
+            raise IndexError("row id out of range")
+        return i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        row = self.store.get(self._index(i))
+        return None if row is None else tuple(row)
+
+    def __setitem__(self, i: int, row: Optional[tuple]):
+        self.store.put(self._index(i), row)
+
+    def append(self, row: Optional[tuple]):
+        self.store.put(self.store.size, row)
+
+    def extend(self, rows: Iterable[Optional[tuple]]):
+        for row in rows:
+            self.append(row)
+
+    def __iter__(self) -> Iterator[Optional[tuple]]:
+        expected = 0
+        for key, row in self.store.items():
+            # Rows dropped with their tombstones read as deleted
+            for _ in range(key - expected):
+                yield None
+            yield None if row is None else tuple(row)
+            expected = key + 1
+        for _ in range(len(self) - expected):
+            yield None
+
+    def views(self, row_ids=None) -> Iterator[Optional[tuple]]:
+        if row_ids is None:
+            return iter(self)
+        return (self[i] for i in row_ids)
+
+    def column_items(self, ordinal: int) -> Iterator[Tuple[int, Any]]:
+        return ((i, row[ordinal]) for i, row in enumerate(self) if row is not None)
+
+    def snapshot_items(self, ordinal: int) -> Iterator[Tuple[int, Any]]:
+        """column_items as of now; the memtable and runs to merge are captured before returning"""
+        return ((key, row[ordinal]) for key, row in self.store.items() if row is not None)
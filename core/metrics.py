@@ -0,0 +1,148 @@
+import bisect
+import threading
+from typing import List, Optional, Tuple
+
+def _escape_label(value: str) -> str:
+    """Escape a label value as the text exposition format requires"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(tuple(str(labels.get(name, '')) for name in self.labels), 0)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in items]
+
+class Gauge(Counter):
+    """Value that can go down as well as up, optionally split by labels"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    kind = 'histogram'
+
+    # Seconds, from sub-millisecond point lookups up to multi-second scans
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> (per-bucket counts with a final +Inf slot, sum, count)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total, count = self.series.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[slot] += 1
+            self.series[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """A set of metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.metrics.setdefault(name, Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Optional[Tuple[float, ...]] = None) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help_text, labels, buckets or Histogram.DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            help_text = metric.help_text.replace('\\', '\\\\').replace('\n', '\\n')
+            lines.append(f"# HELP {metric.name} {help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Engine-wide metrics; they cover every Database in the process
+REGISTRY = MetricsRegistry()
+
+QUERIES = REGISTRY.counter('rdbms_queries_total', 'Statements executed', ('type', 'status'))
+QUERY_DURATION = REGISTRY.histogram('rdbms_query_duration_seconds', 'Statement latency', ('type',))
+ROWS_SCANNED = REGISTRY.counter('rdbms_rows_scanned_total', 'Rows examined by scans and index walks')
+ROWS_RETURNED = REGISTRY.counter('rdbms_rows_returned_total', 'Rows returned to callers')
+INDEX_LOOKUPS = REGISTRY.counter('rdbms_index_lookups_total',
+                                 'WHERE clauses planned; hit means an index narrowed the rows, miss means a full scan',
+                                 ('result',))
+STORAGE_BYTES = REGISTRY.counter('rdbms_storage_bytes_total', 'Bytes read from and written to table files',
+                                 ('direction',))
+CACHE_REQUESTS = REGISTRY.counter('rdbms_query_cache_requests_total', 'Query result cache lookups', ('result',))
+VACUUM_RUNS = REGISTRY.counter('rdbms_vacuum_runs_total', 'Tables (or partitions) vacuumed', ('trigger',))
+VACUUM_ROWS_COPIED = REGISTRY.counter('rdbms_vacuum_rows_copied_total', 'Live rows rewritten by VACUUM')
+VACUUM_ROWS_RECLAIMED = REGISTRY.counter('rdbms_vacuum_rows_reclaimed_total',
+                                         'Deleted rows and superseded row versions removed by VACUUM')
+VACUUM_PROGRESS = REGISTRY.gauge('rdbms_vacuum_progress', 'Fraction of the table copied by the current VACUUM',
+                                 ('table',))
+DEAD_ROWS = REGISTRY.gauge('rdbms_dead_rows', 'Deleted rows still taking space, as last checked', ('table',))
+
+# Statement types used as metric labels; anything else is counted as OTHER to keep label values bounded
+STATEMENT_TYPES = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE_TABLE', 'DROP_TABLE', 'CREATE_INDEX',
+                   'DROP_INDEX', 'ALTER_TABLE', 'VACUUM'}
+
+def statement_type(fingerprint: str) -> str:
+    """Statement type label for a query fingerprint"""
+    words = fingerprint.split(None, 2)
+    if not words:
+        return 'OTHER'
+    kind = words[0].upper()
+    if kind in ('CREATE', 'DROP', 'ALTER') and len(words) > 1:
+        kind = f"{kind}_{words[1].upper()}"
+    return kind if kind in STATEMENT_TYPES else 'OTHER'
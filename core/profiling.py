@@ -0,0 +1,178 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+class QueryProfiler:
+    """Profiles a sample of statements without touching the code being profiled.
+
+    Two modes:
+    - 'cprofile' runs cProfile around each sampled statement and merges the
+      results, which can be dumped as a pstats file.
+    - 'sample' is a statistical profiler: a background thread records the
+      stacks of threads running a sampled statement every `interval` seconds,
+      giving collapsed stacks for flamegraph tools.
+    """
+
+    MODES = ('cprofile', 'sample')
+
+    def __init__(self):
+        self.enabled = False
+        self.mode = 'cprofile'
+        self.sample_rate = 1.0
+        self.interval = 0.005
+        self.profiled = 0
+        self.stats = None
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        # cProfile hooks are per interpreter in newer Pythons, so only one statement is profiled at a time
+        self.cprofile_busy = threading.Lock()
+        self.active_threads = set()
+        self.sampler = None
+
+    def enable(self, sample_rate: float = 1.0, mode: str = 'cprofile', interval: float = 0.005):
+        """Start profiling a fraction of statements"""
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown profiler mode {mode}")
+        if not 0 < sample_rate <= 1:
+            raise ValueError("Sample rate must be in (0, 1]")
+        with self.lock:
+            self.mode = mode
+            self.sample_rate = sample_rate
+            self.interval = interval
+            self.enabled = True
+        if mode == 'sample':
+            self._start_sampler()
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Forget everything collected so far"""
+        with self.lock:
+            self.stats = None
+            self.stacks = Counter()
+            self.profiled = 0
+
+    def status(self) -> Dict[str, object]:
+        return {
+            'enabled': self.enabled,
+            'mode': self.mode,
+            'sample_rate': self.sample_rate,
+            'profiled': self.profiled
+        }
+
+    @contextmanager
+    def profile(self, force: bool = False) -> Iterator[None]:
+        """Profile the statement run inside the block if it is sampled (or forced)"""
+        if not force and not (self.enabled and random.random() < self.sample_rate):
+            yield
+            return
+
+        if self.mode == 'sample':
+            thread_id = threading.get_ident()
+            self._start_sampler(thread_id)
+            try:
+                yield
+            finally:
+                with self.lock:
+                    self.active_threads.discard(thread_id)
+                    self.profiled += 1
+            return
+
+        if not self.cprofile_busy.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+        finally:
+            self.cprofile_busy.release()
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+            self.profiled += 1
+
+    def _start_sampler(self, thread_id: Optional[int] = None):
+        """Start the sampling thread unless it is running, first adding `thread_id` to the threads sampled"""
+        with self.lock:
+            if thread_id is not None:
+                self.active_threads.add(thread_id)
+            if self.sampler is not None:
+                return
+            self.sampler = threading.Thread(target=self._sample_loop, name='rdbms-profiler', daemon=True)
+            self.sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            # Deciding to stop under the lock means a statement registered
+            # after this check always finds no sampler and starts a new one
+            with self.lock:
+                if not (self.enabled or self.active_threads):
+                    self.sampler = None
+                    return
+                thread_ids = list(self.active_threads)
+            frames = sys._current_frames()
+            stacks = [self._collapse(frames[thread_id]) for thread_id in thread_ids if thread_id in frames]
+            with self.lock:
+                self.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        """Render a stack root-first as 'file:function;file:function;...'"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def collapsed_stacks(self) -> str:
+        """Samples in the collapsed-stack format read by flamegraph.pl and speedscope"""
+        with self.lock:
+            stacks = dict(self.stacks)
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def pstats_bytes(self) -> Optional[bytes]:
+        """The merged cProfile results in the binary format pstats.Stats can load"""
+        with self.lock:
+            if self.stats is None:
+                return None
+            return marshal.dumps(self.stats.stats)
+
+    def dump(self, path: str):
+        """Write pstats data, or collapsed stacks for a .folded/.txt path or in sample mode"""
+        if self.mode == 'sample' or path.endswith(('.folded', '.txt')):
+            with open(path, 'w') as f:
+                f.write(self.collapsed_stacks())
+            return
+        data = self.pstats_bytes()
+        if data is None:
+            raise ValueError("No statements have been profiled yet")
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def summary(self, limit: int = 20) -> str:
+        """Top functions by cumulative time, as text"""
+        with self.lock:
+            if self.stats is None:
+                return self.collapsed_stacks() or "(no profile data)\n"
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats('cumulative').print_stats(limit)
+            return out.getvalue()
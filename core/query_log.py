@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Counters for the statement running on this thread, if one is being tracked
+_current = threading.local()
+
+class QueryStats:
+    """Work done by one statement"""
+
+    def __init__(self):
+        self.rows_scanned = 0
+        self.rows_returned = 0
+        self.bytes_written = 0
+
+@contextmanager
+def track(stats: Optional[QueryStats] = None) -> Iterator[QueryStats]:
+    """Collect QueryStats for the statement executed inside the block (nesting reuses the outer one).
+    
+    Pass the stats of an earlier block to keep counting into them, for a
+    statement whose work is spread over several blocks.
+    """
+    outer = getattr(_current, 'stats', None)
+    if outer is not None:
+        yield outer
+        return
+    stats = _current.stats = stats or QueryStats()
+    try:
+        yield stats
+    finally:
+        _current.stats = None
+
+def add_rows_scanned(count: int):
+    stats = getattr(_current, 'stats', None)
+    if stats is not None:
+        stats.rows_scanned += count
+
+def add_bytes_written(count: int):
+    stats = getattr(_current, 'stats', None)
+    if stats is not None:
+        stats.bytes_written += count
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+class QueryLog:
+    """Bounded history of executed statements, a slow-query log and per-fingerprint latencies.
+
+    Entries keep the query fingerprint and counters, never the query's result, so
+    memory stays fixed however large the results are. Latency percentiles are
+    computed over the last `samples_per_fingerprint` runs of each fingerprint.
+    """
+
+    def __init__(self, history_size: int = 200, slow_query_ms: float = 100.0, slow_log_size: int = 100,
+                 max_fingerprints: int = 500, samples_per_fingerprint: int = 1000):
+        self.history = deque(maxlen=history_size)
+        self.slow = deque(maxlen=slow_log_size)
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self.samples_per_fingerprint = samples_per_fingerprint
+        self.fingerprints = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def record(self, fingerprint: str, duration: float, stats: Optional[QueryStats] = None,
+               error: Optional[str] = None) -> Dict[str, Any]:
+        """Log one finished statement; `duration` is in seconds"""
+        stats = stats or QueryStats()
+        duration_ms = round(duration * 1000, 3)
+        with self.lock:
+            entry = {
+                'id': self.next_id,
+                'query': fingerprint,
+                'success': error is None,
+                'error': error,
+                'duration_ms': duration_ms,
+                'rows_scanned': stats.rows_scanned,
+                'rows_returned': stats.rows_returned,
+                'bytes_written': stats.bytes_written,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime())
+            }
+            self.next_id += 1
+            self.history.append(entry)
+            if duration_ms >= self.slow_query_ms:
+                self.slow.append(entry)
+
+            aggregate = self.fingerprints.get(fingerprint)
+            if aggregate is None:
+                if len(self.fingerprints) >= self.max_fingerprints:
+                    # Forget the fingerprint that has gone longest without running
+                    del self.fingerprints[min(self.fingerprints, key=lambda f: self.fingerprints[f]['last_id'])]
+                aggregate = self.fingerprints[fingerprint] = {
+                    'count': 0, 'errors': 0, 'samples': deque(maxlen=self.samples_per_fingerprint)}
+            aggregate['count'] += 1
+            aggregate['errors'] += error is not None
+            aggregate['last_id'] = entry['id']
+            aggregate['samples'].append(duration_ms)
+        return entry
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self.lock:
+            entries = list(self.history)
+        return entries[-limit:] if limit else entries
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.slow)
+
+    def aggregates(self) -> List[Dict[str, Any]]:
+        """Count and latency percentiles per fingerprint, slowest p99 first"""
+        with self.lock:
+            snapshot = [(fingerprint, aggregate['count'], aggregate['errors'], sorted(aggregate['samples']))
+                        for fingerprint, aggregate in self.fingerprints.items()]
+        results = [{
+            'query': fingerprint,
+            'count': count,
+            'errors': errors,
+            'p50_ms': percentile(samples, 0.5),
+            'p99_ms': percentile(samples, 0.99),
+            'max_ms': samples[-1] if samples else 0.0
+        } for fingerprint, count, errors, samples in snapshot]
+        return sorted(results, key=lambda result: result['p99_ms'], reverse=True)
@@ -1,43 +1,385 @@
 import json
 import os
-import pickle
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from .columnar import MappedRows, write_columnar
+from .lsm import LSMStore
+from .blockfile import CODECS, load_blocks, write_blocks
+from .metrics import STORAGE_BYTES
+from .query_log import add_bytes_written
+
+try:
+    import fcntl
+except ImportError:
+    # Advisory locking is only available on POSIX; elsewhere locks are no-ops
+    fcntl = None
+
+METADATA_KEY = "_metadata"
+
+# Group commit waits this long for more writers to join a group unless told otherwise
+DEFAULT_GROUP_COMMIT_MS = 5.0
+
+def parse_durability(durability):
+    """Parse 'always', 'off', 'group' or 'group(<ms>)' into (mode, window in seconds)"""
+    match = re.fullmatch(r'\s*(always|off|group)\s*(?:\(\s*(\d+(?:\.\d+)?)\s*\))?\s*', durability or '',
+                         re.IGNORECASE)
+    if not match or (match.group(2) and match.group(1).lower() != 'group'):
+        raise ValueError(f"Invalid durability setting {durability!r}; use always, off or group(<ms>)")
+    mode = match.group(1).lower()
+    window = float(match.group(2) or DEFAULT_GROUP_COMMIT_MS) / 1000 if mode == 'group' else 0.0
+    return mode, window
+
+def parse_table_format(table_format):
+    """Parse 'json', 'columnar', 'blocks' or 'blocks(<codec>)' into (format, codec or None)"""
+    match = re.fullmatch(r'\s*(json|columnar|blocks)\s*(?:\(\s*(\w+)\s*\))?\s*', table_format or '', re.IGNORECASE)
+    codec = match and (match.group(2) or 'zlib').lower()
+    if not match or (match.group(2) and match.group(1).lower() != 'blocks') or codec not in CODECS:
+        raise ValueError(f"Invalid table format {table_format!r}; use json, columnar, blocks, blocks(zlib) or blocks(lzma)")
+    table_format = match.group(1).lower()
+    return table_format, codec if table_format == 'blocks' else None
+
+def fsync_path(path):
+    """Flush a file's (or a directory's entries') data to stable storage"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class GroupCommitter:
+    """Background flusher that fsyncs the files written by many writers together.
+    
+    Writers register the paths they wrote and get a ticket; a flusher thread
+    waits `window` seconds for more writers to join, fsyncs every distinct path
+    once, and then releases everyone whose ticket the group covered.
+    """
+    
+    def __init__(self, window):
+        self.window = window
+        self.condition = threading.Condition()
+        self.pending = set()
+        self.requested = 0
+        self.synced = 0
+        self.error = None
+        self.thread = None
+    
+    def add(self, paths):
+        """Queue paths for the next group and return the ticket to wait for"""
+        with self.condition:
+            self.pending.update(paths)
+            self.requested += 1
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='rdbms-group-commit', daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+            return self.requested
+    
+    def wait(self, ticket):
+        """Block until the group containing `ticket` is on disk"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.synced >= ticket)
+            if self.error is not None and self.error[0] <= ticket <= self.error[1]:
+                raise OSError(f"Group commit failed: {self.error[2]}")
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.requested > self.synced)
+            # Let writers arriving within the window share this fsync
+            time.sleep(self.window)
+            with self.condition:
+                paths, self.pending = self.pending, set()
+                first, target = self.synced + 1, self.requested
+            try:
+                for path in sorted(paths):
+                    if os.path.exists(path):
+                        fsync_path(path)
+            except OSError as e:
+                with self.condition:
+                    self.error = (first, target, str(e))
+            with self.condition:
+                self.synced = target
+                self.condition.notify_all()
 
 class StorageEngine:
-    def __init__(self, base_path="data"):
+    """One snapshot file per table under `base_path`.
+    
+    Snapshots are written to a temporary file and renamed into place, so a crash
+    mid-write leaves the previous snapshot intact. `durability` decides when
+    writes reach stable storage:
+    - 'always' fsyncs every snapshot, log append and directory change before returning
+    - 'group(<ms>)' fsyncs snapshots before their rename but batches log appends and
+      directory changes from concurrent writers into one fsync per group; writers
+      wait for their group in `sync()`, after releasing their locks
+    - 'off' leaves flushing to the OS (a power loss can drop recent writes)
+    
+    `table_format` picks how snapshots are written: 'json' (indented, readable),
+    'blocks(<codec>)', compact JSON compressed per block of rows (see
+    blockfile), or 'columnar', fixed-width columns and a string heap that
+    load_table maps into memory instead of reading (see columnar). Any format is
+    read back regardless of the setting, and saving in one format removes the
+    files in the others.
+    """
+    
+    def __init__(self, base_path="data", durability="off", table_format="json"):
         self.base_path = base_path
+        self.durability, window = parse_durability(durability)
+        self.table_format, self.block_codec = parse_table_format(table_format)
+        self.group_committer = GroupCommitter(window) if self.durability == 'group' else None
+        self._pending = threading.local()
+        self._held_locks = threading.local()
+        # Called with {'name', 'operation', 'direction', 'bytes'} after every file read or write
+        self.io_listeners = []
         os.makedirs(base_path, exist_ok=True)
-    
+
+    def _count_read(self, name, operation, f):
+        self._count_io(name, operation, 'read', os.fstat(f.fileno()).st_size)
+
+    def _count_written(self, name, operation, size):
+        add_bytes_written(size)
+        self._count_io(name, operation, 'write', size)
+
+    def _count_io(self, name, operation, direction, size):
+        STORAGE_BYTES.inc(size, direction=direction)
+        for listener in self.io_listeners:
+            listener({'name': name, 'operation': operation, 'direction': direction, 'bytes': size})
+
     def get_table_path(self, table_name):
         return os.path.join(self.base_path, f"{table_name}.json")
-    
+
+    def get_block_path(self, table_name):
+        return os.path.join(self.base_path, f"{table_name}.tbl")
+
+    def get_columnar_path(self, table_name):
+        return os.path.join(self.base_path, f"{table_name}.col")
+
+    def snapshot_paths(self, table_name):
+        """Where a table's snapshot lives in each format, the configured format first"""
+        paths = {'json': self.get_table_path(table_name), 'blocks': self.get_block_path(table_name),
+                 'columnar': self.get_columnar_path(table_name)}
+        return [paths.pop(self.table_format)] + list(paths.values())
+
+    def snapshot_path(self, table_name):
+        """The table's snapshot file in whichever format it was last saved, or None"""
+        paths = [path for path in self.snapshot_paths(table_name) if os.path.exists(path)]
+        # Several exist only if a crash hit between writing one and removing the others
+        return max(paths, key=os.path.getmtime) if paths else None
+
+    def get_lsm_path(self, table_name):
+        return os.path.join(self.base_path, f"{table_name}.lsm")
+
+    def open_lsm(self, table_name, **options):
+        """Open (or create) the LSM store of a table created USING LSM"""
+        return LSMStore(self.get_lsm_path(table_name), self, table_name, **options)
+
     def get_metadata_path(self):
         return os.path.join(self.base_path, "metadata.json")
+
+    def get_log_path(self, table_name):
+        return os.path.join(self.base_path, f"{table_name}.log")
+
+    def get_lock_path(self, name):
+        return os.path.join(self.base_path, f"{name}.lock")
+
+    def get_version_path(self, name):
+        return os.path.join(self.base_path, f"{name}.version")
+
+    @contextmanager
+    def lock(self, name, exclusive=True):
+        """Hold an advisory file lock on a table (or the metadata) across processes"""
+        held = self._held_locks.__dict__
+        if name in held:
+            if exclusive and not held[name]:
+                # Converting a shared flock is not atomic: another process could write in between
+                raise RuntimeError(f"Cannot take an exclusive lock on {name} while holding a shared one")
+            # Re-entrant within a thread: flock would deadlock against our own descriptor
+            yield
+            return
+        held[name] = exclusive
+        try:
+            with self._flock(name, exclusive):
+                yield
+        finally:
+            del held[name]
+
+    @contextmanager
+    def _flock(self, name, exclusive):
+        with open(self.get_lock_path(name), 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _durable(self, *paths):
+        """Make writes to paths durable according to the durability setting"""
+        if self.durability == 'always':
+            for path in paths:
+                fsync_path(path)
+        elif self.durability == 'group':
+            self._pending.ticket = self.group_committer.add(paths)
     
-    def load_table(self, table_name):
-        table_path = self.get_table_path(table_name)
-        if os.path.exists(table_path):
-            with open(table_path, 'r') as f:
-                return json.load(f)
-        return None
+    def sync(self):
+        """Wait until this thread's grouped writes are on disk.
+        
+        Called once a writer has released its locks, so writers queued behind it
+        can join the same group. Does nothing while this thread still holds a
+        lock; the outermost writer syncs.
+        """
+        ticket = getattr(self._pending, 'ticket', None)
+        if ticket is None or self._held_locks.__dict__:
+            return
+        self._pending.ticket = None
+        self.group_committer.wait(ticket)
     
-    def save_table(self, table_name, data):
-        table_path = self.get_table_path(table_name)
-        with open(table_path, 'w') as f:
-            json.dump(data, f, indent=2)
+    def _write_atomic(self, path, write, binary=False):
+        """Write a file through a temporary file and an atomic rename; returns the bytes written"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb' if binary else 'w') as f:
+            write(f)
+            size = f.tell()
+            if self.durability != 'off':
+                # The data must be on disk before the rename can expose it
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._durable(self.base_path)
+        return size
     
+    def write_file(self, path, write, name, operation):
+        """Atomically write a binary file other than a snapshot, counting it against `name`"""
+        size = self._write_atomic(path, write, binary=True)
+        self._count_written(name, operation, size)
+        return size
+
+    def append_file(self, path, data, name, operation):
+        """Append bytes to a log file in one write, durably per the durability setting"""
+        with open(path, 'ab') as f:
+            self._count_written(name, operation, f.write(data))
+        self._durable(path)
+
+    def get_version(self, name):
+        """Return the generation number last written for a table (0 if never written)"""
+        try:
+            with open(self.get_version_path(name), 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump_version(self, name):
+        """Advance the generation number so other processes notice the change"""
+        version = self.get_version(name) + 1
+        version_path = self.get_version_path(name)
+        tmp_path = f"{version_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, version_path)
+        return version
+
+    def load_table(self, table_name):
+        table_path = self.snapshot_path(table_name)
+        if table_path is None:
+            return None
+        if table_path.endswith('.col'):
+            rows = MappedRows(table_path)
+            # Pages are read lazily as rows are touched, so only the header counts here
+            self._count_io(table_name, 'load_table', 'read', rows.header_bytes)
+            return dict({key: value for key, value in rows.header.items()
+                         if key not in ('rows', 'live', 'layout')}, columns=rows.columns, rows=rows)
+        if table_path.endswith('.tbl'):
+            with open(table_path, 'rb') as f:
+                self._count_read(table_name, 'load_table', f)
+                return load_blocks(f)
+        with open(table_path, 'r') as f:
+            self._count_read(table_name, 'load_table', f)
+            return json.load(f)
+
+    def save_table(self, table_name, data):
+        """Write a table snapshot and return its new generation number.
+        
+        The snapshot records that generation. Log records carry the generation
+        of the snapshot they follow, so if a crash hits between the rename and
+        truncating the log, loading skips the stale records rather than
+        replaying them onto the newer snapshot.
+        """
+        path, *stale_paths = self.snapshot_paths(table_name)
+        # Callers hold the table's exclusive lock, so this is what bump_version returns below
+        data = dict(data, generation=self.get_version(table_name) + 1)
+        if self.table_format == 'blocks':
+            size = self._write_atomic(path, lambda f: write_blocks(f, data, self.block_codec), binary=True)
+        elif self.table_format == 'columnar':
+            size = self._write_atomic(path, lambda f: write_columnar(f, data), binary=True)
+        else:
+            size = self._write_atomic(path, lambda f: json.dump(data, f, indent=2))
+        for stale_path in stale_paths:
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        self._count_written(table_name, 'save_table', size)
+        # The snapshot already contains every logged change
+        self.truncate_log(table_name)
+        return self.bump_version(table_name)
+
+    def append_log(self, table_name, *records):
+        """Append change records to a table's log in one write and return the new generation number"""
+        log_path = self.get_log_path(table_name)
+        with open(log_path, 'a') as f:
+            self._count_written(table_name, 'append_log',
+                                f.write(''.join(json.dumps(record) + '\n' for record in records)))
+        self._durable(log_path)
+        return self.bump_version(table_name)
+
+    def load_log(self, table_name):
+        """Read the change records written since the last snapshot"""
+        log_path = self.get_log_path(table_name)
+        if not os.path.exists(log_path):
+            return []
+        records = []
+        with open(log_path, 'r') as f:
+            self._count_read(table_name, 'load_log', f)
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crash mid-append; everything before it is intact
+                    break
+        return records
+
+    def truncate_log(self, table_name):
+        log_path = self.get_log_path(table_name)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+            self._durable(self.base_path)
+
     def delete_table(self, table_name):
-        table_path = self.get_table_path(table_name)
-        if os.path.exists(table_path):
-            os.remove(table_path)
-    
+        for table_path in self.snapshot_paths(table_name):
+            if os.path.exists(table_path):
+                os.remove(table_path)
+                self._durable(self.base_path)
+        if os.path.isdir(self.get_lsm_path(table_name)):
+            shutil.rmtree(self.get_lsm_path(table_name))
+            self._durable(self.base_path)
+        self.truncate_log(table_name)
+        # Keep the version file so generations stay monotonic if the table is recreated
+        return self.bump_version(table_name)
+
     def load_metadata(self):
         metadata_path = self.get_metadata_path()
         if os.path.exists(metadata_path):
             with open(metadata_path, 'r') as f:
+                self._count_read(METADATA_KEY, 'load_metadata', f)
                 return json.load(f)
         return {'tables': {}}
-    
+
     def save_metadata(self, metadata):
-        metadata_path = self.get_metadata_path()
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        """Write the metadata and return its new generation number"""
+        size = self._write_atomic(self.get_metadata_path(), lambda f: json.dump(metadata, f, indent=2))
+        self._count_written(METADATA_KEY, 'save_metadata', size)
+        return self.bump_version(METADATA_KEY)
@@ -0,0 +1,57 @@
+import logging
+import threading
+from typing import Any, Dict, List
+
+from .metrics import DEAD_ROWS
+
+logger = logging.getLogger(__name__)
+
+class Vacuumer:
+    """Background VACUUM of tables that have piled up deleted rows.
+
+    Every `interval` seconds the thread checks each table (each partition of a
+    partitioned table) and vacuums the ones whose deleted rows number at least
+    `min_dead_rows` and make up at least `threshold` of the table. Tables are
+    vacuumed one at a time, copying at most `rows_per_second` rows a second, so
+    foreground queries keep most of the CPU and disk. LSM tables compact
+    themselves and are left alone.
+    """
+
+    def __init__(self, database, interval: float, rows_per_second: float = 50000,
+                 threshold: float = 0.2, min_dead_rows: int = 1000):
+        self.database = database
+        self.interval = interval
+        self.rows_per_second = rows_per_second
+        self.threshold = threshold
+        self.min_dead_rows = min_dead_rows
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='rdbms-vacuum', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Background VACUUM failed; retrying in %.0fs", self.interval)
+
+    def run_once(self) -> List[Dict[str, Any]]:
+        """Check every table once and vacuum those over the threshold"""
+        self.database.refresh()
+        results = []
+        for table in list(self.database.tables.values()):
+            for unit in table.vacuum_units():
+                if self.stopped.is_set():
+                    return results
+                dead = unit.dead_rows()
+                DEAD_ROWS.set(dead, table=unit.name)
+                if dead < self.min_dead_rows or dead < self.threshold * len(unit.data):
+                    continue
+                result = unit.vacuum(self.rows_per_second, trigger='background')
+                logger.info("Vacuumed %s: reclaimed %d rows, %d left, in %.1fs",
+                            unit.name, result['reclaimed'], result['rows'], result['seconds'])
+                results.append(result)
+        return results
+
+    def stop(self):
+        self.stopped.set()
@@ -27,6 +27,30 @@ def print_result(result):
         print(result)
 
 
+def profile_command(db, args):
+    """Handle the .profile command (see print_help)"""
+    profiler = db.profiler
+    if not args:
+        print(profiler.status())
+        print(profiler.summary())
+    elif args[0] == "on":
+        rate = float(args[1]) if len(args) > 1 else 1.0
+        mode = args[2] if len(args) > 2 else "cprofile"
+        profiler.enable(rate, mode)
+        print(f"Profiling {rate:.0%} of statements ({mode})")
+    elif args[0] == "off":
+        profiler.disable()
+        print("Profiling off")
+    elif args[0] == "reset":
+        profiler.reset()
+        print("Profile cleared")
+    elif args[0] == "dump" and len(args) > 1:
+        profiler.dump(args[1])
+        print(f"Profile written to {args[1]}")
+    else:
+        print("Usage: .profile [on [rate] [cprofile|sample] | off | reset | dump <path>]")
+
+
 def print_help():
     print("""
 Supported commands:
@@ -39,10 +63,18 @@ UPDATE ...
 DELETE ...
 CREATE INDEX ...
 DROP INDEX ...
+VACUUM [table]
 
 Special commands:
 -----------------
 .help      Show this help
+.profile on [rate] [cprofile|sample]
+          Profile a fraction of statements (default all, with cProfile)
+.profile off | reset
+          Stop profiling / discard what was collected
+.profile dump <path>
+          Write a pstats file (or collapsed stacks for .folded paths and sample mode)
+.profile  Show profiler status and the hottest functions
 exit      Exit the REPL
 quit      Exit the REPL
 quit();   Exit the REPL
@@ -74,6 +106,10 @@ def start_repl():
             if not line:
                 continue
 
+            if line.startswith(".profile"):
+                profile_command(db, line.split()[1:])
+                continue
+
             # Support multi-line SQL until semicolon
             buffer += " " + line
             if not buffer.strip().endswith(";"):
@@ -1,5 +1,14 @@
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+# Words upper-cased by fingerprint_query; everything else is an identifier and lower-cased
+SQL_KEYWORDS = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'LIKE', 'ORDER', 'BY', 'ASC', 'DESC', 'LIMIT', 'OFFSET',
+    'JOIN', 'ON', 'INSERT', 'INTO', 'VALUES', 'UPDATE', 'SET', 'DELETE', 'CREATE', 'DROP', 'ALTER',
+    'TABLE', 'INDEX', 'USING', 'PRIMARY', 'KEY', 'UNIQUE', 'NOT', 'NULL', 'COUNT', 'LOWER',
+    'PARTITION', 'PARTITIONS', 'ADD', 'HASH', 'RANGE', 'LESS', 'THAN', 'MAXVALUE', 'BTREE', 'TRIGRAM',
+    'INTEGER', 'TEXT', 'DATE', 'BOOLEAN', 'FLOAT', 'ENCODING', 'DICT', 'LSM', 'VACUUM', 'CONCURRENTLY',
+}
 
 class SQLParser:
     @staticmethod
@@ -23,67 +32,59 @@ class SQLParser:
             return SQLParser._parse_create_index(query)
         elif query_upper.startswith('DROP INDEX'):
             return SQLParser._parse_drop_index(query)
+        elif query_upper.startswith('ALTER TABLE'):
+            return SQLParser._parse_alter_table(query)
+        elif query_upper.startswith('VACUUM'):
+            return SQLParser._parse_vacuum(query)
         else:
             raise ValueError(f"Unsupported SQL query: {query}")
     
     @staticmethod
     def _parse_select(query: str) -> Dict[str, Any]:
-        # Parse SELECT with optional WHERE and ORDER BY
-        select_pattern = r'SELECT\s+(.*?)\s+FROM\s+(\w+)(?:\s+(WHERE\s+(.*?)))?(?:\s+(ORDER BY\s+(.*?)))?(?:\s+(JOIN\s+(.*?)\s+ON\s+(.*?)))?$'
+        # Parse SELECT with optional WHERE, ORDER BY and LIMIT/OFFSET
+        select_pattern = (r'SELECT\s+(.*?)\s+FROM\s+(\w+)(?:\s+(WHERE\s+(.*?)))?(?:\s+(ORDER BY\s+(.*?)))?'
+                          r'(?:\s+(JOIN\s+(.*?)\s+ON\s+(.*?)))?(?:\s+LIMIT\s+(\d+)(?:\s+OFFSET\s+(\d+))?)?$')
         match = re.search(select_pattern, query, re.IGNORECASE | re.DOTALL)
         
         if not match:
             raise ValueError(f"Invalid SELECT syntax: {query}")
         
+        columns_clause = match.group(1).strip()
         table_name = match.group(2).lower()
         where_clause = match.group(4)
         order_by_clause = match.group(6)
         join_clause = match.group(8)
         join_on = match.group(9)
+        limit = match.group(10)
+        offset = match.group(11)
         
         parsed = {
             'type': 'SELECT',
             'table_name': table_name,
             'where': {},
             'where_operator': '=',  # Default operator
-            'order_by': None
+            'order_by': None,
+            'columns': ['*']
         }
         
+        # Handle COUNT(*) aggregate and column projection
+        if re.fullmatch(r'COUNT\s*\(\s*\*\s*\)', columns_clause, re.IGNORECASE):
+            parsed['aggregate'] = 'COUNT'
+        elif columns_clause != '*':
+            parsed['columns'] = [col.strip().lower() for col in columns_clause.split(',') if col.strip()]
+        
         if where_clause:
-            where_clause = where_clause.strip()
-            
-            # Handle LIKE operator
-            if ' LIKE ' in where_clause.upper():
-                parts = re.split(r'\s+LIKE\s+', where_clause, 1, re.IGNORECASE)
-                if len(parts) == 2:
-                    key = parts[0].strip().lower()
-                    value = parts[1].strip()
-                    
-                    # Remove quotes if present
-                    if value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    
-                    parsed['where'][key] = value
-                    parsed['where_operator'] = 'LIKE'
-            
-            # Handle = operator
-            elif '=' in where_clause:
-                where_parts = where_clause.split('=', 1)
-                if len(where_parts) == 2:
-                    key = where_parts[0].strip().lower()
-                    value = where_parts[1].strip()
-                    
-                    # Remove quotes if present
-                    if value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    elif value.isdigit():
-                        value = int(value)
-                    
-                    parsed['where'][key] = value
-                    parsed['where_operator'] = '='
+            SQLParser._parse_where_conditions(where_clause.strip(), parsed)
         
         if order_by_clause:
-            parsed['order_by'] = order_by_clause.strip().lower()
+            parsed['order_by'] = SQLParser._parse_order_by(order_by_clause, table_name)
+        
+        if limit is not None:
+            parsed['limit'] = int(limit)
+            parsed['offset'] = int(offset or 0)
+        
+        if 'after' in parsed and not parsed['order_by']:
+            raise ValueError("A row-value WHERE condition needs a matching ORDER BY")
         
         if join_clause:
             join_table = join_clause.strip().lower()
@@ -101,6 +102,144 @@ class SQLParser:
         
         return parsed
     
+    @staticmethod
+    def _parse_order_by(clause: str, table_name: str) -> List[Dict[str, Any]]:
+        """Parse 'col [ASC|DESC], LOWER(col) ...' into ORDER BY terms"""
+        terms = []
+        for item in clause.split(','):
+            match = re.fullmatch(r'\s*(?:LOWER\s*\(\s*([\w.]+)\s*\)|([\w.]+))\s*(ASC|DESC)?\s*', item, re.IGNORECASE)
+            if not match:
+                raise ValueError(f"Invalid ORDER BY term: {item.strip()}")
+            column = (match.group(1) or match.group(2)).lower()
+            # Columns of the queried table may be written qualified
+            if column.startswith(f"{table_name}."):
+                column = column[len(table_name) + 1:]
+            terms.append({
+                'column': column,
+                'direction': (match.group(3) or 'ASC').upper(),
+                'casefold': match.group(1) is not None
+            })
+        return terms
+    
+    @staticmethod
+    def _split_top_level(clause: str, keyword: str) -> List[str]:
+        """Split a clause on a keyword such as OR, ignoring occurrences inside quotes"""
+        parts = []
+        current = ''
+        in_quotes = False
+        i = 0
+        pattern = re.compile(r'\s+' + keyword + r'\s+', re.IGNORECASE)
+        while i < len(clause):
+            char = clause[i]
+            if char == "'":
+                in_quotes = not in_quotes
+            elif not in_quotes:
+                match = pattern.match(clause, i)
+                if match:
+                    parts.append(current)
+                    current = ''
+                    i = match.end()
+                    continue
+            current += char
+            i += 1
+        parts.append(current)
+        return [part.strip() for part in parts]
+    
+    @staticmethod
+    def _split_values(text: str) -> List[str]:
+        """Split a comma-separated list of literals, ignoring commas inside quotes"""
+        values = []
+        current = ''
+        in_quotes = False
+        for char in text:
+            if char == "'":
+                in_quotes = not in_quotes
+            elif char == ',' and not in_quotes:
+                values.append(current.strip())
+                current = ''
+                continue
+            current += char
+        values.append(current.strip())
+        return values
+    
+    @staticmethod
+    def _parse_row_comparison(condition: str) -> Optional[Dict[str, Any]]:
+        """Parse a keyset condition such as (LOWER(name), id) > ('bob', 7), if it is one"""
+        match = re.fullmatch(r'\(\s*((?:LOWER\s*\(\s*\w+\s*\)|\w+)(?:\s*,\s*(?:LOWER\s*\(\s*\w+\s*\)|\w+))*)\s*\)'
+                             r'\s*(>|<)\s*\((.*)\)', condition.strip(), re.IGNORECASE | re.DOTALL)
+        if not match:
+            return None
+        
+        columns = []
+        for item in match.group(1).split(','):
+            lower = re.fullmatch(r'\s*LOWER\s*\(\s*(\w+)\s*\)\s*', item, re.IGNORECASE)
+            columns.append({
+                'column': (lower.group(1) if lower else item).strip().lower(),
+                'casefold': lower is not None
+            })
+        values = [SQLParser._parse_value(value) for value in SQLParser._split_values(match.group(3))]
+        if len(values) != len(columns):
+            raise ValueError(f"Row value has {len(values)} values for {len(columns)} columns")
+        return {'columns': columns, 'values': values, 'operator': match.group(2)}
+    
+    @staticmethod
+    def _parse_condition(condition: str):
+        """Parse a single 'column = value' or 'column LIKE pattern' condition"""
+        like_parts = re.split(r'\s+LIKE\s+', condition, 1, re.IGNORECASE)
+        if len(like_parts) == 2:
+            key = like_parts[0].strip().lower()
+            value = like_parts[1].strip()
+            
+            # Remove quotes if present
+            if value.startswith("'") and value.endswith("'"):
+                value = value[1:-1].replace("''", "'")
+            return key, value, 'LIKE'
+        
+        if '=' in condition:
+            key, value = condition.split('=', 1)
+            key = key.strip().lower()
+            value = value.strip()
+            
+            # Remove quotes if present
+            if value.startswith("'") and value.endswith("'"):
+                value = value[1:-1].replace("''", "'")
+            elif value.isdigit():
+                value = int(value)
+            return key, value, '='
+        
+        raise ValueError(f"Unsupported WHERE condition: {condition}")
+    
+    @staticmethod
+    def _parse_where_conditions(where_clause: str, parsed: Dict[str, Any]):
+        """Fill in where/where_operator/where_logic from conditions joined by AND or OR"""
+        where_logic = 'AND'
+        conditions = SQLParser._split_top_level(where_clause, 'OR')
+        if len(conditions) > 1:
+            where_logic = 'OR'
+        else:
+            conditions = SQLParser._split_top_level(where_clause, 'AND')
+        
+        operators = set()
+        for condition in conditions:
+            after = SQLParser._parse_row_comparison(condition)
+            if after:
+                if where_logic == 'OR' or 'after' in parsed:
+                    raise ValueError("A row-value condition can only be ANDed with other conditions")
+                parsed['after'] = after
+                continue
+            key, value, operator = SQLParser._parse_condition(condition)
+            parsed['where'][key] = value
+            operators.add(operator)
+        
+        if len(operators) > 1:
+            raise ValueError("Mixing = and LIKE in one WHERE clause is not supported")
+        if where_logic == 'OR' and any(len(SQLParser._split_top_level(condition, 'AND')) > 1
+                                       for condition in conditions):
+            raise ValueError("Mixing AND and OR in one WHERE clause is not supported")
+        
+        parsed['where_operator'] = operators.pop() if operators else '='
+        parsed['where_logic'] = where_logic
+    
     @staticmethod
     def _parse_drop_table(query: str) -> Dict[str, Any]:
         pattern = r'DROP TABLE (\w+)'
@@ -345,17 +484,28 @@ class SQLParser:
     
     @staticmethod
     def _parse_create_index(query: str) -> Dict[str, Any]:
-        pattern = r'CREATE INDEX (\w+) ON (\w+) \((\w+)\)'
+        # The index type may come before or after the column list; LOWER(col) asks for
+        # a case-folded ordered index, and CONCURRENTLY for a build that doesn't block writers
+        pattern = (r'CREATE INDEX (?:(CONCURRENTLY)\s+)?(\w+) ON (\w+)\s*(?:USING\s+(\w+)\s*)?'
+                   r'\(\s*(?:LOWER\s*\(\s*(\w+)\s*\)|(\w+))\s*\)(?:\s*USING\s+(\w+))?')
         match = re.search(pattern, query, re.IGNORECASE)
         
         if not match:
             raise ValueError("Invalid CREATE INDEX syntax")
         
+        index_type = (match.group(4) or match.group(7) or 'HASH').upper()
+        if match.group(5):
+            if index_type not in ('HASH', 'BTREE'):
+                raise ValueError("LOWER(column) is only supported for BTREE indexes")
+            index_type = 'BTREE_CI'
+        
         return {
             'type': 'CREATE_INDEX',
-            'index_name': match.group(1).lower(),
-            'table_name': match.group(2).lower(),
-            'column_name': match.group(3).lower()
+            'index_name': match.group(2).lower(),
+            'table_name': match.group(3).lower(),
+            'column_name': (match.group(5) or match.group(6)).lower(),
+            'index_type': index_type,
+            'concurrently': bool(match.group(1))
         }
     
     @staticmethod
@@ -372,8 +522,104 @@ class SQLParser:
             'table_name': match.group(2).lower()
         }
     
+    @staticmethod
+    def _parse_vacuum(query: str) -> Dict[str, Any]:
+        match = re.fullmatch(r'VACUUM(?:\s+(\w+))?\s*;?', query, re.IGNORECASE)
+        
+        if not match:
+            raise ValueError("Invalid VACUUM syntax")
+        
+        return {
+            'type': 'VACUUM',
+            'table_name': match.group(1).lower() if match.group(1) else None
+        }
+    
+    @staticmethod
+    def _parse_value(value: str) -> Any:
+        """Convert a SQL literal to a Python value"""
+        value = value.strip()
+        if value.upper() == 'NULL':
+            return None
+        if value.startswith("'") and value.endswith("'"):
+            return value[1:-1].replace("''", "'")
+        try:
+            return float(value) if '.' in value else int(value)
+        except ValueError:
+            return value
+    
+    @staticmethod
+    def _parse_range_partitions(text: str) -> List[Dict[str, Any]]:
+        """Parse 'PARTITION p0 VALUES LESS THAN (x), ...' into range definitions"""
+        pattern = r'PARTITION\s+(\w+)\s+VALUES\s+LESS\s+THAN\s*(?:\(\s*(.*?)\s*\)|(MAXVALUE))'
+        ranges = []
+        for name, bound, maxvalue in re.findall(pattern, text, re.IGNORECASE | re.DOTALL):
+            ranges.append({
+                'name': name.lower(),
+                'less_than': None if maxvalue or bound.upper() == 'MAXVALUE' else SQLParser._parse_value(bound)
+            })
+        return ranges
+    
+    @staticmethod
+    def _parse_partition_clause(clause: str) -> Dict[str, Any]:
+        match = re.match(r'PARTITION\s+BY\s+(HASH|RANGE)\s*\(\s*(\w+)\s*\)(.*)$', clause.strip(),
+                         re.IGNORECASE | re.DOTALL)
+        if not match:
+            raise ValueError("Invalid PARTITION BY syntax")
+        
+        partition_type = match.group(1).upper()
+        column = match.group(2).lower()
+        rest = match.group(3).strip()
+        
+        if partition_type == 'HASH':
+            count_match = re.match(r'PARTITIONS\s+(\d+)', rest, re.IGNORECASE)
+            partitions = int(count_match.group(1)) if count_match else 4
+            if partitions < 1:
+                raise ValueError("HASH partitioning needs at least one partition")
+            return {'type': 'HASH', 'column': column, 'partitions': partitions}
+        
+        ranges = SQLParser._parse_range_partitions(rest)
+        if not ranges:
+            raise ValueError("RANGE partitioning needs at least one PARTITION ... VALUES LESS THAN")
+        return {'type': 'RANGE', 'column': column, 'ranges': ranges}
+    
+    @staticmethod
+    def _parse_alter_table(query: str) -> Dict[str, Any]:
+        drop_match = re.match(r'ALTER TABLE (\w+)\s+DROP PARTITION (\w+)$', query, re.IGNORECASE)
+        if drop_match:
+            return {
+                'type': 'DROP_PARTITION',
+                'table_name': drop_match.group(1).lower(),
+                'partition_name': drop_match.group(2).lower()
+            }
+        
+        add_match = re.match(r'ALTER TABLE (\w+)\s+ADD PARTITION\s*\((.*)\)$', query, re.IGNORECASE | re.DOTALL)
+        if add_match:
+            ranges = SQLParser._parse_range_partitions(add_match.group(2))
+            if not ranges:
+                raise ValueError("Invalid ADD PARTITION syntax")
+            return {
+                'type': 'ADD_PARTITION',
+                'table_name': add_match.group(1).lower(),
+                'ranges': ranges
+            }
+        
+        raise ValueError("Unsupported ALTER TABLE syntax")
+    
     @staticmethod
     def _parse_create_table(query: str) -> Dict[str, Any]:
+        # Split off an optional trailing USING <engine>, then PARTITION BY clause
+        engine = None
+        engine_match = re.search(r'\)\s*USING\s+(\w+)\s*;?\s*$', query, re.IGNORECASE)
+        if engine_match:
+            engine = engine_match.group(1).upper()
+            query = query[:engine_match.start() + 1]
+        
+        partition = None
+        partition_match = re.search(r'\)\s*(PARTITION\s+BY\s.*)$', query, re.IGNORECASE | re.DOTALL)
+        if partition_match:
+            partition = SQLParser._parse_partition_clause(partition_match.group(1))
+            query = query[:partition_match.start() + 1]
+        
         pattern = r'CREATE TABLE (\w+)\s*\((.*)\)'
         match = re.search(pattern, query, re.IGNORECASE | re.DOTALL)
         
@@ -403,11 +649,19 @@ class SQLParser:
         if current.strip():
             columns.append(SQLParser._parse_column_definition(current.strip()))
         
-        return {
+        parsed = {
             'type': 'CREATE_TABLE',
             'table_name': table_name,
             'columns': columns
         }
+        if partition:
+            if partition['column'] not in [col['name'] for col in columns]:
+                raise ValueError(f"Partition column {partition['column']} does not exist")
+            parsed['partition'] = partition
+        if engine:
+            parsed['engine'] = engine
+        
+        return parsed
     
     @staticmethod
     def _parse_column_definition(col_def: str) -> Dict[str, Any]:
@@ -430,8 +684,22 @@ class SQLParser:
             column['unique'] = True
         if 'NOT NULL' in col_def_upper:
             column['nullable'] = False
+        encoding = re.search(r'\bENCODING\s+(\w+)', col_def_upper)
+        if encoding:
+            column['encoding'] = encoding.group(1)
         
         return column
 
 def parse_query(query: str) -> Dict[str, Any]:
-    return SQLParser.parse_query(query)
\ No newline at end of file
+    return SQLParser.parse_query(query)
+
+def fingerprint_query(query: str) -> str:
+    """Normalize a query for grouping: literals become ?, whitespace is collapsed and
+    keywords upper-cased, so queries differing only in their values match"""
+    fingerprint = re.sub(r"'(?:[^']|'')*'", '?', query)
+    fingerprint = re.sub(r'(?<![\w.])-?\d+(?:\.\d+)?\b', '?', fingerprint)
+    fingerprint = re.sub(r'\s+', ' ', fingerprint).strip().rstrip(';').strip()
+    # IN (?, ?, ?) lists and multi-row VALUES collapse to one placeholder
+    fingerprint = re.sub(r'\?(?:\s*,\s*\?)+', '?', fingerprint)
+    return re.sub(r'\b[A-Za-z_]+\b', lambda m: m.group(0).upper() if m.group(0).upper() in SQL_KEYWORDS
+                  else m.group(0).lower(), fingerprint)
\ No newline at end of file
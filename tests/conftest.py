@@ -0,0 +1,36 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from core.database import Database
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a scratch directory; databases keep their files under ./data"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def db(workdir):
+    database = Database('test', query_cache_bytes=0)
+    yield database
+    database.close()
+
+@pytest.fixture
+def backend(workdir):
+    """The backend app module, imported afresh so it opens a new contacts database here"""
+    sys.modules.pop('web_app.backend.app', None)
+    module = importlib.import_module('web_app.backend.app')
+    yield module
+    module.db.close()
+    sys.modules.pop('web_app.backend.app', None)
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
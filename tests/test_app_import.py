@@ -0,0 +1,14 @@
+"""The backend must import as a package from the repo root, as gunicorn and tests do."""
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_app_imports_from_repo_root(tmp_path):
+    # Run in a scratch directory, since importing the app opens its database under ./data
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR, RDBMS_LOG_LEVEL='WARNING')
+    result = subprocess.run([sys.executable, '-c', 'import web_app.backend.app as app; print(app.app.name)'],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert 'web_app.backend.app' in result.stdout
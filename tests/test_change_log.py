@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from core.database import Database
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT)")
+    table = db.get_table('c')
+    table.insert_many([{'name': f"n{i}"} for i in range(1, 6)])
+    return table
+
+def reopen():
+    return Database('test', query_cache_bytes=0)
+
+def names(db):
+    return [row['name'] for row in db.execute_query("SELECT name FROM c ORDER BY id")]
+
+def test_point_writes_append_to_the_log_instead_of_rewriting_the_snapshot(workdir, db, table):
+    snapshot = (workdir / 'data' / 'c.json').read_bytes()
+    db.execute_query("UPDATE c SET name = 'x' WHERE id = 2")
+    db.execute_query("DELETE FROM c WHERE id = 3")
+    assert (workdir / 'data' / 'c.json').read_bytes() == snapshot
+    records = [json.loads(line) for line in (workdir / 'data' / 'c.log').read_text().splitlines()]
+    assert [(record['op'], record['row_id']) for record in records] == [('update', 1), ('delete', 2)]
+
+def test_logged_writes_are_replayed_on_load(db, table):
+    db.execute_query("UPDATE c SET name = 'x' WHERE id = 2")
+    db.execute_query("DELETE FROM c WHERE id = 3")
+    other = reopen()
+    try:
+        assert names(other) == ['n1', 'x', 'n4', 'n5']
+        assert other.get_table('c').select({'id': 3}) == []
+    finally:
+        other.close()
+
+def test_multi_row_writes_fold_the_log_into_a_snapshot(workdir, db, table):
+    db.execute_query("UPDATE c SET name = 'x' WHERE id = 2")
+    db.execute_query("UPDATE c SET name = 'y'")
+    assert not (workdir / 'data' / 'c.log').exists()
+    assert table.log_records == 0
+
+def test_log_is_checkpointed_after_enough_records(workdir, db, table, monkeypatch):
+    monkeypatch.setattr(table, 'LOG_CHECKPOINT_RECORDS', 3)
+    for i in range(5):
+        db.execute_query(f"UPDATE c SET name = 'v{i}' WHERE id = 1")
+    assert table.log_records < 3
+    assert names(db)[0] == 'v4'
+
+def test_records_of_an_older_snapshot_are_ignored(workdir, db, table):
+    # A crash between writing a new snapshot and removing the log leaves records already in the snapshot
+    with open(workdir / 'data' / 'c.log', 'a') as f:
+        f.write(json.dumps({'op': 'delete', 'row_id': 0, 'snapshot': table.snapshot - 1}) + '\n')
+    other = reopen()
+    try:
+        assert names(other)[0] == 'n1'
+    finally:
+        other.close()
+
+def test_a_torn_last_record_is_dropped(workdir, db, table):
+    db.execute_query("UPDATE c SET name = 'x' WHERE id = 2")
+    with open(workdir / 'data' / 'c.log', 'a') as f:
+        f.write('{"op": "delete", "row_')
+    other = reopen()
+    try:
+        assert names(other) == ['n1', 'x', 'n3', 'n4', 'n5']
+    finally:
+        other.close()
@@ -0,0 +1,74 @@
+import pytest
+
+from core.changes import ChangeFeed
+from core.database import Database
+
+def test_since_returns_later_records_for_one_table():
+    feed = ChangeFeed()
+    feed.record('a', 'insert', 1, {'id': 1})
+    feed.record('b', 'insert', 1, {'id': 1})
+    feed.record('a', 'delete', 1)
+    changes, seq, complete = feed.since(1, 'a')
+    assert [(change['seq'], change['op']) for change in changes] == [(3, 'delete')]
+    assert (seq, complete) == (3, True)
+
+def test_records_pushed_out_of_the_buffer_make_the_read_incomplete():
+    feed = ChangeFeed(capacity=2)
+    for key in range(4):
+        feed.record('a', 'insert', key)
+    assert feed.since(1) == ([], 4, False)
+    assert [change['key'] for change in feed.since(2)[0]] == [2, 3]
+    # A sequence number ahead of the feed belongs to another one
+    assert feed.since(9)[2] is False
+
+def test_wait_returns_once_there_is_a_change():
+    feed = ChangeFeed()
+    assert feed.wait(0, 0.01) is False
+    feed.record('a', 'insert', 1)
+    assert feed.wait(0, 0.01) is True
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT)")
+    return db.get_table('c')
+
+def test_writes_are_published_with_their_keys(db, table):
+    start = db.changes.seq
+    table.insert({'name': 'a'})
+    db.execute_query("UPDATE c SET name = 'b' WHERE id = 1")
+    db.execute_query("DELETE FROM c WHERE id = 1")
+    changes, _, complete = db.changes.since(start, 'c')
+    assert complete
+    assert [(change['op'], change['key'], change['values']) for change in changes] == [
+        ('insert', 1, {'id': 1, 'name': 'a'}),
+        ('update', 1, {'id': 1, 'name': 'b'}),
+        ('delete', 1, None),
+    ]
+
+def test_partitions_publish_under_the_parent_table(db):
+    db.execute_query("CREATE TABLE p (id INTEGER PRIMARY KEY, n INTEGER) PARTITION BY HASH (n) PARTITIONS 2")
+    start = db.changes.seq
+    db.get_table('p').insert_many([{'n': 1}, {'n': 2}])
+    assert {change['table'] for change in db.changes.since(start)[0]} == {'p'}
+
+def test_writes_by_another_process_publish_a_reset(db, table):
+    start = db.changes.seq
+    other = Database('test', query_cache_bytes=0)
+    try:
+        other.get_table('c').insert({'name': 'a'})
+    finally:
+        other.close()
+    table.refresh()
+    assert [change['op'] for change in db.changes.since(start, 'c')[0]] == ['reset']
+
+def test_changes_api(backend, client):
+    position = client.get('/api/changes').get_json()
+    assert position['data'] == [] and position['reset'] is False
+    backend.db.get_table('contacts').insert({'name': 'Ann', 'email': 'ann@x'})
+    body = client.get('/api/changes', query_string={'since': position['seq'], 'table': 'Contacts',
+                                                    'epoch': position['epoch']}).get_json()
+    assert [(change['op'], change['values']['name']) for change in body['data']] == [('insert', 'Ann')]
+    assert body['reset'] is False
+    # A position from another server's feed cannot be resumed
+    stale = client.get('/api/changes', query_string={'since': position['seq'], 'epoch': 'other'}).get_json()
+    assert stale['reset'] is True and stale['data'] == []
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from core.database import Database
+from core.index import IndexBuild
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT, n INTEGER)")
+    table = db.get_table('c')
+    table.insert_many([{'name': f"n{i}", 'n': i % 5} for i in range(1, 201)])
+    return table
+
+def wait_for(build, timeout=10):
+    deadline = time.monotonic() + timeout
+    while build.state == 'building':
+        assert time.monotonic() < deadline, 'index build did not finish'
+        time.sleep(0.01)
+
+def lookup(table, index_name, value):
+    return sorted(table.indexes[index_name].search('n', value))
+
+def scan(table, value):
+    return sorted(i for i, row in enumerate(table.data) if row is not None and row[table.ordinals['n']] == value)
+
+def test_create_index_concurrently_returns_at_once_and_publishes(db, table):
+    result = db.execute_query("CREATE INDEX CONCURRENTLY c_n ON c (n)")
+    assert result['state'] == 'building' and result['index_name'] == 'c_n'
+    deadline = time.monotonic() + 10
+    while 'c_n' not in table.indexes:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert lookup(table, 'c_n', 3) == scan(table, 3)
+    # Published indexes are saved in the metadata
+    reopened = Database('test', query_cache_bytes=0)
+    try:
+        assert 'c_n' in reopened.get_table('c').indexes
+    finally:
+        reopened.close()
+
+def test_writes_made_during_the_build_reach_the_index(db, table, monkeypatch):
+    build = IndexBuild('c', 'c_n', 'n', 'HASH')
+    track = build.track
+
+    def track_with_writes(items, base):
+        for done, item in enumerate(track(items, base)):
+            if done == 50:
+                table.insert({'name': 'new', 'n': 3})
+                db.execute_query("UPDATE c SET n = 3 WHERE id = 1")
+                db.execute_query("DELETE FROM c WHERE id = 3")
+            yield item
+
+    monkeypatch.setattr(build, 'track', track_with_writes)
+    table.build_index_concurrently('n', 'c_n', 'HASH', build)
+    assert lookup(table, 'c_n', 3) == scan(table, 3)
+    assert lookup(table, 'c_n', 1) == scan(table, 1)
+    assert not table.build_queues
+
+def test_build_restarts_when_the_rows_are_renumbered(db, table, monkeypatch):
+    db.execute_query("DELETE FROM c WHERE n = 0")
+    build = IndexBuild('c', 'c_n', 'n', 'BTREE')
+    track = build.track
+
+    def track_with_vacuum(items, base):
+        if not build.restarts:
+            table.vacuum()
+        yield from track(items, base)
+
+    monkeypatch.setattr(build, 'track', track_with_vacuum)
+    table.build_index_concurrently('n', 'c_n', 'BTREE', build)
+    assert build.restarts == 1
+    assert lookup(table, 'c_n', 2) == scan(table, 2)
+
+def test_concurrent_writers_are_not_lost(db, table):
+    stop = threading.Event()
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            table.insert({'name': f"w{i}", 'n': i % 5})
+            db.execute_query(f"UPDATE c SET n = {i % 5} WHERE id = {i % 200 + 1}")
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        build = db.create_index_concurrently('c', 'n', 'c_n')
+        wait_for(build)
+    finally:
+        stop.set()
+        writer.join()
+    assert build.state == 'ready', build.error
+    for value in range(5):
+        assert lookup(table, 'c_n', value) == scan(table, value)
+
+def test_duplicate_and_invalid_builds_are_refused(db, table):
+    db.execute_query("CREATE INDEX c_n ON c (n)")
+    with pytest.raises(ValueError, match='already exists'):
+        db.execute_query("CREATE INDEX CONCURRENTLY c_n ON c (n)")
+    with pytest.raises(ValueError, match='Unknown index type'):
+        db.create_index_concurrently('c', 'n', 'c_x', 'BITMAP')
+    with pytest.raises(ValueError, match='does not exist'):
+        db.execute_query("CREATE INDEX CONCURRENTLY c_x ON c (nope)")
+
+def test_a_failed_build_stays_listed_with_its_error(db, table, monkeypatch):
+    track = IndexBuild.track
+
+    def track_after_drop(self, items, base):
+        db.drop_table('c')
+        return track(self, items, base)
+
+    monkeypatch.setattr(IndexBuild, 'track', track_after_drop)
+    build = db.create_index_concurrently('c', 'name', 'c_name')
+    wait_for(build)
+    assert build.state == 'failed' and 'dropped' in build.error
+    assert db.index_builds[('c', 'c_name')] is build
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from core.database import Database
+from core.encoding import ColumnDictionary, encode_rows
+
+STATUSES = ['open', 'closed', 'open', None, 'Pending', 'open']
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE o (id INTEGER PRIMARY KEY, status TEXT ENCODING DICT, note TEXT)")
+    table = db.get_table('o')
+    table.insert_many([{'status': status, 'note': f"n{i}"} for i, status in enumerate(STATUSES)])
+    return table
+
+def ids(rows):
+    return [row['id'] for row in rows]
+
+def test_encode_rows_assigns_codes_in_order_of_first_use():
+    rows, dictionaries = encode_rows([('a', 1), None, ('b', 2), ('a', 3), (None, 4)], [('s', 0)])
+    assert rows == [[0, 1], None, [1, 2], [0, 3], [None, 4]]
+    assert dictionaries == {'s': ['a', 'b']}
+
+def test_dictionary_interns_values():
+    dictionary = ColumnDictionary()
+    first = dictionary.intern(''.join(['op', 'en']))
+    assert dictionary.intern(''.join(['op', 'en'])) is first
+    assert dictionary.intern(None) is None and len(dictionary) == 1
+
+def test_rows_share_one_object_per_value(table):
+    ordinal = table.ordinals['status']
+    opens = [row[ordinal] for row in table.data if row[ordinal] == 'open']
+    assert len(opens) == 3 and all(value is opens[0] for value in opens)
+
+def test_file_stores_codes_and_one_value_list(workdir, table):
+    stored = json.loads((workdir / 'data' / 'o.json').read_text())
+    assert stored['dictionaries'] == {'status': ['open', 'closed', 'Pending']}
+    assert [row[1] for row in stored['rows']] == [0, 1, 0, None, 2, 0]
+
+def test_filters_on_encoded_columns(db, table):
+    assert ids(db.execute_query("SELECT id FROM o WHERE status = 'open'")) == [1, 3, 6]
+    assert ids(db.execute_query("SELECT id FROM o WHERE status LIKE '%EN%'")) == [1, 3, 5, 6]
+    assert ids(db.execute_query("SELECT id FROM o WHERE status = 'open' OR note = 'n1'")) == [1, 2, 3, 6]
+
+def test_value_the_column_never_held_skips_the_scan(db, table):
+    plans = []
+    db.on_plan(plans.append)
+    assert db.execute_query("SELECT id FROM o WHERE status = 'archived'") == []
+    assert plans[-1]['access'] == 'index' and plans[-1]['candidates'] == 0
+
+def test_values_round_trip_through_writes_and_reload(db, table):
+    db.execute_query("UPDATE o SET status = 'archived' WHERE id = 2")
+    db.execute_query("UPDATE o SET status = 'closed' WHERE status = 'open'")
+    reopened = Database('test', query_cache_bytes=0)
+    try:
+        rows = reopened.execute_query("SELECT id, status FROM o ORDER BY id")
+        assert [row['status'] for row in rows] == ['closed', 'archived', 'closed', None, 'Pending', 'closed']
+        assert ids(reopened.execute_query("SELECT id FROM o WHERE status = 'archived'")) == [2]
+    finally:
+        reopened.close()
+
+def test_vacuum_drops_values_no_row_uses(db, table):
+    db.execute_query("DELETE FROM o WHERE status = 'Pending'")
+    db.execute_query("VACUUM o")
+    assert 'Pending' not in table.dictionaries['status']
+    assert 'open' in table.dictionaries['status']
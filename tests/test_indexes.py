@@ -0,0 +1,88 @@
+import pytest
+
+NAMES = ['Alice', 'alfred', 'Bob', 'Carol', 'malia', 'ALBERT', None, 'Dave']
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT, n INTEGER)")
+    table = db.get_table('c')
+    table.insert_many([{'name': name, 'n': i % 3} for i, name in enumerate(NAMES)])
+    return table
+
+@pytest.fixture
+def plans(db):
+    plans = []
+    db.on_plan(plans.append)
+    return plans
+
+def ids(rows):
+    return [row['id'] for row in rows]
+
+def unindexed(db, query):
+    """Run a query with every secondary index dropped, then put them back"""
+    table = db.get_table('c')
+    indexes, table.indexes = table.indexes, {}
+    try:
+        return db.execute_query(query)
+    finally:
+        table.indexes = indexes
+
+@pytest.mark.parametrize('pattern', ['%li%', '%LI%', '%al%', 'al%', '%a_i%', '%zz%', '%b%', '%'])
+def test_trigram_index_answers_like_like_a_scan(db, table, pattern):
+    expected = unindexed(db, f"SELECT id FROM c WHERE name LIKE '{pattern}'")
+    db.execute_query("CREATE INDEX c_name_trgm ON c USING TRIGRAM (name)")
+    assert db.execute_query(f"SELECT id FROM c WHERE name LIKE '{pattern}'") == expected
+
+def test_trigram_index_narrows_the_candidates(db, table, plans):
+    db.execute_query("CREATE INDEX c_name_trgm ON c USING TRIGRAM (name)")
+    assert ids(db.execute_query("SELECT id FROM c WHERE name LIKE '%lic%'")) == [1]
+    assert plans[-1]['access'] == 'index' and plans[-1]['candidates'] == 1
+
+def test_trigram_index_follows_writes(db, table):
+    db.execute_query("CREATE INDEX c_name_trgm ON c USING TRIGRAM (name)")
+    db.execute_query("UPDATE c SET name = 'Zelda' WHERE id = 3")
+    db.execute_query("DELETE FROM c WHERE id = 1")
+    table.insert({'name': 'Alicia'})
+    assert ids(db.execute_query("SELECT id FROM c WHERE name LIKE '%li%'")) == [5, 9]
+    assert ids(db.execute_query("SELECT id FROM c WHERE name LIKE '%eld%'")) == [3]
+
+def test_case_folded_btree_serves_prefix_like(db, table, plans):
+    expected = unindexed(db, "SELECT id FROM c WHERE name LIKE 'al%'")
+    db.execute_query("CREATE INDEX c_name_ci ON c USING BTREE (LOWER(name))")
+    assert db.execute_query("SELECT id FROM c WHERE name LIKE 'al%'") == expected
+    assert plans[-1]['access'] == 'index' and plans[-1]['candidates'] == 3
+
+@pytest.mark.parametrize('order_by', ['name', 'name DESC', 'LOWER(name)', 'LOWER(name) DESC, id', 'n, name',
+                                      'n DESC, id DESC'])
+def test_ordered_index_walk_matches_a_sort(db, table, plans, order_by):
+    query = f"SELECT id FROM c ORDER BY {order_by}"
+    expected = unindexed(db, query)
+    column = order_by.split(',')[0].split()[0]
+    index = f"USING BTREE ({column})" if column.startswith('LOWER') else f"({column}) USING BTREE"
+    db.execute_query(f"CREATE INDEX c_order ON c {index}")
+    assert db.execute_query(query) == expected
+    assert plans[-1]['access'] == 'ordered_index'
+
+def test_ordered_index_equality_lookup(db, table, plans):
+    db.execute_query("CREATE INDEX c_n ON c (n) USING BTREE")
+    assert db.execute_query("UPDATE c SET name = 'x' WHERE n = 2") == 2
+    assert ids(db.execute_query("SELECT id FROM c WHERE n = 2")) == [3, 6]
+    assert plans[-1]['access'] == 'index'
+
+def test_hash_index_equality_lookup(db, table, plans):
+    db.execute_query("CREATE INDEX c_n ON c (n)")
+    assert ids(db.execute_query("SELECT id FROM c WHERE n = 1")) == [2, 5, 8]
+    assert plans[-1]['access'] == 'index'
+
+def test_indexes_are_rebuilt_on_load(workdir, db, table):
+    from core.database import Database
+    db.execute_query("CREATE INDEX c_name_trgm ON c USING TRIGRAM (name)")
+    db.execute_query("CREATE INDEX c_name_ci ON c USING BTREE (LOWER(name))")
+    reopened = Database('test', query_cache_bytes=0)
+    try:
+        indexes = reopened.get_table('c').indexes
+        assert {name: index.index_type for name, index in indexes.items()} == {
+            'c_name_trgm': 'TRIGRAM', 'c_name_ci': 'BTREE_CI'}
+        assert ids(reopened.execute_query("SELECT id FROM c WHERE name LIKE '%li%'")) == [1, 5]
+    finally:
+        reopened.close()
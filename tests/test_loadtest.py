@@ -0,0 +1,41 @@
+"""Regression tests that run the load test harness against a live server.
+
+    python -m pytest tests
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_loadtest(*args: str) -> dict:
+    """Run benchmarks.loadtest with a server it starts itself and return its report"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'report.json')
+        # The harness and the server it starts both write to stderr; keep it for the failure message
+        result = subprocess.run([sys.executable, '-m', 'benchmarks.loadtest', '--output', output, *args],
+                                cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                timeout=300)
+        if not os.path.exists(output):
+            raise AssertionError(f"loadtest exited with status {result.returncode} and no report:\n"
+                                 f"{result.stderr[-5000:]}")
+        with open(output) as f:
+            report = json.load(f)
+        report['stderr'] = result.stderr
+        return report
+
+class MultiProcessWriteTest(unittest.TestCase):
+    def test_forked_servers_keep_every_write(self):
+        # Several server processes share one data directory; keys must stay unique
+        # and every created or deleted contact must read back as expected
+        report = run_loadtest('--rows', '2000', '--stages', '1,8', '--stage-seconds', '4',
+                              '--server-processes', '3')
+        self.assertTrue(sum(stage['requests'] for stage in report['stages']), report['stderr'][-5000:])
+        self.assertEqual(report['problems'], [], report['stderr'][-5000:])
+        self.assertNotIn('Traceback', report['stderr'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import pytest
+
+@pytest.fixture(params=['', ' USING LSM'], ids=['heap', 'lsm'])
+def table(db, request):
+    db.execute_query(f"CREATE TABLE l (id INTEGER PRIMARY KEY, v TEXT UNIQUE, n INTEGER){request.param}")
+    table = db.get_table('l')
+    table.insert_many([{'v': f"v{i}", 'n': i % 2} for i in range(1, 6)])
+    return table
+
+def test_insert_rejects_duplicate_unique_value(table):
+    with pytest.raises(ValueError, match='unique column v'):
+        table.insert({'v': 'v3'})
+    assert table.count() == 5
+
+def test_update_rejects_value_held_by_another_row(db, table):
+    with pytest.raises(ValueError, match='unique column v'):
+        db.execute_query("UPDATE l SET v = 'v4' WHERE id = 1")
+    assert table.select({'id': 1})[0]['v'] == 'v1'
+
+def test_update_rejects_one_value_for_several_rows(table):
+    with pytest.raises(ValueError, match='unique column v'):
+        table.update({'v': 'same'}, {'n': 1})
+    assert sorted(row['v'] for row in table.select()) == ['v1', 'v2', 'v3', 'v4', 'v5']
+
+def test_update_may_keep_or_free_a_value(table):
+    assert table.update({'v': 'v1', 'n': 7}, {'id': 1}) == 1
+    assert table.update({'v': 'moved'}, {'id': 2}) == 1
+    # Values given up by an update or a delete can be used again
+    assert table.insert({'v': 'v2'})
+    table.delete({'id': 3})
+    assert table.insert({'v': 'v3'})
+
+def test_unique_values_survive_reload(workdir, table):
+    from core.database import Database
+    reopened = Database('test', query_cache_bytes=0)
+    try:
+        with pytest.raises(ValueError, match='unique column v'):
+            reopened.get_table('l').update({'v': 'v5'}, {'id': 1})
+    finally:
+        reopened.close()
+
+@pytest.fixture
+def store(db):
+    store = db.storage.open_lsm('s', memtable_rows=3, level0_runs=100)
+    yield store
+    store.close()
+
+def write(store, *entries):
+    for key, row in entries:
+        store.put(key, row)
+    store.commit()
+
+def entries(store):
+    # Runs hand rows back as JSON lists, the memtable as written
+    return [(key, None if row is None else list(row)) for key, row in store.items()]
+
+def test_reads_see_the_newest_version_across_memtable_and_runs(store):
+    write(store, (0, ['a']), (1, ['b']), (2, ['c']))
+    write(store, (1, ['b2']), (2, None), (3, ['d']))
+    write(store, (0, ['a3']))
+    assert len(store.levels[0]) == 2 and list(store.memtable) == [0]
+    assert [store.get(key) for key in range(5)] == [['a3'], ['b2'], None, ['d'], None]
+    assert entries(store) == [(0, ['a3']), (1, ['b2']), (2, None), (3, ['d'])]
+
+def test_unflushed_writes_are_replayed_from_the_log(db, store):
+    write(store, (0, ['a']), (1, ['b']), (2, ['c']))
+    write(store, (1, None), (3, ['d']))
+    reopened = db.storage.open_lsm('s', memtable_rows=3, level0_runs=100)
+    try:
+        assert entries(reopened) == [(0, ['a']), (1, None), (2, ['c']), (3, ['d'])]
+        assert reopened.size == 4
+    finally:
+        reopened.close()
+
+def test_compact_all_leaves_one_run_without_tombstones(db, store):
+    for first in range(0, 12, 3):
+        write(store, *((key, [key]) for key in range(first, first + 3)))
+    write(store, (4, None), (5, [50]))
+    store.flush()
+    assert store.compact_all() == (14, 11)
+    assert [len(level) for level in store.levels if level] == [1]
+    assert [key for key, _ in store.items()] == [0, 1, 2, 3, 5, 6, 7, 8, 9, 10, 11]
+    assert store.get(5) == [50] and store.get(4) is None
+    # Row ids are not reused after the tombstones are gone
+    assert store.size == 12
+
+def test_bloom_filter_has_no_false_negatives():
+    from core.lsm import BloomFilter
+    bloom = BloomFilter.for_capacity(1000)
+    for key in range(0, 2000, 2):
+        bloom.add(key)
+    assert all(key in bloom for key in range(0, 2000, 2))
+    assert sum(key in bloom for key in range(1, 2000, 2)) < 50
+    restored = BloomFilter.from_dict(bloom.to_dict())
+    assert all(key in restored for key in range(0, 2000, 2))
+
+def test_lsm_table_survives_reload(db, table):
+    if hasattr(table, 'store'):
+        # Read the first rows back from a run and the rest from the log
+        table.store.flush()
+    table.insert({'v': 'v6', 'n': 0})
+    table.delete({'id': 2})
+    from core.database import Database
+    reopened = Database('test', query_cache_bytes=0)
+    try:
+        rows = reopened.execute_query("SELECT id, v FROM l ORDER BY id")
+        assert [row['v'] for row in rows] == ['v1', 'v3', 'v4', 'v5', 'v6']
+        assert reopened.execute_query("SELECT v FROM l WHERE id = 6") == [{'v': 'v6'}]
+    finally:
+        reopened.close()
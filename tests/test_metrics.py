@@ -0,0 +1,22 @@
+from core.metrics import MetricsRegistry
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.counter('t_total', 'Help with a \\ and\na newline', ('table',))
+    counter.inc(table='a"b\\c\nd')
+    assert registry.render().splitlines() == [
+        '# HELP t_total Help with a \\\\ and\\na newline',
+        '# TYPE t_total counter',
+        't_total{table="a\\"b\\\\c\\nd"} 1',
+    ]
+
+def test_histogram_labels_are_escaped():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('t_seconds', 'Latency', ('query',), buckets=(1.0,))
+    histogram.observe(0.5, query='SELECT "x"')
+    assert registry.render().splitlines()[2:] == [
+        't_seconds_bucket{query="SELECT \\"x\\"",le="1.0"} 1',
+        't_seconds_bucket{query="SELECT \\"x\\"",le="+Inf"} 1',
+        't_seconds_sum{query="SELECT \\"x\\""} 0.5',
+        't_seconds_count{query="SELECT \\"x\\""} 1',
+    ]
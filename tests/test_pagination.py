@@ -0,0 +1,79 @@
+import pytest
+
+NAMES = ['bob', 'Alice', 'carol', 'alice', 'Dave', 'bob', 'Eve']
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT)")
+    table = db.get_table('c')
+    table.insert_many([{'name': name} for name in NAMES])
+    return table
+
+def ids(rows):
+    return [row['id'] for row in rows]
+
+def test_limit_and_offset(db, table):
+    assert ids(db.execute_query("SELECT id FROM c ORDER BY id LIMIT 3")) == [1, 2, 3]
+    assert ids(db.execute_query("SELECT id FROM c ORDER BY id LIMIT 3 OFFSET 5")) == [6, 7]
+    assert db.execute_query("SELECT id FROM c ORDER BY id LIMIT 3 OFFSET 7") == []
+
+def test_limit_stops_the_scan_early(db, table):
+    from core.query_log import track
+    with track() as stats:
+        assert len(db.execute_query("SELECT * FROM c LIMIT 2")) == 2
+    assert stats.rows_scanned == 2
+
+@pytest.mark.parametrize('indexed', [False, True], ids=['sorted', 'index'])
+def test_keyset_pages_cover_every_row_once(db, table, indexed):
+    if indexed:
+        db.execute_query("CREATE INDEX c_name ON c USING BTREE (LOWER(name))")
+    expected = ids(db.execute_query("SELECT id FROM c ORDER BY LOWER(name), id"))
+    seen = []
+    query = "SELECT id, name FROM c ORDER BY LOWER(name), id LIMIT 2"
+    while True:
+        page = db.execute_query(query)
+        seen += ids(page)
+        if len(page) < 2:
+            break
+        last = page[-1]
+        query = (f"SELECT id, name FROM c WHERE (LOWER(name), id) > ('{last['name']}', {last['id']}) "
+                 f"ORDER BY LOWER(name), id LIMIT 2")
+    assert seen == expected == [2, 4, 1, 6, 3, 5, 7]
+
+def test_descending_keyset(db, table):
+    assert ids(db.execute_query("SELECT id FROM c WHERE (id) < (4) ORDER BY id DESC LIMIT 2")) == [3, 2]
+
+@pytest.mark.parametrize('query, message', [
+    ("SELECT id FROM c WHERE (id) > (4) ORDER BY id DESC", 'pages forward with <'),
+    ("SELECT id FROM c WHERE (name, id) > ('bob', 1) ORDER BY id", 'exactly the ORDER BY columns'),
+])
+def test_keyset_must_match_the_order(db, table, query, message):
+    with pytest.raises(ValueError, match=message):
+        db.execute_query(query)
+
+@pytest.fixture
+def contacts(backend):
+    backend.db.get_table('contacts').insert_many([{'name': name, 'email': f"{i}@x"} for i, name in enumerate(NAMES)])
+
+def test_contacts_api_pages_with_cursors(client, contacts):
+    names, cursor = [], None
+    while True:
+        response = client.get('/api/contacts', query_string={'limit': 3, **({'after': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        names += [contact['name'] for contact in body['data']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert names == ['Alice', 'alice', 'bob', 'bob', 'carol', 'Dave', 'Eve']
+
+def test_contacts_api_offset_and_full_listing(client, contacts):
+    page = client.get('/api/contacts?limit=2&offset=5').get_json()
+    assert [contact['name'] for contact in page['data']] == ['Dave', 'Eve']
+    assert page['next_cursor'] == 'Eve,7'
+    everything = client.get('/api/contacts').get_json()
+    assert len(everything['data']) == 7 and 'next_cursor' not in everything
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=2&offset=-1', 'limit=2&after=bob'])
+def test_contacts_api_rejects_bad_paging(client, contacts, query):
+    assert client.get(f'/api/contacts?{query}').status_code == 400
@@ -0,0 +1,89 @@
+import pytest
+
+from parser.sql_parser import fingerprint_query, parse_query
+
+def test_limit_and_offset():
+    parsed = parse_query("SELECT * FROM t ORDER BY LOWER(name) DESC, id LIMIT 10 OFFSET 5")
+    assert parsed['limit'] == 10 and parsed['offset'] == 5
+    assert parsed['order_by'] == [{'column': 'name', 'direction': 'DESC', 'casefold': True},
+                                  {'column': 'id', 'direction': 'ASC', 'casefold': False}]
+    assert parse_query("SELECT * FROM t LIMIT 3")['offset'] == 0
+
+@pytest.mark.parametrize('query', ["SELECT * FROM t LIMIT -1", "SELECT * FROM t OFFSET 3"])
+def test_invalid_paging_is_rejected(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+def test_row_value_keyset_condition():
+    parsed = parse_query("SELECT * FROM t WHERE (LOWER(name), id) > ('o''brien', 7) AND company = 'Acme' "
+                         "ORDER BY LOWER(name), id LIMIT 2")
+    assert parsed['after'] == {'columns': [{'column': 'name', 'casefold': True},
+                                           {'column': 'id', 'casefold': False}],
+                               'values': ["o'brien", 7], 'operator': '>'}
+    assert parsed['where'] == {'company': 'Acme'}
+
+@pytest.mark.parametrize('query, message', [
+    ("SELECT * FROM t WHERE (a, id) > (1) ORDER BY a, id", 'Row value has 1 values for 2 columns'),
+    ("SELECT * FROM t WHERE (a, id) > (1, 2) OR b = 1", 'only be ANDed'),
+])
+def test_invalid_row_value_conditions(query, message):
+    with pytest.raises(ValueError, match=message):
+        parse_query(query)
+
+@pytest.mark.parametrize('query, index_type, concurrently', [
+    ("CREATE INDEX i ON t (name)", 'HASH', False),
+    ("CREATE INDEX i ON t USING TRIGRAM (name)", 'TRIGRAM', False),
+    ("CREATE INDEX i ON t (name) USING btree", 'BTREE', False),
+    ("CREATE INDEX i ON t USING BTREE (LOWER(name))", 'BTREE_CI', False),
+    ("CREATE INDEX CONCURRENTLY i ON t (name) USING TRIGRAM", 'TRIGRAM', True),
+])
+def test_create_index(query, index_type, concurrently):
+    parsed = parse_query(query)
+    assert (parsed['index_name'], parsed['table_name'], parsed['column_name']) == ('i', 't', 'name')
+    assert parsed['index_type'] == index_type
+    assert parsed['concurrently'] is concurrently
+
+def test_lower_needs_an_ordered_index():
+    with pytest.raises(ValueError, match='only supported for BTREE'):
+        parse_query("CREATE INDEX i ON t USING TRIGRAM (LOWER(name))")
+
+def test_partition_by_hash():
+    parsed = parse_query("CREATE TABLE s (id INTEGER PRIMARY KEY, user_id INTEGER) PARTITION BY HASH (user_id) PARTITIONS 8")
+    assert parsed['partition'] == {'type': 'HASH', 'column': 'user_id', 'partitions': 8}
+    assert parse_query("CREATE TABLE s (id INTEGER) PARTITION BY HASH (id)")['partition']['partitions'] == 4
+    with pytest.raises(ValueError, match='at least one partition'):
+        parse_query("CREATE TABLE s (id INTEGER) PARTITION BY HASH (id) PARTITIONS 0")
+
+def test_partition_by_range():
+    parsed = parse_query("CREATE TABLE e (id INTEGER PRIMARY KEY, d DATE) PARTITION BY RANGE (d) ("
+                         "PARTITION p2024 VALUES LESS THAN ('2025-01-01'), "
+                         "PARTITION rest VALUES LESS THAN MAXVALUE)")
+    assert parsed['partition'] == {'type': 'RANGE', 'column': 'd', 'ranges': [
+        {'name': 'p2024', 'less_than': '2025-01-01'}, {'name': 'rest', 'less_than': None}]}
+    with pytest.raises(ValueError, match='RANGE partitioning needs'):
+        parse_query("CREATE TABLE e (id INTEGER, d DATE) PARTITION BY RANGE (d)")
+
+def test_create_table_using_lsm_with_dictionary_column():
+    parsed = parse_query("CREATE TABLE v (id INTEGER PRIMARY KEY, path TEXT ENCODING DICT) USING LSM")
+    assert parsed['engine'] == 'LSM'
+    assert parsed['columns'][1]['encoding'] == 'DICT'
+
+def test_alter_table_partitions():
+    assert parse_query("ALTER TABLE e ADD PARTITION (PARTITION p2026 VALUES LESS THAN ('2027-01-01'))") == {
+        'type': 'ADD_PARTITION', 'table_name': 'e', 'ranges': [{'name': 'p2026', 'less_than': '2027-01-01'}]}
+    assert parse_query("ALTER TABLE e DROP PARTITION p2024") == {
+        'type': 'DROP_PARTITION', 'table_name': 'e', 'partition_name': 'p2024'}
+    with pytest.raises(ValueError, match='Unsupported ALTER TABLE'):
+        parse_query("ALTER TABLE e RENAME TO f")
+
+def test_vacuum():
+    assert parse_query("VACUUM") == {'type': 'VACUUM', 'table_name': None}
+    assert parse_query("VACUUM contacts;") == {'type': 'VACUUM', 'table_name': 'contacts'}
+
+def test_fingerprint_replaces_literals_and_normalizes_layout():
+    assert fingerprint_query("select *  from t where name = 'it''s' and id = 42;") == \
+        fingerprint_query("SELECT * FROM t WHERE name = 'bob' AND id = 7") == \
+        "SELECT * FROM t WHERE name = ? AND id = ?"
+    assert fingerprint_query("SELECT * FROM t WHERE name LIKE '%5%'") == "SELECT * FROM t WHERE name LIKE ?"
+    # Numbers inside identifiers are part of the name
+    assert fingerprint_query("SELECT * FROM t2 WHERE a = 1") == "SELECT * FROM t2 WHERE a = ?"
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from core.database import Database
+
+@pytest.fixture
+def events(db):
+    db.execute_query("CREATE TABLE e (id INTEGER PRIMARY KEY, email TEXT UNIQUE, d DATE) PARTITION BY RANGE (d) ("
+                     "PARTITION p2024 VALUES LESS THAN ('2025-01-01'), "
+                     "PARTITION p2025 VALUES LESS THAN ('2026-01-01'))")
+    db.execute_query("INSERT INTO e (email, d) VALUES ('a', '2024-05-01')")
+    db.execute_query("INSERT INTO e (email, d) VALUES ('b', '2025-05-01')")
+    return db.get_table('e')
+
+def live_rows(partition):
+    return [row for row in partition.data if row is not None]
+
+def test_rows_go_to_their_range_partition_files(workdir, events):
+    assert {name: len(live_rows(p)) for name, p in events.partitions.items()} == {'p2024': 1, 'p2025': 1}
+    assert {'e__p2024.json', 'e__p2025.json'} <= set(os.listdir(workdir / 'data'))
+
+def test_value_outside_every_range_is_rejected(db, events):
+    with pytest.raises(ValueError, match='No partition of e accepts'):
+        db.execute_query("INSERT INTO e (email, d) VALUES ('c', '2026-05-01')")
+    assert events.count() == 2
+
+def test_keys_and_unique_values_span_partitions(db, events):
+    with pytest.raises(ValueError, match='unique column email'):
+        db.execute_query("INSERT INTO e (email, d) VALUES ('a', '2025-06-01')")
+    with pytest.raises(ValueError, match='primary key id'):
+        db.execute_query("INSERT INTO e (id, email, d) VALUES (1, 'c', '2025-06-01')")
+    with pytest.raises(ValueError, match='unique column email'):
+        db.execute_query("UPDATE e SET email = 'b' WHERE id = 1")
+
+def test_update_moves_a_row_to_its_new_partition(db, events):
+    assert db.execute_query("UPDATE e SET d = '2025-02-01' WHERE id = 1") == 1
+    assert live_rows(events.partitions['p2024']) == []
+    assert len(live_rows(events.partitions['p2025'])) == 2
+    assert db.execute_query("SELECT email FROM e WHERE id = 1") == [{'email': 'a'}]
+
+def test_equality_on_the_partition_column_reads_one_partition(db, events):
+    plans = []
+    db.on_plan(plans.append)
+    assert db.execute_query("SELECT email FROM e WHERE d = '2025-05-01'") == [{'email': 'b'}]
+    assert [plan['table'] for plan in plans] == ['e__p2025']
+
+def test_add_and_drop_partitions(workdir, db, events):
+    db.execute_query("ALTER TABLE e ADD PARTITION (PARTITION p2026 VALUES LESS THAN ('2027-01-01'))")
+    db.execute_query("INSERT INTO e (email, d) VALUES ('c', '2026-05-01')")
+    db.execute_query("ALTER TABLE e DROP PARTITION p2024")
+    assert db.execute_query("SELECT email FROM e ORDER BY email") == [{'email': 'b'}, {'email': 'c'}]
+    assert not (workdir / 'data' / 'e__p2024.json').exists()
+
+    reopened = Database('test', query_cache_bytes=0)
+    try:
+        table = reopened.get_table('e')
+        assert table.partition_names() == ['p2025', 'p2026']
+        # The shared key counter survives, so new keys don't reuse old ones
+        reopened.execute_query("INSERT INTO e (email, d) VALUES ('d', '2026-07-01')")
+        assert [row['id'] for row in reopened.execute_query("SELECT id FROM e ORDER BY id")] == [2, 3, 4]
+    finally:
+        reopened.close()
+
+def test_invalid_partition_changes_are_refused(db, events):
+    with pytest.raises(ValueError, match='above the highest existing bound'):
+        db.execute_query("ALTER TABLE e ADD PARTITION (PARTITION old VALUES LESS THAN ('2020-01-01'))")
+    with pytest.raises(ValueError, match='does not exist'):
+        db.execute_query("ALTER TABLE e DROP PARTITION p1999")
+    db.execute_query("CREATE TABLE s (id INTEGER PRIMARY KEY, user_id INTEGER) PARTITION BY HASH (user_id) PARTITIONS 4")
+    with pytest.raises(ValueError, match='Only RANGE partitions'):
+        db.execute_query("ALTER TABLE s DROP PARTITION p0")
+
+def test_hash_partitions_spread_rows_and_prune_lookups(db):
+    db.execute_query("CREATE TABLE s (id INTEGER PRIMARY KEY, user_id INTEGER) PARTITION BY HASH (user_id) PARTITIONS 4")
+    table = db.get_table('s')
+    table.insert_many([{'user_id': i % 20} for i in range(200)])
+    sizes = [len(live_rows(p)) for p in table.partitions.values()]
+    assert sum(sizes) == 200 and all(sizes)
+
+    plans = []
+    db.on_plan(plans.append)
+    assert db.execute_query("SELECT COUNT(*) FROM s WHERE user_id = 7") == [{'count': 10}]
+    assert len(plans) == 1
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from core.profiling import QueryProfiler
+
+def busy(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+def sample_mode_profiler():
+    profiler = QueryProfiler()
+    profiler.enable(mode='sample', interval=0.001)
+    profiler.disable()
+    return profiler
+
+def wait_for_sampler_exit(profiler, timeout=5):
+    deadline = time.monotonic() + timeout
+    while profiler.sampler is not None:
+        assert time.monotonic() < deadline, 'sampler did not stop'
+        time.sleep(0.001)
+
+def test_disabled_profiler_skips_unforced_statements():
+    profiler = sample_mode_profiler()
+    wait_for_sampler_exit(profiler)
+    with profiler.profile():
+        busy(0.01)
+    assert profiler.profiled == 0 and profiler.sampler is None
+
+def test_forced_statement_restarts_a_stopped_sampler():
+    profiler = sample_mode_profiler()
+    for _ in range(3):
+        wait_for_sampler_exit(profiler)
+        stacks = sum(profiler.stacks.values())
+        with profiler.profile(force=True):
+            busy(0.02)
+        assert sum(profiler.stacks.values()) > stacks
+    assert profiler.profiled == 3
+
+def test_concurrent_forced_statements_are_all_sampled():
+    profiler = sample_mode_profiler()
+
+    def run():
+        for _ in range(10):
+            with profiler.profile(force=True):
+                busy(0.002)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert profiler.profiled == 40 and not profiler.active_threads
+    assert 'test_profiling.py:run' in profiler.collapsed_stacks()
+    wait_for_sampler_exit(profiler)
+
+def test_cprofile_mode_merges_forced_statements():
+    profiler = QueryProfiler()
+    for _ in range(2):
+        with profiler.profile(force=True):
+            busy(0.001)
+    assert profiler.profiled == 2 and 'busy' in profiler.summary()
@@ -0,0 +1,72 @@
+import pytest
+
+from core.cache import QueryCache, normalize_query
+from core.database import Database
+
+@pytest.fixture
+def cached(workdir):
+    database = Database('test')
+    database.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT)")
+    database.get_table('c').insert_many([{'name': 'a'}, {'name': 'b'}])
+    yield database
+    database.close()
+
+def test_normalize_query_keeps_literals():
+    assert normalize_query("  SELECT *\n  FROM c   WHERE name = 'a  b' ") == "SELECT * FROM c WHERE name = 'a  b'"
+
+def test_repeated_select_is_served_from_the_cache(cached):
+    first = cached.execute_query("SELECT * FROM c")
+    assert cached.execute_query("SELECT  *  FROM c") is first
+    assert cached.query_cache.hits == 1
+
+def test_writes_invalidate_cached_results(cached):
+    cached.execute_query("SELECT * FROM c WHERE id = 1")
+    cached.execute_query("UPDATE c SET name = 'x' WHERE id = 1")
+    assert cached.execute_query("SELECT * FROM c WHERE id = 1") == [{'id': 1, 'name': 'x'}]
+    cached.get_table('c').insert({'name': 'c'})
+    assert cached.execute_query("SELECT COUNT(*) FROM c") == [{'count': 3}]
+    assert cached.query_cache.hits == 0
+
+def test_writes_by_another_process_invalidate_cached_results(cached):
+    assert cached.execute_query("SELECT COUNT(*) FROM c") == [{'count': 2}]
+    other = Database('test', query_cache_bytes=0)
+    try:
+        other.get_table('c').insert({'name': 'c'})
+    finally:
+        other.close()
+    assert cached.execute_query("SELECT COUNT(*) FROM c") == [{'count': 3}]
+
+def test_ddl_clears_the_cache(cached):
+    cached.execute_query("SELECT * FROM c")
+    cached.execute_query("DROP TABLE c")
+    with pytest.raises(ValueError, match='not found'):
+        cached.execute_query("SELECT * FROM c")
+
+def test_only_selects_are_cached(cached):
+    cached.execute_query("UPDATE c SET name = 'x' WHERE id = 1")
+    assert len(cached.query_cache.entries) == 0
+
+def test_entries_are_evicted_least_recently_used_first():
+    versions = {'c': 1}
+    # Room for three of these results but not four
+    cache = QueryCache(max_bytes=3000)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, versions, [{'v': 'x' * 500}])
+    cache.get('a', lambda name: 1)
+    cache.put('d', versions, [{'v': 'x' * 500}])
+    assert list(cache.entries) == ['c', 'a', 'd']
+    assert cache.size <= cache.max_bytes
+
+def test_results_larger_than_the_budget_are_not_cached():
+    cache = QueryCache(max_bytes=100)
+    cache.put('a', {'c': 1}, [{'v': 'x' * 500}])
+    assert cache.get('a', lambda name: 1) is None
+
+def test_stale_generations_miss_and_invalidate_drops_readers():
+    cache = QueryCache()
+    cache.put('a', {'c': 1, 'd': 1}, [])
+    cache.put('b', {'d': 1}, [])
+    assert cache.get('a', {'c': 2, 'd': 1}.get) is None
+    assert 'a' not in cache.entries
+    cache.invalidate('d')
+    assert not cache.entries and not cache.by_name and cache.size == 0
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from core.metrics import QUERIES
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT)")
+    db.get_table('c').insert_many([{'name': f"n{i}"} for i in range(5)])
+
+def test_cursor_logs_the_statement_once_read(db, table):
+    logged = len(db.query_log.recent())
+    cursor = db.execute_cursor("SELECT * FROM c")
+    assert len(db.query_log.recent()) == logged
+    assert len(list(cursor)) == 5
+    entry = db.query_log.recent()[-1]
+    assert entry['success'] and entry['rows_returned'] == 5 and entry['rows_scanned'] == 5
+
+def test_cursor_closed_early_is_still_logged(db, table):
+    cursor = db.execute_cursor("SELECT * FROM c")
+    next(cursor)
+    cursor.close()
+    assert db.query_log.recent()[-1]['rows_returned'] == 1
+
+def test_cursor_that_fails_to_open_is_logged(db):
+    errors = QUERIES.get(type='SELECT', status='error')
+    with pytest.raises(ValueError, match='not found'):
+        db.execute_cursor("SELECT * FROM nope")
+    assert 'not found' in db.query_log.recent()[-1]['error']
+    assert QUERIES.get(type='SELECT', status='error') == errors + 1
+
+def test_cursor_that_fails_while_read_is_logged(db, table, monkeypatch):
+    def failing_cursor(table, parsed_query):
+        yield {'id': 1}
+        raise RuntimeError('disk gone')
+
+    monkeypatch.setattr(db, '_select_cursor', failing_cursor)
+    cursor = db.execute_cursor("SELECT * FROM c")
+    with pytest.raises(RuntimeError):
+        list(cursor)
+    entry = db.query_log.recent()[-1]
+    assert entry['error'] == 'disk gone' and entry['rows_returned'] == 1
+
+def test_streamed_api_statements_are_logged(backend, client):
+    backend.db.get_table('contacts').insert({'name': 'Ann', 'email': 'ann@x'})
+    response = client.post('/api/sql/execute', json={'query': "SELECT * FROM contacts", 'stream': 'ndjson'})
+    assert [json.loads(line)['name'] for line in response.get_data(as_text=True).splitlines()] == ['Ann']
+    assert backend.db.query_log.recent()[-1]['rows_returned'] == 1
+
+    response = client.post('/api/sql/execute', json={'query': "SELECT * FROM nope", 'stream': 'ndjson'})
+    assert response.status_code == 500
+    assert 'not found' in backend.db.query_log.recent()[-1]['error']
@@ -0,0 +1,97 @@
+import io
+
+import pytest
+
+from core.blockfile import load_blocks, read_header, write_blocks
+from core.columnar import MappedRows
+from core.database import Database
+
+FORMATS = {'json': '.json', 'blocks': '.tbl', 'blocks(lzma)': '.tbl', 'columnar': '.col'}
+
+def open_db(table_format):
+    return Database('test', query_cache_bytes=0, table_format=table_format)
+
+@pytest.fixture(params=list(FORMATS))
+def table_format(request):
+    return request.param
+
+@pytest.fixture
+def fmt_db(workdir, table_format):
+    database = open_db(table_format)
+    database.execute_query("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT, kind TEXT ENCODING DICT, "
+                           "score FLOAT, ok BOOLEAN)")
+    database.get_table('t').insert_many([{'name': f"n{i}", 'kind': 'ab'[i % 2], 'score': i / 2, 'ok': i % 3 == 0}
+                                         for i in range(10)])
+    yield database
+    database.close()
+
+def rows(db):
+    return db.execute_query("SELECT * FROM t ORDER BY id")
+
+def test_snapshot_is_written_in_the_configured_format(workdir, fmt_db, table_format):
+    assert [path.suffix for path in (workdir / 'data').glob('t.*') if path.suffix in ('.json', '.tbl', '.col')] == \
+        [FORMATS[table_format]]
+
+def test_rows_round_trip_through_writes_and_reload(fmt_db, table_format):
+    fmt_db.execute_query("UPDATE t SET name = 'x' WHERE id = 2")
+    fmt_db.execute_query("DELETE FROM t WHERE id = 3")
+    fmt_db.execute_query("UPDATE t SET kind = 'c' WHERE kind = 'b'")
+    fmt_db.get_table('t').insert({'name': 'new', 'kind': 'a', 'score': None, 'ok': None})
+    expected = rows(fmt_db)
+    assert len(expected) == 10 and expected[1]['name'] == 'x' and expected[-1]['id'] == 11
+
+    reopened = open_db(table_format)
+    try:
+        assert rows(reopened) == expected
+        assert reopened.execute_query("SELECT id FROM t WHERE kind = 'c'") == [{'id': i} for i in (2, 4, 6, 8, 10)]
+        assert reopened.execute_query("SELECT COUNT(*) FROM t WHERE name LIKE 'n_'") == [{'count': 8}]
+    finally:
+        reopened.close()
+
+@pytest.mark.parametrize('reader', list(FORMATS))
+def test_any_format_reads_files_written_in_another(fmt_db, reader):
+    expected = rows(fmt_db)
+    reopened = open_db(reader)
+    try:
+        assert rows(reopened) == expected
+        # The next full save switches the file to the reader's format
+        reopened.execute_query("UPDATE t SET name = 'y'")
+        assert [row['name'] for row in rows(reopened)] == ['y'] * 10
+    finally:
+        reopened.close()
+
+def test_vacuum_in_every_format(fmt_db, table_format):
+    fmt_db.execute_query("DELETE FROM t WHERE kind = 'a'")
+    assert fmt_db.execute_query("VACUUM t")[0]['reclaimed'] == 5
+    reopened = open_db(table_format)
+    try:
+        assert [row['id'] for row in rows(reopened)] == [2, 4, 6, 8, 10]
+    finally:
+        reopened.close()
+
+def test_block_file_round_trip():
+    data = {'columns': ['a'], 'rows': [[i] if i % 5 else None for i in range(10)], 'next_id': 11}
+    f = io.BytesIO()
+    write_blocks(f, data, 'zlib', block_rows=4)
+    header = read_header(f)
+    assert [(block['first_row'], block['rows']) for block in header['blocks']] == [(0, 4), (4, 4), (8, 2)]
+    assert load_blocks(f) == data
+
+def test_truncated_block_file_is_rejected():
+    f = io.BytesIO()
+    write_blocks(f, {'rows': [[1]]})
+    with pytest.raises(ValueError, match='truncated'):
+        load_blocks(io.BytesIO(f.getvalue()[:-3]))
+
+def test_columnar_rows_are_mapped_and_decoded_lazily(workdir):
+    database = open_db('columnar')
+    try:
+        database.execute_query("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT, score FLOAT)")
+        table = database.get_table('t')
+        table.insert_many([{'name': f"n{i}", 'score': i / 2} for i in range(5)])
+        assert isinstance(table.data, MappedRows)
+        assert table.data[3] == (4, 'n3', 1.5)
+        database.execute_query("DELETE FROM t WHERE id = 1")
+        assert table.dead_rows() == 1
+    finally:
+        database.close()
@@ -0,0 +1,80 @@
+import pytest
+
+from core.database import Database
+from core.vacuum import Vacuumer
+
+@pytest.fixture
+def table(db):
+    db.execute_query("CREATE TABLE c (id INTEGER PRIMARY KEY, name TEXT, n INTEGER)")
+    db.execute_query("CREATE INDEX c_n ON c (n)")
+    table = db.get_table('c')
+    table.insert_many([{'name': f"n{i}", 'n': i % 4} for i in range(1, 21)])
+    db.execute_query("DELETE FROM c WHERE n = 0")
+    return table
+
+def ids(rows):
+    return [row['id'] for row in rows]
+
+def test_vacuum_drops_deleted_rows_and_renumbers(db, table):
+    assert table.dead_rows() == 5 and len(table.data) == 20
+    assert db.execute_query("VACUUM c")[0]['reclaimed'] == 5
+    assert table.dead_rows() == 0 and len(table.data) == 15
+    assert ids(db.execute_query("SELECT id FROM c WHERE n = 1")) == [1, 5, 9, 13, 17]
+    assert db.execute_query("SELECT name FROM c WHERE id = 18") == [{'name': 'n18'}]
+
+def test_vacuum_folds_the_change_log_into_the_snapshot(workdir, db, table):
+    db.execute_query("UPDATE c SET name = 'x' WHERE id = 1")
+    assert (workdir / 'data' / 'c.log').exists()
+    db.execute_query("VACUUM")
+    assert not (workdir / 'data' / 'c.log').exists()
+    reopened = Database('test', query_cache_bytes=0)
+    try:
+        assert reopened.get_table('c').dead_rows() == 0
+        assert reopened.execute_query("SELECT name FROM c WHERE id = 1") == [{'name': 'x'}]
+    finally:
+        reopened.close()
+
+def test_vacuum_of_a_clean_table_reclaims_nothing(db, table):
+    db.execute_query("VACUUM c")
+    assert db.execute_query("VACUUM c")[0]['reclaimed'] == 0
+
+def test_vacuum_of_a_missing_table_fails(db):
+    with pytest.raises(ValueError, match='not found'):
+        db.execute_query("VACUUM nope")
+
+def test_a_write_during_the_copy_is_kept(db, table, monkeypatch):
+    copy_live = table._copy_live
+    calls = []
+
+    def copy_with_a_write(data, *args):
+        if not calls:
+            # The first copy loses to this write and is thrown away
+            table.insert({'name': 'late', 'n': 1})
+        calls.append(1)
+        return copy_live(data, *args)
+
+    monkeypatch.setattr(table, '_copy_live', copy_with_a_write)
+    assert db.execute_query("VACUUM c")[0]['reclaimed'] == 5
+    assert len(calls) == 2
+    assert db.execute_query("SELECT id FROM c WHERE name = 'late'") == [{'id': 21}]
+
+def test_vacuum_merges_every_run_of_an_lsm_table(db):
+    db.execute_query("CREATE TABLE l (id INTEGER PRIMARY KEY, v TEXT) USING LSM")
+    table = db.get_table('l')
+    table.insert_many([{'v': str(i)} for i in range(10)])
+    table.store.flush()
+    db.execute_query("DELETE FROM l WHERE v = '3'")
+    result = db.execute_query("VACUUM l")[0]
+    assert result['rows'] == 9
+    assert sum(len(level) for level in table.store.levels) == 1
+    assert len(db.execute_query("SELECT * FROM l")) == 9
+
+def test_background_vacuum_only_takes_tables_over_the_threshold(db, table):
+    vacuumer = Vacuumer(db, interval=3600, threshold=0.3, min_dead_rows=1)
+    try:
+        assert vacuumer.run_once() == []
+        db.execute_query("DELETE FROM c WHERE n = 1")
+        assert [result['table'] for result in vacuumer.run_once()] == ['c']
+        assert table.dead_rows() == 0
+    finally:
+        vacuumer.stop()
@@ -1,14 +1,43 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context
 from flask_cors import CORS
+import atexit
+import json
+import logging
+import random
 import sys
 import os
+import time
+import zlib
 from datetime import datetime
+from functools import wraps
 
-# Add the core module to path
+# Add the core module to path, and this directory for schema when imported as web_app.backend.app
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from core.database import Database
+from core.metrics import REGISTRY
 from parser.sql_parser import parse_query
+from schema import initialize_database
+
+class SampledFilter(logging.Filter):
+    """Pass INFO and above, but only a random fraction of DEBUG records"""
+    
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+# RDBMS_LOG_LEVEL=DEBUG logs every request; RDBMS_LOG_SAMPLE_RATE keeps that affordable under load
+logging.basicConfig(level=os.environ.get('RDBMS_LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('contact_manager')
+logger.addFilter(SampledFilter(float(os.environ.get('RDBMS_LOG_SAMPLE_RATE', '1.0'))))
+
+HTTP_DURATION = REGISTRY.histogram('http_request_duration_seconds', 'Backend request latency',
+                                   ('endpoint', 'method', 'status'))
 
 app = Flask(__name__)
 allowed_origins = [
@@ -24,30 +53,24 @@ CORS(app, resources={
     }
 })
 
-# Initialize database
-db = Database("contact_manager")
+# Initialize database (set RDBMS_QUERY_CACHE_BYTES to size the SELECT result cache (0 disables it),
+# RDBMS_SLOW_QUERY_MS for the slow-query log threshold, RDBMS_DURABILITY to
+# always, group(<ms>) or off, RDBMS_WRITE_BATCH_MS to hold contact writes
+# briefly so more of them share a batch, and RDBMS_TABLE_FORMAT to json,
+# blocks(zlib|lzma) for compressed table files or columnar for memory-mapped ones)
+db = Database("contact_manager",
+              query_cache_bytes=int(os.environ.get('RDBMS_QUERY_CACHE_BYTES', str(64 * 1024 * 1024))),
+              slow_query_ms=float(os.environ.get('RDBMS_SLOW_QUERY_MS', '100')),
+              durability=os.environ.get('RDBMS_DURABILITY', 'off'),
+              write_batch_ms=float(os.environ.get('RDBMS_WRITE_BATCH_MS', '0')),
+              table_format=os.environ.get('RDBMS_TABLE_FORMAT', 'json'),
+              autovacuum_seconds=float(os.environ.get('RDBMS_AUTOVACUUM_SECONDS', '0')),
+              vacuum_rows_per_second=float(os.environ.get('RDBMS_VACUUM_ROWS_PER_SECOND', '50000')))
 
-def initialize_database():
-    """Initialize database with required tables"""
-    try:
-        create_contacts_table = """
-        CREATE TABLE contacts (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE,
-            phone TEXT,
-            address TEXT,
-            company TEXT,
-            created_at DATE
-        )
-        """
-        
-        db.execute_query(create_contacts_table)
-        print("Database initialized successfully")
-    except Exception as e:
-        print(f"Database already initialized: {e}")
+# Background threads and LSM stores outlive requests; stop them with the server
+atexit.register(db.close)
 
-initialize_database()
+initialize_database(db)
 
 def safe_sql_value(value):
     """Escape SQL special characters to prevent injection"""
@@ -57,6 +80,39 @@ def safe_sql_value(value):
     escaped = str(value).replace("'", "''")
     return f"'{escaped}'"
 
+def conditional_get(tables, state=None):
+    """Answer If-None-Match with 304 when none of the tables a route reads have changed.
+    
+    `tables` maps the view's URL arguments to the table names it reads. The ETag
+    is built from table generation numbers, so a match costs a few tiny file
+    reads and never runs a query. `state`, if given, maps the same arguments to
+    a string for anything else the response shows that can change in between.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = db.table_versions(tables(**kwargs))
+            tag = '-'.join(f"{name}.{version}" for name, version in sorted(versions.items()))
+            if state:
+                tag += state(**kwargs)
+            # Different query strings get different URLs, but fold them in for shared caches too
+            etag = f"{zlib.crc32(f'{tag}?{request.query_string.decode()}'.encode('utf-8')):08x}"
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let browsers keep the body but check back every time
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def contacts_table(**kwargs):
+    return ['contacts']
+
 @app.route('/')
 def index():
     return jsonify({
@@ -69,12 +125,32 @@ def index():
     })
 
 @app.route('/api/contacts', methods=['GET'])
+@conditional_get(contacts_table)
 def get_contacts():
-    """Get all contacts"""
+    """Get all contacts, or one page of them with ?limit=&offset= or ?limit=&after=<name,id>"""
     try:
-        query = "SELECT * FROM contacts ORDER BY name"
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        after = request.args.get('after')
+        if (limit is not None and limit < 1) or offset < 0:
+            return jsonify({'success': False, 'error': 'limit must be positive and offset non-negative'}), 400
+        
+        # id breaks ties between equal names so keyset cursors are unambiguous
+        query = "SELECT * FROM contacts"
+        if after:
+            # Names may contain commas, ids cannot
+            after_name, _, after_id = after.rpartition(',')
+            if not after_id.isdigit():
+                return jsonify({'success': False, 'error': 'after must look like <name>,<id>'}), 400
+            query += f" WHERE (LOWER(name), id) > ({safe_sql_value(after_name)}, {int(after_id)})"
+        query += " ORDER BY LOWER(name), id"
+        if limit is not None:
+            query += f" LIMIT {limit}"
+            if offset and not after:
+                query += f" OFFSET {offset}"
+        
         result = db.execute_query(query)
-        print(f"GET /api/contacts - Returning {len(result) if result else 0} contacts") 
+        logger.debug("GET /api/contacts - returning %d contacts", len(result) if result else 0)
         
         # Extract just the rows from the result
         if isinstance(result, dict) and 'rows' in result:
@@ -83,13 +159,19 @@ def get_contacts():
             contacts_data = result
         else:
             contacts_data = []
-            
-        return jsonify({'success': True, 'data': contacts_data})
+        
+        response = {'success': True, 'data': contacts_data}
+        if limit is not None:
+            # A full page may have more after it; a short one is the last
+            last = contacts_data[-1] if len(contacts_data) == limit else None
+            response['next_cursor'] = f"{last['name']},{last['id']}" if last else None
+        return jsonify(response)
     except Exception as e:
-        print(f"GET /api/contacts - Error: {e}")  
+        logger.error("GET /api/contacts failed: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/contacts/<int:contact_id>', methods=['GET'])
+@conditional_get(contacts_table)
 def get_contact(contact_id):
     """Get a single contact by ID"""
     try:
@@ -104,6 +186,7 @@ def get_contact(contact_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/contacts/search', methods=['GET'])
+@conditional_get(contacts_table)
 def search_contacts():
     """Search contacts by name, email, or phone"""
     search_query = request.args.get('q', '')
@@ -118,7 +201,7 @@ def search_contacts():
         WHERE name LIKE '%{safe_query}%' 
         OR email LIKE '%{safe_query}%' 
         OR phone LIKE '%{safe_query}%'
-        ORDER BY name
+        ORDER BY LOWER(name)
         """
         result = db.execute_query(query)
         return jsonify({'success': True, 'data': result})
@@ -136,37 +219,27 @@ def create_contact():
             if field not in data or not data[field].strip():
                 return jsonify({'success': False, 'error': f'{field} is required'}), 400
         
-        # Prepare safe values
-        name = safe_sql_value(data['name'])
-        email = safe_sql_value(data['email'])
-        phone = safe_sql_value(data.get('phone', ''))
-        address = safe_sql_value(data.get('address', ''))
-        company = safe_sql_value(data.get('company', ''))
-        created_at = safe_sql_value(datetime.now().strftime('%Y-%m-%d'))
-        
-        query = f"""
-        INSERT INTO contacts (name, email, phone, address, company, created_at) 
-        VALUES ({name}, {email}, {phone}, {address}, {company}, {created_at})
-        """
+        values = {
+            'name': str(data['name']),
+            'email': str(data['email']),
+            'phone': str(data.get('phone', '')),
+            'address': str(data.get('address', '')),
+            'company': str(data.get('company', '')),
+            'created_at': datetime.now().strftime('%Y-%m-%d')
+        }
         
-        result = db.execute_query(query)
-        print(f"POST /api/contacts - Created contact with result: {result}") 
+        # Concurrent signups are coalesced into one batch and one table write;
+        # the stored row comes back with this request's own id
+        contact = db.batched_insert('contacts', values)
+        logger.debug("POST /api/contacts - created contact %s", contact['id'])
         
         return jsonify({
             'success': True, 
-            'data': {
-                'id': result, 
-                'name': data['name'],
-                'email': data['email'],
-                'phone': data.get('phone', ''),
-                'address': data.get('address', ''),
-                'company': data.get('company', ''),
-                'created_at': datetime.now().strftime('%Y-%m-%d')
-            },
+            'data': contact,
             'message': 'Contact created successfully'
         })
     except Exception as e:
-        print(f"POST /api/contacts - Error: {e}") 
+        logger.error("POST /api/contacts failed: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/contacts/<int:contact_id>', methods=['PUT'])
@@ -174,27 +247,20 @@ def update_contact(contact_id):
     """Update an existing contact"""
     try:
         data = request.json
-        print(f"UPDATE request for contact {contact_id}: {data}")
+        logger.debug("UPDATE request for contact %s: %s", contact_id, data)
         
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
-        set_parts = []
-        for key, value in data.items():
-            if key != 'id': 
-                safe_value = safe_sql_value(value)
-                set_parts.append(f"{key} = {safe_value}")
+        # Values are stored as text, as they were when they went through SQL literals
+        set_values = {key.lower(): None if value is None else str(value)
+                      for key, value in data.items() if key != 'id'}
         
-        if not set_parts:
+        if not set_values:
             return jsonify({'success': False, 'error': 'No valid fields to update'}), 400
         
-        set_clause = ', '.join(set_parts)
-        query = f"UPDATE contacts SET {set_clause} WHERE id = {contact_id}"
-        
-        print(f"UPDATE query: {query}")
-        
-        result = db.execute_query(query)
-        print(f"UPDATE result: {result}")
+        result = db.batched_update('contacts', set_values, {'id': contact_id})
+        logger.debug("UPDATE contact %s changed %s row(s)", contact_id, result)
 
         if result is not None and result != 0:
             get_query = f"SELECT * FROM contacts WHERE id = {contact_id}"
@@ -214,9 +280,7 @@ def update_contact(contact_id):
         else:
             return jsonify({'success': False, 'error': 'Contact not found'}), 404
     except Exception as e:
-        print(f"UPDATE Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("UPDATE contact %s failed", contact_id)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/contacts/<int:contact_id>', methods=['DELETE'])
@@ -224,10 +288,8 @@ def delete_contact(contact_id):
     """Delete a contact"""
     try:
         query = f"DELETE FROM contacts WHERE id = {contact_id}"
-        print(f"DELETE query: {query}")
-        
         result = db.execute_query(query)
-        print(f"DELETE result: {result}")
+        logger.debug("DELETE contact %s removed %s row(s)", contact_id, result)
         
         if result is not None and result != 0:
             return jsonify({'success': True, 'message': 'Contact deleted successfully'})
@@ -247,12 +309,54 @@ def delete_contact(contact_id):
             else:
                 return jsonify({'success': False, 'error': 'Contact not found'}), 404
     except Exception as e:
-        print(f"DELETE Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("DELETE contact %s failed", contact_id)
         return jsonify({'success': False, 'error': str(e)}), 5000
 
-query_history = []
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+# Rows are flushed to the client in chunks of roughly this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def stream_rows(rows, stream_format):
+    """Serialize rows from an engine cursor as they are read.
+    
+    ndjson writes one row per line; json writes the usual {"success", "data"}
+    envelope as a chunked array. An error partway through is reported as a
+    final {"error": ...} line (ndjson) or an "error" key after the array (json).
+    The cursor logs the statement itself, errors included.
+    """
+    chunk = []
+    size = 0
+    count = 0
+    error = None
+    if stream_format == 'json':
+        chunk.append('{"success": true, "data": [')
+    try:
+        for row in rows:
+            line = json.dumps(row, default=str)
+            if stream_format == 'ndjson':
+                line += '\n'
+            elif count:
+                line = ',' + line
+            chunk.append(line)
+            size += len(line)
+            count += 1
+            if size >= STREAM_CHUNK_BYTES:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+    except Exception as e:
+        logger.warning("Streamed SQL failed after %d rows: %s", count, e)
+        error = str(e)
+    
+    if stream_format == 'ndjson':
+        if error:
+            chunk.append(json.dumps({'error': error}) + '\n')
+    else:
+        chunk.append(f'], "rows_affected": {count}')
+        if error:
+            chunk.append(f', "error": {json.dumps(error)}')
+        chunk.append('}')
+    yield ''.join(chunk)
 
 @app.route('/api/sql/execute', methods=['POST'])
 def execute_sql():
@@ -263,72 +367,132 @@ def execute_sql():
             return jsonify({'success': False, 'error': 'No query provided'}), 400
         
         query = data['query'].strip()
-        print(f"\n{'='*50}")
-        print(f"SQL EXECUTION STARTED")
-        print(f"Query: {query}")
-        print(f"{'='*50}")
         
-        # Execute the query
-        result = db.execute_query(query)
-        print(f"Raw result from db.execute_query(): {result}")
-        print(f"Result type: {type(result)}")
-        
-        # Store in history
-        query_history.append({
-            'id': len(query_history) + 1,
-            'query': query,
-            'result': result,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Keep only last 50 queries
-        if len(query_history) > 50:
-            query_history.pop(0)
+        # Opt-in streaming: {"stream": "ndjson"} (or true) or {"stream": "json"}, or an
+        # Accept: application/x-ndjson header
+        stream = data.get('stream')
+        if stream is True or (not stream and 'application/x-ndjson' in request.headers.get('Accept', '')):
+            stream = 'ndjson'
+        if stream:
+            if stream not in STREAM_FORMATS:
+                return jsonify({'success': False, 'error': f'Unknown stream format {stream}'}), 400
+            # Errors in the query itself still come back as a normal JSON error
+            rows = db.execute_cursor(query)
+            return Response(stream_with_context(stream_rows(rows, stream)),
+                            mimetype=STREAM_FORMATS[stream])
+        
+        # Execute the query; only its shape is logged, never the rows.
+        # {"profile": true} always profiles this statement, whatever the sample rate
+        result = db.execute_query(query, profile=bool(data.get('profile')))
+        logger.debug("SQL execution returned %s: %s", type(result).__name__, query)
         
         response_data = {
             'success': True,
         }
         
         if isinstance(result, list):
-            print(f"Result is a list with {len(result)} items")
             response_data['data'] = result
             response_data['rows_affected'] = len(result)
         elif isinstance(result, dict):
-            print(f"Result is a dict with keys: {list(result.keys())}")
             if 'rows' in result:
                 response_data['data'] = result['rows']
                 response_data['rows_affected'] = len(result['rows'])
             else:
                 response_data['result'] = result
         elif isinstance(result, int):
-            print(f"Result is an int: {result}")
             response_data['rows_affected'] = result
             response_data['message'] = f'Query affected {result} row(s)'
         else:
-            print(f"Result is other type: {result}")
             response_data['result'] = result
         
-        print(f"Final response data: {response_data}")
-        print(f"{'='*50}")
-        print(f"SQL EXECUTION COMPLETED")
-        print(f"{'='*50}\n")
-        
         return jsonify(response_data)
         
     except Exception as e:
-        print(f"\n{'='*50}")
-        print(f"SQL EXECUTION ERROR")
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
-        print(f"{'='*50}\n")
+        logger.warning("SQL execution failed: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def read_changes(since, table_name, epoch):
+    """Changes after `since` from the engine's change feed, in the /api/changes response shape.
+    
+    Without `since` nothing is returned, only the position to follow the feed from.
+    """
+    if since is None:
+        return {'success': True, 'data': [], 'seq': db.changes.seq, 'epoch': db.changes.epoch, 'reset': False}
+    if table_name:
+        # Reloads done here turn writes by other worker processes into 'reset' records
+        table = db.get_table(table_name)
+        if table:
+            table.refresh()
+    changes, seq, complete = db.changes.since(since, table_name)
+    # A sequence number from another feed (server restart, other worker) cannot be resumed
+    if epoch and epoch != db.changes.epoch:
+        changes, complete = [], False
+    return {
+        'success': True,
+        'data': changes,
+        'seq': seq,
+        'epoch': db.changes.epoch,
+        'reset': not complete
+    }
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Row changes since a sequence number: ?since=<seq>[&table=contacts][&epoch=<epoch>].
+    
+    Call it without `since` before loading to get the position to sync from.
+    When `reset` is true the client missed changes and should reload, then
+    continue from the returned `seq`.
+    """
+    since = request.args.get('since', type=int)
+    table_name = request.args.get('table', type=str)
+    return jsonify(read_changes(since, table_name.lower() if table_name else None,
+                                request.args.get('epoch')))
+
+# Idle Server-Sent Events connections get a comment this often to keep proxies from closing them
+CHANGES_HEARTBEAT_SECONDS = 15
+
+@app.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    """Server-Sent Events version of /api/changes; resumes from Last-Event-ID on reconnect"""
+    since = request.args.get('since', type=int)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = db.changes.seq
+    table_name = request.args.get('table', type=str)
+    table_name = table_name.lower() if table_name else None
+    epoch = request.args.get('epoch')
+    
+    def events(since, epoch):
+        while True:
+            batch = read_changes(since, table_name, epoch)
+            if batch['reset']:
+                yield f"id: {batch['seq']}\nevent: reset\ndata: {json.dumps(batch)}\n\n"
+                # After a reset the client reloads and follows this feed from here
+                epoch = batch['epoch']
+            for change in batch['data']:
+                yield f"id: {change['seq']}\ndata: {json.dumps(change, default=str)}\n\n"
+            since = batch['seq']
+            if not db.changes.wait(since, CHANGES_HEARTBEAT_SECONDS):
+                yield ": heartbeat\n\n"
+    
+    return Response(stream_with_context(events(since, epoch)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def index_builds(table_name=None):
+    """CREATE INDEX CONCURRENTLY builds running or failed in this process, for one table or all"""
+    return [build.to_dict() for build in list(db.index_builds.values())
+            if table_name is None or build.table_name == table_name.lower()]
+
 @app.route('/api/sql/schema', methods=['GET'])
 @app.route('/api/sql/schema/<table_name>', methods=['GET'])
+@conditional_get(lambda table_name=None: [table_name.lower()] if table_name else list(db.tables),
+                 lambda table_name=None: json.dumps([[build['index_name'], build['state'], build['rows_done']]
+                                                     for build in index_builds(table_name)]))
 def get_schema(table_name=None):
     """Get database schema"""
     try:
@@ -351,21 +515,24 @@ def get_schema(table_name=None):
                     'data_type': column.data_type,
                     'is_primary': column.is_primary,
                     'is_unique': column.is_unique,
-                    'nullable': column.nullable
+                    'nullable': column.nullable,
+                    'encoding': column.encoding
                 })
             
-            for index_name in table.indexes:
-                # Extract column name from index name
-                col_name = index_name.split('_')[-1] if '_' in index_name else 'unknown'
+            for index_name, index in table.indexes.items():
                 table_schema['indexes'].append({
                     'name': index_name,
                     'table_name': table.name,
-                    'column_name': col_name
+                    'column_name': index.column_name,
+                    'index_type': index.index_type
                 })
+            # Indexes still being built concurrently, with their progress
+            table_schema['building_indexes'] = index_builds(table.name)
             
             schema.append(table_schema)
         else:
-            # Get all tables
+            # Get all tables (picking up any created by other workers)
+            db.refresh()
             for table_name, table in db.tables.items():
                 table_schema = {
                     'name': table.name,
@@ -379,16 +546,19 @@ def get_schema(table_name=None):
                         'data_type': column.data_type,
                         'is_primary': column.is_primary,
                         'is_unique': column.is_unique,
-                        'nullable': column.nullable
+                        'nullable': column.nullable,
+                        'encoding': column.encoding
                     })
                 
-                for index_name in table.indexes:
-                    col_name = index_name.split('_')[-1] if '_' in index_name else 'unknown'
+                for index_name, index in table.indexes.items():
                     table_schema['indexes'].append({
                         'name': index_name,
                         'table_name': table.name,
-                        'column_name': col_name
+                        'column_name': index.column_name,
+                        'index_type': index.index_type
                     })
+                # Indexes still being built concurrently, with their progress
+                table_schema['building_indexes'] = index_builds(table.name)
                 
                 schema.append(table_schema)
         
@@ -410,6 +580,8 @@ def create_index_route():
         table_name = data['table_name'].lower()
         column_name = data['column_name'].lower()
         index_name = data.get('index_name')
+        # {"concurrently": true} returns at once and builds in the background (see the schema endpoint)
+        concurrently = 'CONCURRENTLY ' if data.get('concurrently') else ''
         
         table = db.get_table(table_name)
         if not table:
@@ -417,11 +589,17 @@ def create_index_route():
         
         # Build CREATE INDEX query
         if index_name:
-            query = f"CREATE INDEX {index_name} ON {table_name} ({column_name})"
+            query = f"CREATE INDEX {concurrently}{index_name} ON {table_name} ({column_name})"
         else:
-            query = f"CREATE INDEX idx_{table_name}_{column_name} ON {table_name} ({column_name})"
+            query = f"CREATE INDEX {concurrently}idx_{table_name}_{column_name} ON {table_name} ({column_name})"
         
-        db.execute_query(query)
+        result = db.execute_query(query)
+        if concurrently:
+            return jsonify({
+                'success': True,
+                'message': f'Building index on {table_name}.{column_name}',
+                'data': result
+            }), 202
         
         return jsonify({
             'success': True,
@@ -452,15 +630,85 @@ def drop_index_route(table_name, index_name):
 
 @app.route('/api/sql/history', methods=['GET'])
 def get_query_history():
-    """Get SQL query history"""
+    """Recent statements (fingerprints and counters only), the slow-query log and
+    per-fingerprint latency percentiles"""
     try:
         return jsonify({
             'success': True,
-            'data': query_history[-20:] 
+            'data': db.query_log.recent(20),
+            'slow_queries': db.query_log.slow_queries(),
+            'fingerprints': db.query_log.aggregates()
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def require_admin(f):
+    """Admin routes need RDBMS_ADMIN_TOKEN to be set and sent as a bearer token"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = os.environ.get('RDBMS_ADMIN_TOKEN')
+        if not token:
+            return jsonify({'success': False, 'error': 'Admin routes are disabled (set RDBMS_ADMIN_TOKEN)'}), 403
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
+@app.route('/api/admin/profile', methods=['GET'])
+@require_admin
+def get_profile():
+    """Profiler status, or the collected profile with ?format=pstats|collapsed|text"""
+    profile_format = request.args.get('format')
+    if profile_format == 'pstats':
+        data = db.profiler.pstats_bytes()
+        if data is None:
+            return jsonify({'success': False, 'error': 'No statements have been profiled yet'}), 404
+        response = Response(data, mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = 'attachment; filename=rdbms.pstats'
+        return response
+    if profile_format == 'collapsed':
+        return Response(db.profiler.collapsed_stacks(), mimetype='text/plain')
+    if profile_format == 'text':
+        return Response(db.profiler.summary(int(request.args.get('limit', 30))), mimetype='text/plain')
+    return jsonify({'success': True, 'data': db.profiler.status()})
+
+@app.route('/api/admin/profile', methods=['POST'])
+@require_admin
+def set_profile():
+    """Turn profiling on or off: {"enabled": true, "sample_rate": 0.05, "mode": "cprofile"|"sample",
+    "reset": true}"""
+    try:
+        data = request.json or {}
+        if data.get('reset'):
+            db.profiler.reset()
+        if 'enabled' in data:
+            if data['enabled']:
+                db.profiler.enable(float(data.get('sample_rate', 1.0)), data.get('mode', 'cprofile'))
+            else:
+                db.profiler.disable()
+        logger.info("Profiler settings changed: %s", db.profiler.status())
+        return jsonify({'success': True, 'data': db.profiler.status()})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.before_request
+def start_timer():
+    request.environ['rdbms.start'] = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    start = request.environ.get('rdbms.start')
+    if start is not None:
+        # Streamed bodies are still being produced; this measures time to the first byte
+        HTTP_DURATION.observe(time.perf_counter() - start, endpoint=request.endpoint or 'unknown',
+                              method=request.method, status=response.status_code)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Engine and request metrics in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -0,0 +1,37 @@
+import logging
+
+logger = logging.getLogger('contact_manager')
+
+CONTACTS_TABLE = """
+CREATE TABLE contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT UNIQUE,
+    phone TEXT,
+    address TEXT,
+    company TEXT ENCODING DICT,
+    created_at DATE
+)
+"""
+
+# Trigram indexes keep the '%term%' search endpoint off the full-scan path, and the
+# case-folded ordered index on name serves the A-Z listing and prefix lookups
+CONTACT_INDEXES = {
+    'idx_contacts_name_trgm': "USING TRIGRAM (name)",
+    'idx_contacts_email_trgm': "USING TRIGRAM (email)",
+    'idx_contacts_phone_trgm': "USING TRIGRAM (phone)",
+    'idx_contacts_name_lower': "USING BTREE (LOWER(name))",
+}
+
+def initialize_database(db):
+    """Create the contacts table and its indexes in a database if they are missing"""
+    try:
+        db.execute_query(CONTACTS_TABLE)
+        logger.info("Database initialized")
+    except Exception as e:
+        logger.info("Database already initialized: %s", e)
+    
+    contacts = db.get_table('contacts')
+    for index_name, definition in CONTACT_INDEXES.items():
+        if contacts and index_name not in contacts.indexes:
+            db.execute_query(f"CREATE INDEX {index_name} ON contacts {definition}")
@@ -1,18 +1,40 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import ContactList from "./components/contact-list";
 import ContactForm from "./components/contact-form";
 import SearchBar from "./components/search-bar";
 import SqlQueryEditor from "./components/sql-query-editor";
 import DatabaseSchema from "./components/database-schema";
-import { getAllContacts, searchContacts, healthCheck } from "./services/api";
-import type { Contact } from "./types";
+import { getContactsPage, getContactChanges, searchContacts, healthCheck } from "./services/api";
+import type { Contact, ChangeRecord } from "./types";
 import { FaPlus, FaDatabase, FaTerminal } from "react-icons/fa";
 
+// Contacts are fetched this many at a time, following the API's keyset cursor
+const PAGE_SIZE = 100;
+
+// Same order as the backend's ORDER BY LOWER(name), id
+const byName = (a: Contact, b: Contact) =>
+  a.name.toLowerCase().localeCompare(b.name.toLowerCase()) || a.id - b.id;
+
+// `pageEnd` is the last contact of the last page loaded, if more pages follow;
+// contacts sorting after it belong to pages not loaded yet and are left out
+const applyChanges = (contacts: Contact[], changes: ChangeRecord[], pageEnd: Contact | null) => {
+  const byId = new Map(contacts.map((contact) => [contact.id, contact]));
+  for (const change of changes) {
+    if (change.op === "delete") {
+      byId.delete(change.key as number);
+    } else if (change.values) {
+      byId.set(change.values.id, change.values);
+    }
+  }
+  const merged = [...byId.values()].sort(byName);
+  return pageEnd ? merged.filter((contact) => byName(contact, pageEnd) <= 0) : merged;
+};
+
 function App() {
   const [contacts, setContacts] = useState<Contact[]>([]);
   const [selectedContact, setSelectedContact] = useState<Contact | null>(null);
   const [showForm, setShowForm] = useState(false);
-  const [_searchQuery, setSearchQuery] = useState("");
+  const [searchQuery, setSearchQuery] = useState("");
   const [loading, setLoading] = useState(true);
   const [refreshCounter, setRefreshCounter] = useState(0);
   const [activeTab, setActiveTab] = useState<"contacts" | "sql" | "schema">(
@@ -21,6 +43,11 @@ function App() {
   const [dbStatus, setDbStatus] = useState<
     "healthy" | "unhealthy" | "checking"
   >("checking");
+  // Position in the backend change feed that `contacts` is up to date with
+  const changeCursor = useRef<{ seq: number; epoch: string } | null>(null);
+  // Cursor of the next page and the contact it continues after, or null once every page is loaded
+  const [nextPage, setNextPage] = useState<{ cursor: string; after: Contact } | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     console.log("App mounted, loading contacts...");
@@ -36,9 +63,13 @@ function App() {
     try {
       console.log("Calling loadContacts()");
       setLoading(true);
-      const data = await getAllContacts();
-      console.log("Received contacts:", data);
-      setContacts(data);
+      // Take the feed position first so no change made during the load is missed
+      const { seq, epoch } = await getContactChanges();
+      const page = await getContactsPage(PAGE_SIZE);
+      console.log("Received contacts:", page.data);
+      setContacts(page.data);
+      setNextPage(page.next_cursor ? { cursor: page.next_cursor, after: page.data[page.data.length - 1] } : null);
+      changeCursor.current = { seq, epoch };
     } catch (error) {
       console.error("Error loading contacts:", error);
     } finally {
@@ -46,6 +77,45 @@ function App() {
     }
   };
 
+  // Append the next page; the change feed keeps the pages already shown current
+  const loadMoreContacts = async () => {
+    if (!nextPage) {
+      return;
+    }
+    try {
+      setLoadingMore(true);
+      const page = await getContactsPage(PAGE_SIZE, nextPage.cursor);
+      setContacts((current) => {
+        const shown = new Set(current.map((contact) => contact.id));
+        return current.concat(page.data.filter((contact) => !shown.has(contact.id)));
+      });
+      setNextPage(page.next_cursor ? { cursor: page.next_cursor, after: page.data[page.data.length - 1] } : null);
+    } catch (error) {
+      console.error("Error loading more contacts:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Apply the changes since the last load instead of re-fetching every contact
+  const syncContacts = async () => {
+    const cursor = changeCursor.current;
+    if (!cursor || searchQuery.trim() !== "") {
+      return searchQuery.trim() !== "" ? handleSearch(searchQuery) : loadContacts();
+    }
+    try {
+      const batch = await getContactChanges(cursor.seq, cursor.epoch);
+      if (batch.reset || batch.data.some((change) => change.op === "reset")) {
+        return loadContacts();
+      }
+      setContacts((current) => applyChanges(current, batch.data, nextPage?.after ?? null));
+      changeCursor.current = { seq: batch.seq, epoch: batch.epoch };
+    } catch (error) {
+      console.error("Error syncing contacts:", error);
+      loadContacts();
+    }
+  };
+
   const checkDbHealth = async () => {
     try {
       setDbStatus("checking");
@@ -65,6 +135,7 @@ function App() {
       try {
         const data = await searchContacts(query);
         setContacts(data);
+        setNextPage(null);
       } catch (error) {
         console.error("Error searching contacts:", error);
       }
@@ -87,14 +158,14 @@ function App() {
     console.log("Closing form, refreshing contacts...");
     setShowForm(false);
     setSelectedContact(null);
-    loadContacts();
+    syncContacts();
     setRefreshCounter((prev) => prev + 1);
   };
 
   const handleQueryExecuted = () => {
     // Refresh contacts when SQL queries affect the contacts table
     if (activeTab === "contacts") {
-      loadContacts();
+      syncContacts();
     }
   };
 
@@ -205,10 +276,21 @@ function App() {
                   key={refreshCounter}
                   contacts={contacts}
                   onEdit={handleEdit}
-                  onDeleteSuccess={loadContacts}
+                  onDeleteSuccess={syncContacts}
                 />
               )}
             </div>
+            {!loading && nextPage && (
+              <div className="mt-4 flex justify-center">
+                <button
+                  onClick={loadMoreContacts}
+                  disabled={loadingMore}
+                  className="bg-white hover:bg-gray-100 text-primary-600 font-medium py-2 px-4 rounded-lg border border-gray-200 shadow-sm transition-colors duration-200 disabled:opacity-50"
+                >
+                  {loadingMore ? "Loading..." : "Load more contacts"}
+                </button>
+              </div>
+            )}
           </>
         )}
 
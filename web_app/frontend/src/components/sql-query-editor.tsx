@@ -133,7 +133,7 @@ const SqlQueryEditor: React.FC<SqlQueryEditorProps> = ({ onQueryExecuted }) => {
                     </span>
                   </div>
                   <div className="flex items-center gap-2 mt-1">
-                    {item.result?.success ? (
+                    {(item.success ?? item.result?.success) ? (
                       <span className="inline-flex items-center gap-1 text-xs text-green-600">
                         <FaCheck /> Success
                       </span>
@@ -142,6 +142,12 @@ const SqlQueryEditor: React.FC<SqlQueryEditorProps> = ({ onQueryExecuted }) => {
                         <FaTimes /> Error
                       </span>
                     )}
+                    {item.duration_ms !== undefined && (
+                      <span className="text-xs text-gray-500">
+                        {item.duration_ms} ms · {item.rows_scanned} scanned ·{" "}
+                        {item.rows_returned} returned
+                      </span>
+                    )}
                   </div>
                 </div>
               ))
@@ -1,5 +1,5 @@
 import axios, { AxiosError } from "axios";
-import type { Contact, ApiResponse,QueryResult,TableSchema,SqlQuery } from "../types";
+import type { Contact, ContactPage, ChangeBatch, ApiResponse,QueryResult,TableSchema,SqlQuery } from "../types";
 
 // const API_BASE_URL = "http://localhost:5000/api";
 const API_BASE_URL = import.meta.env.VITE_API_URL || "http://localhost:5000/api";
@@ -28,6 +28,29 @@ export const getAllContacts = async (): Promise<Contact[]> => {
   }
 };
 
+// Pass the previous page's next_cursor as `after` to fetch the following page
+export const getContactsPage = async (
+  limit: number,
+  after?: string | null
+): Promise<ContactPage> => {
+  try {
+    const response = await api.get<ApiResponse<Contact[]> & { next_cursor?: string | null }>(
+      "/contacts",
+      { params: { limit, ...(after ? { after } : {}) } }
+    );
+    if (response.data.success && response.data.data) {
+      return { data: response.data.data, next_cursor: response.data.next_cursor ?? null };
+    } else {
+      throw new Error(response.data.error || "Failed to fetch contacts");
+    }
+  } catch (error) {
+    const axiosError = error as AxiosError<ApiResponse>;
+    throw new Error(
+      axiosError.response?.data?.error || "Failed to fetch contacts"
+    );
+  }
+};
+
 export const getContact = async (id: number): Promise<Contact> => {
   try {
     const response = await api.get<ApiResponse<Contact>>(`/contacts/${id}`);
@@ -110,6 +133,26 @@ export const deleteContact = async (id: number): Promise<ApiResponse> => {
   }
 };
 
+// Without `since` this only returns the feed position to sync from
+export const getContactChanges = async (
+  since?: number,
+  epoch?: string
+): Promise<ChangeBatch> => {
+  try {
+    const response = await api.get<ApiResponse<ChangeBatch["data"]> & Omit<ChangeBatch, "data">>(
+      "/changes",
+      { params: { table: "contacts", ...(since !== undefined ? { since, epoch } : {}) } }
+    );
+    const { data = [], seq, epoch: feedEpoch, reset } = response.data;
+    return { data, seq, epoch: feedEpoch, reset };
+  } catch (error) {
+    const axiosError = error as AxiosError<ApiResponse>;
+    throw new Error(
+      axiosError.response?.data?.error || "Failed to fetch changes"
+    );
+  }
+};
+
 export const healthCheck = async (): Promise<ApiResponse> => {
   try {
     const response = await api.get<ApiResponse>("/health");
@@ -15,6 +15,26 @@ export interface ApiResponse<T = any> {
   message?: string;
 }
 
+export interface ChangeRecord {
+  seq: number;
+  table: string;
+  op: "insert" | "update" | "delete" | "reset";
+  key: number | null;
+  values: Contact | null;
+}
+
+export interface ChangeBatch {
+  data: ChangeRecord[];
+  seq: number;
+  epoch: string;
+  reset: boolean;
+}
+
+export interface ContactPage {
+  data: Contact[];
+  next_cursor: string | null;
+}
+
 export interface ContactFormProps {
   contact: Contact | null;
   onClose: () => void;
@@ -50,6 +70,7 @@ export interface IndexSchema {
   name: string;
   table_name: string;
   column_name: string;
+  index_type?: string;
 }
 
 export interface QueryResult {
@@ -66,4 +87,10 @@ export interface SqlQuery {
   query: string;
   result?: QueryResult;
   timestamp: string;
+  success?: boolean;
+  error?: string | null;
+  duration_ms?: number;
+  rows_scanned?: number;
+  rows_returned?: number;
+  bytes_written?: number;
 }
\ No newline at end of file